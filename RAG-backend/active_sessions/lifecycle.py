@@ -0,0 +1,135 @@
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+from active_sessions.session_store import Session, session_store, SESSION_IDLE_TTL_SECONDS, FAILED
+from chains.qa_chain import evict_conversational_chain
+from ingest.rulebook_registry import rulebook_registry, rulebook_file_path
+from ingest.uploads import UPLOAD_DIR
+from retriever.bm25_index import bm25_indexes
+from vectorstores.qdrant_store import adelete_rulebook_points, delete_rulebook_summaries
+from workers.pools import run_cpu_bound
+
+
+def _remove_files(paths: List[str]):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def release_sessions_resources(sessions: List[Session]) -> List[str]:
+    """
+    Clean up after sessions that were removed from the session store.
+
+    Drops their cached chains and their references on every rulebook they used (created with
+    or attached). A rulebook's points and upload file are deleted only when no session in the
+    store (on any worker) still uses it; rulebooks still being ingested are cleaned up by their
+    job instead. Points are deleted concurrently and files removed in one pass on the CPU pool.
+
+    Returns:
+        List[str]: The keys of the deleted rulebooks.
+
+    Raises:
+        The first error hit while deleting, after every deletion has been attempted.
+    """
+    unused = {}
+    for session in sessions:
+        evict_conversational_chain(session.session_id)
+        for key in session.rulebook_keys:
+            # The local refcount only covers this worker's sessions; the store is authoritative
+            rulebook_registry.release(key)
+            if session.status == FAILED and key == session.rulebook_key:
+                # Failed ingestion jobs already discarded their points and file
+                continue
+            unused[key] = session.collection_name
+    return await delete_unused_rulebooks(unused)
+
+
+async def delete_unused_rulebooks(unused: Dict[str, str]) -> List[str]:
+    """
+    Delete the points (from the given collection), summary, BM25 index and file of every
+    rulebook in `unused` that no session in the store uses any more.
+
+    Returns:
+        List[str]: The keys of the deleted rulebooks.
+
+    Raises:
+        The first error hit while deleting, after every deletion has been attempted.
+    """
+    doomed = {
+        key: collection_name for key, collection_name in unused.items()
+        if session_store.count_by_rulebook(key) == 0 and rulebook_registry.forget(key)
+    }
+    if not doomed:
+        return []
+
+    for key in doomed:
+        bm25_indexes.drop(key)
+    results = await asyncio.gather(
+        *(adelete_rulebook_points(collection_name, key) for key, collection_name in doomed.items()),
+        run_cpu_bound(delete_rulebook_summaries, list(doomed)),
+        run_cpu_bound(_remove_files, [rulebook_file_path(key, UPLOAD_DIR) for key in doomed]),
+        return_exceptions=True,
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        raise errors[0]
+    return list(doomed)
+
+
+def replace_session_rulebook(session_id: str, old_key: str, new_key: str) -> Optional[Session]:
+    """
+    Point a session at a new revision of one of its rulebooks. Its chat history is kept;
+    its cached chains, which search the old revision, are dropped.
+
+    Returns:
+        The updated session, or None if it ended or no longer uses `old_key`.
+    """
+    session = session_store.get(session_id)
+    if session is None or old_key not in session.rulebook_keys:
+        return None
+    if session.rulebook_key == old_key:
+        changes = {"rulebook_key": new_key, "file_path": rulebook_file_path(new_key, UPLOAD_DIR)}
+    else:
+        changes = {"attached_rulebooks": [new_key if key == old_key else key for key in session.attached_rulebooks]}
+    session = session_store.update(session_id, **changes)
+    evict_conversational_chain(session_id)
+    return session
+
+
+async def end_session(session_id: str) -> Optional[Tuple[Session, List[str]]]:
+    """
+    End a session explicitly.
+
+    Returns:
+        None if the session does not exist, otherwise (session, keys of the deleted rulebooks).
+    """
+    session = session_store.delete(session_id)
+    if session is None:
+        return None
+    return session, await release_sessions_resources([session])
+
+
+async def end_sessions(sessions: List[Session]) -> List[str]:
+    """
+    Release the resources of sessions already claimed from the store (reaped or evicted).
+    Errors are logged rather than raised: the sessions are gone either way.
+    """
+    try:
+        return await release_sessions_resources(sessions)
+    except Exception as e:
+        print(f"Could not release resources of {len(sessions)} ended sessions: {e}")
+        return []
+
+
+async def reap_idle_sessions(
+    idle_seconds: float = SESSION_IDLE_TTL_SECONDS,
+    limit: Optional[int] = None,
+) -> List[Session]:
+    """
+    End up to `limit` sessions idle for longer than `idle_seconds`, releasing their rulebooks and files.
+    Safe to run from several workers at once: each idle session is claimed by exactly one.
+    """
+    reaped = session_store.claim_idle(idle_seconds, limit=limit)
+    if reaped:
+        await end_sessions(reaped)
+    return reaped
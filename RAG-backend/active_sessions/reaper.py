@@ -0,0 +1,164 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+from active_sessions.session_store import session_store, SESSION_IDLE_TTL_SECONDS
+from active_sessions.lifecycle import end_sessions, reap_idle_sessions
+from chains.qa_chain import chain_cache
+from embeddings.embedding_service import current_rss_mb
+from ingest.rulebook_registry import rulebook_registry
+from ingest.uploads import UPLOAD_DIR, UPLOAD_STALE_SECONDS, purge_stale_uploads
+from retriever.bm25_index import bm25_indexes
+from workers.pools import run_cpu_bound
+
+REAPER_INTERVAL_SECONDS = float(os.getenv("REAPER_INTERVAL_SECONDS", "60"))
+# Idle sessions ended per pass; larger backlogs are worked off in several passes
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "100"))
+
+# 0 means unlimited
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "0"))
+MAX_RULEBOOKS = int(os.getenv("MAX_RULEBOOKS", "0"))
+# "reject" refuses new uploads at a cap; "evict" ends the least recently active sessions instead
+SESSION_CAP_POLICY = os.getenv("SESSION_CAP_POLICY", "reject")
+
+
+class CapacityError(Exception):
+    """
+    Raised when a new session or rulebook would exceed a configured cap under the "reject" policy.
+    """
+
+
+class SessionReaper:
+    """
+    Background task that periodically ends idle sessions in batches and deletes abandoned
+    in-flight uploads.
+
+    Every worker may run one; the session store hands each idle session to exactly one of them.
+    """
+
+    def __init__(self, interval_seconds: float, batch_size: int, idle_seconds: float,
+                 upload_dir: str = UPLOAD_DIR, stale_upload_seconds: float = UPLOAD_STALE_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.idle_seconds = idle_seconds
+        self.upload_dir = upload_dir
+        self.stale_upload_seconds = stale_upload_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.reaped = 0
+        self.evicted = 0
+        self.stale_uploads_removed = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_seconds = 0.0
+
+    async def run_once(self) -> int:
+        start = time.perf_counter()
+        total = 0
+        while True:
+            batch = await reap_idle_sessions(self.idle_seconds, limit=self.batch_size)
+            total += len(batch)
+            if len(batch) < self.batch_size:
+                break
+            # Let request handlers run between batches of a large backlog
+            await asyncio.sleep(0)
+        stale_uploads = await run_cpu_bound(purge_stale_uploads, self.upload_dir, self.stale_upload_seconds)
+
+        self.runs += 1
+        self.reaped += total
+        self.stale_uploads_removed += stale_uploads
+        self.last_run_at = time.time()
+        self.last_run_seconds = time.perf_counter() - start
+        if total:
+            print(f"Reaped {total} idle sessions in {self.last_run_seconds:.2f}s")
+        if stale_uploads:
+            print(f"Deleted {stale_uploads} abandoned uploads")
+        return total
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Session reaper run failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "interval_seconds": self.interval_seconds,
+            "batch_size": self.batch_size,
+            "idle_ttl_seconds": self.idle_seconds,
+            "runs": self.runs,
+            "reaped": self.reaped,
+            "evicted": self.evicted,
+            "stale_uploads_removed": self.stale_uploads_removed,
+            "last_run_at": self.last_run_at,
+            "last_run_seconds": round(self.last_run_seconds, 3),
+        }
+
+
+session_reaper = SessionReaper(
+    interval_seconds=REAPER_INTERVAL_SECONDS,
+    batch_size=REAPER_BATCH_SIZE,
+    idle_seconds=SESSION_IDLE_TTL_SECONDS,
+)
+
+
+async def ensure_capacity(new_rulebook: bool, new_session: bool = True):
+    """
+    Make room for one more session (if `new_session`) and one more rulebook (if `new_rulebook`)
+    before an upload. Attaching or revising a rulebook creates no session, so only the rulebook
+    cap applies to it.
+
+    Raises:
+        CapacityError: A cap is reached and SESSION_CAP_POLICY is "reject".
+    """
+    if new_session and MAX_SESSIONS and session_store.count() >= MAX_SESSIONS:
+        if SESSION_CAP_POLICY != "evict":
+            raise CapacityError(f"Session limit of {MAX_SESSIONS} reached")
+        evicted = session_store.claim_least_recent(session_store.count() - MAX_SESSIONS + 1)
+        session_reaper.evicted += len(evicted)
+        await end_sessions(evicted)
+
+    if new_rulebook and MAX_RULEBOOKS and session_store.count_rulebooks() >= MAX_RULEBOOKS:
+        if SESSION_CAP_POLICY != "evict":
+            raise CapacityError(f"Rulebook limit of {MAX_RULEBOOKS} reached")
+        evicted = session_store.claim_least_recent_rulebook()
+        session_reaper.evicted += len(evicted)
+        await end_sessions(evicted)
+
+
+def resource_stats(upload_dir: str) -> Dict[str, Any]:
+    """
+    Live resources held by this deployment (sessions, rulebooks, files) and by this worker (chains, RAM).
+    """
+    upload_files = [entry for entry in os.scandir(upload_dir) if entry.is_file() and entry.name.endswith(".pdf")]
+    return {
+        "sessions": session_store.count(),
+        "rulebooks": session_store.count_rulebooks(),
+        "upload_files": len(upload_files),
+        "upload_bytes": sum(entry.stat().st_size for entry in upload_files),
+        "rulebook_registry": rulebook_registry.stats(),
+        "chains_cached": chain_cache.stats()["size"],
+        "bm25_indexes": bm25_indexes.stats(),
+        "process_rss_mb": current_rss_mb(),
+        "limits": {
+            "max_sessions": MAX_SESSIONS,
+            "max_rulebooks": MAX_RULEBOOKS,
+            "policy": SESSION_CAP_POLICY,
+        },
+        "reaper": session_reaper.stats(),
+    }
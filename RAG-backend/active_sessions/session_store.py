@@ -0,0 +1,465 @@
+from abc import ABC, abstractmethod
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, fields, replace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+# "memory" keeps sessions in this worker only; "sqlite" shares them between
+# every worker (and restart) that points at the same SESSION_STORE_PATH
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "sessions.db")
+# Sessions untouched for this long are ended by the reaper
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600"))
+
+PROCESSING = "processing"
+READY = "ready"
+FAILED = "failed"
+
+# Chat history is stored as compact (role, text) pairs rather than pickled LangChain objects
+_ROLE_TO_MESSAGE = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+
+
+def messages_to_history(messages: List[BaseMessage]) -> List[Tuple[str, str]]:
+    return [(message.type, message.content) for message in messages]
+
+
+def history_to_messages(history: List[Tuple[str, str]]) -> List[BaseMessage]:
+    return [_ROLE_TO_MESSAGE[role](content=content) for role, content in history]
+
+
+@dataclass
+class Session:
+    session_id: str
+    collection_name: str
+    rulebook_key: str
+    file_path: str
+    game_name: str
+    status: str = PROCESSING
+    job_id: Optional[str] = None
+    error: Optional[str] = None
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    summary: str = ""
+    created_at: float = field(default_factory=time.time)
+    last_active: float = field(default_factory=time.time)
+    # Further rulebooks searched alongside the one the session was created with
+    attached_rulebooks: List[str] = field(default_factory=list)
+
+    @property
+    def has_history(self) -> bool:
+        return bool(self.history) or bool(self.summary)
+
+    @property
+    def rulebook_keys(self) -> List[str]:
+        return [self.rulebook_key] + self.attached_rulebooks
+
+    @property
+    def rulebook_scope(self) -> str:
+        """
+        Identifies the set of rulebooks the session searches (chain and answer cache key).
+        """
+        return "+".join(self.rulebook_keys)
+
+    def copy(self) -> "Session":
+        return replace(self, history=list(self.history), attached_rulebooks=list(self.attached_rulebooks))
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("history")
+        data.pop("summary")
+        data["turns"] = len(self.history) // 2
+        return data
+
+
+_SESSION_FIELDS = {f.name for f in fields(Session)}
+
+
+def _check_fields(changes: Dict[str, Any]):
+    unknown = set(changes) - _SESSION_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown session fields: {sorted(unknown)}")
+
+
+class SessionStore(ABC):
+    """
+    Interface for session storage. Every method is atomic, so several worker
+    processes can share a backend without coordinating.
+    """
+
+    @abstractmethod
+    def create(self, session: Session) -> Session:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, session_id: str, touch: bool = False) -> Optional[Session]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, session_id: str, **changes: Any) -> Optional[Session]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, session_id: str) -> Optional[Session]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_by_rulebook(self, rulebook_key: str, status: Optional[str] = None) -> List[Session]:
+        """
+        Sessions using the rulebook, whether they were created with it or attached it later.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_by_rulebook(self, rulebook_key: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_rulebooks(self) -> int:
+        """
+        Number of distinct rulebooks used (or attached) by sessions that did not fail.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_idle(self, idle_seconds: float, limit: Optional[int] = None) -> List[Session]:
+        """
+        Remove and return sessions idle for longer than `idle_seconds`, oldest first, at most `limit`.
+        Each idle session is handed to exactly one caller, even across workers.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_least_recent(self, count: int) -> List[Session]:
+        """
+        Remove and return the `count` least recently active sessions.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_least_recent_rulebook(self) -> List[Session]:
+        """
+        Remove and return every session of the rulebook whose latest activity is the oldest.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Default session store: a lock-protected dict local to this worker process.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+    def create(self, session: Session) -> Session:
+        with self._lock:
+            self._sessions[session.session_id] = session.copy()
+        return session
+
+    def get(self, session_id: str, touch: bool = False) -> Optional[Session]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if touch:
+                session.last_active = time.time()
+            # Hand out copies so callers see the same semantics as with a shared backend
+            return session.copy()
+
+    def update(self, session_id: str, **changes: Any) -> Optional[Session]:
+        _check_fields(changes)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            for key, value in changes.items():
+                setattr(session, key, value)
+            return session.copy()
+
+    def delete(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def list_by_rulebook(self, rulebook_key: str, status: Optional[str] = None) -> List[Session]:
+        with self._lock:
+            return [
+                session.copy()
+                for session in self._sessions.values()
+                if rulebook_key in session.rulebook_keys and (status is None or session.status == status)
+            ]
+
+    def count_by_rulebook(self, rulebook_key: str) -> int:
+        with self._lock:
+            return sum(1 for session in self._sessions.values() if rulebook_key in session.rulebook_keys)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def count_rulebooks(self) -> int:
+        with self._lock:
+            return len({key for s in self._sessions.values() if s.status != FAILED for key in s.rulebook_keys})
+
+    def _by_activity(self) -> List[Session]:
+        return sorted(self._sessions.values(), key=lambda session: session.last_active)
+
+    def claim_idle(self, idle_seconds: float, limit: Optional[int] = None) -> List[Session]:
+        cutoff = time.time() - idle_seconds
+        with self._lock:
+            idle = [session for session in self._by_activity() if session.last_active < cutoff][:limit]
+            return [self._sessions.pop(session.session_id) for session in idle]
+
+    def claim_least_recent(self, count: int) -> List[Session]:
+        with self._lock:
+            oldest = self._by_activity()[:count]
+            return [self._sessions.pop(session.session_id) for session in oldest]
+
+    def claim_least_recent_rulebook(self) -> List[Session]:
+        with self._lock:
+            latest: Dict[str, float] = {}
+            for session in self._sessions.values():
+                for key in session.rulebook_keys:
+                    latest[key] = max(latest.get(key, 0.0), session.last_active)
+            if not latest:
+                return []
+            key = min(latest, key=latest.get)
+            sessions = [s for s in self._sessions.values() if key in s.rulebook_keys]
+            return [self._sessions.pop(session.session_id) for session in sessions]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "backend": "memory",
+            "sessions": len(sessions),
+            "processing": sum(1 for s in sessions if s.status == PROCESSING),
+        }
+
+
+_COLUMNS = [
+    "session_id", "collection_name", "rulebook_key", "file_path", "game_name",
+    "status", "job_id", "error", "history", "summary", "created_at", "last_active", "attached_rulebooks",
+]
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store in a SQLite file, shared by every worker process on the host.
+
+    WAL mode lets readers proceed while one worker writes; read-modify-write
+    operations take the write lock up front (BEGIN IMMEDIATE) so concurrent
+    workers never interleave them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    collection_name TEXT NOT NULL,
+                    rulebook_key TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    game_name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    job_id TEXT,
+                    error TEXT,
+                    history TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_active REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_rulebook ON sessions (rulebook_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+            if "attached_rulebooks" not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN attached_rulebooks TEXT NOT NULL DEFAULT '[]'")
+            # Every (session, rulebook) pair, including the session's own rulebook, for indexed lookups by rulebook
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS session_rulebooks (
+                    session_id TEXT NOT NULL,
+                    rulebook_key TEXT NOT NULL,
+                    PRIMARY KEY (session_id, rulebook_key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS session_rulebooks_key ON session_rulebooks (rulebook_key)")
+            conn.execute("INSERT OR IGNORE INTO session_rulebooks SELECT session_id, rulebook_key FROM sessions")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # One connection per thread; autocommit mode with explicit transactions below
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _to_row(session: Session) -> Tuple:
+        data = asdict(session)
+        data["history"] = json.dumps(session.history, separators=(",", ":"))
+        data["attached_rulebooks"] = json.dumps(session.attached_rulebooks)
+        return tuple(data[column] for column in _COLUMNS)
+
+    @staticmethod
+    def _from_row(row) -> Session:
+        data = dict(zip(_COLUMNS, row))
+        data["history"] = [tuple(pair) for pair in json.loads(data["history"])]
+        data["attached_rulebooks"] = json.loads(data["attached_rulebooks"])
+        return Session(**data)
+
+    @staticmethod
+    def _link_rulebooks(conn, session: Session):
+        conn.execute("DELETE FROM session_rulebooks WHERE session_id = ?", (session.session_id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO session_rulebooks (session_id, rulebook_key) VALUES (?, ?)",
+            [(session.session_id, key) for key in session.rulebook_keys],
+        )
+
+    @staticmethod
+    def _unlink_sessions(conn, sessions: List[Session]):
+        ids = [(session.session_id,) for session in sessions]
+        conn.executemany("DELETE FROM sessions WHERE session_id = ?", ids)
+        conn.executemany("DELETE FROM session_rulebooks WHERE session_id = ?", ids)
+
+    def _select(self, conn, where: str, params: Tuple) -> List[Session]:
+        rows = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM sessions WHERE {where}", params).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def create(self, session: Session) -> Session:
+        with self._transaction() as conn:
+            conn.execute(
+                f"INSERT INTO sessions ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                self._to_row(session),
+            )
+            self._link_rulebooks(conn, session)
+        return session
+
+    def get(self, session_id: str, touch: bool = False) -> Optional[Session]:
+        if not touch:
+            sessions = self._select(self._connection(), "session_id = ?", (session_id,))
+            return sessions[0] if sessions else None
+        with self._transaction() as conn:
+            conn.execute("UPDATE sessions SET last_active = ? WHERE session_id = ?", (time.time(), session_id))
+            sessions = self._select(conn, "session_id = ?", (session_id,))
+        return sessions[0] if sessions else None
+
+    def update(self, session_id: str, **changes: Any) -> Optional[Session]:
+        _check_fields(changes)
+        if "history" in changes:
+            changes["history"] = json.dumps(changes["history"], separators=(",", ":"))
+        if "attached_rulebooks" in changes:
+            changes["attached_rulebooks"] = json.dumps(changes["attached_rulebooks"])
+        with self._transaction() as conn:
+            if changes:
+                assignments = ", ".join(f"{column} = ?" for column in changes)
+                conn.execute(
+                    f"UPDATE sessions SET {assignments} WHERE session_id = ?",
+                    (*changes.values(), session_id),
+                )
+            sessions = self._select(conn, "session_id = ?", (session_id,))
+            if sessions and ("attached_rulebooks" in changes or "rulebook_key" in changes):
+                self._link_rulebooks(conn, sessions[0])
+        return sessions[0] if sessions else None
+
+    def delete(self, session_id: str) -> Optional[Session]:
+        with self._transaction() as conn:
+            sessions = self._select(conn, "session_id = ?", (session_id,))
+            self._unlink_sessions(conn, sessions)
+        return sessions[0] if sessions else None
+
+    def list_by_rulebook(self, rulebook_key: str, status: Optional[str] = None) -> List[Session]:
+        where = "session_id IN (SELECT session_id FROM session_rulebooks WHERE rulebook_key = ?)"
+        if status is None:
+            return self._select(self._connection(), where, (rulebook_key,))
+        return self._select(self._connection(), f"{where} AND status = ?", (rulebook_key, status))
+
+    def count_by_rulebook(self, rulebook_key: str) -> int:
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM session_rulebooks WHERE rulebook_key = ?", (rulebook_key,)
+        ).fetchone()
+        return row[0]
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def count_rulebooks(self) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(DISTINCT l.rulebook_key) FROM session_rulebooks l "
+            "JOIN sessions s ON s.session_id = l.session_id WHERE s.status != ?",
+            (FAILED,),
+        ).fetchone()[0]
+
+    def _claim(self, conn, where: str, params: Tuple) -> List[Session]:
+        sessions = self._select(conn, where, params)
+        self._unlink_sessions(conn, sessions)
+        return sessions
+
+    def claim_idle(self, idle_seconds: float, limit: Optional[int] = None) -> List[Session]:
+        cutoff = time.time() - idle_seconds
+        with self._transaction() as conn:
+            return self._claim(conn, "last_active < ? ORDER BY last_active LIMIT ?", (cutoff, limit or -1))
+
+    def claim_least_recent(self, count: int) -> List[Session]:
+        with self._transaction() as conn:
+            return self._claim(conn, "1 ORDER BY last_active LIMIT ?", (count,))
+
+    def claim_least_recent_rulebook(self) -> List[Session]:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT l.rulebook_key FROM session_rulebooks l JOIN sessions s ON s.session_id = l.session_id "
+                "GROUP BY l.rulebook_key ORDER BY MAX(s.last_active) LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return []
+            return self._claim(
+                conn, "session_id IN (SELECT session_id FROM session_rulebooks WHERE rulebook_key = ?)", (row[0],)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        total, processing = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(status = ?), 0) FROM sessions", (PROCESSING,)
+        ).fetchone()
+        return {"backend": "sqlite", "path": self.path, "sessions": total, "processing": processing}
+
+
+def create_session_store(backend: str = SESSION_STORE_BACKEND) -> SessionStore:
+    """
+    Build the session store selected by SESSION_STORE_BACKEND.
+    """
+    if backend == "memory":
+        return InMemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore(SESSION_STORE_PATH)
+    raise ValueError(f"Unknown SESSION_STORE_BACKEND: {backend}")
+
+
+session_store = create_session_store()
@@ -1 +1,31 @@
-active_sessions = {}
\ No newline at end of file
+from langchain.memory.chat_memory import BaseChatMemory
+from active_sessions.session_store import (
+    Session,
+    session_store,
+    messages_to_history,
+    history_to_messages,
+)
+
+
+def restore_memory(session: Session, memory: BaseChatMemory) -> BaseChatMemory:
+    """
+    Load the session's stored chat history into a LangChain memory object.
+
+    Called before every turn: the previous turn may have been answered by another
+    worker, so whatever the (cached) memory held locally may be stale.
+    """
+    memory.chat_memory.messages = history_to_messages(session.history)
+    if hasattr(memory, "moving_summary_buffer"):
+        memory.moving_summary_buffer = session.summary
+    return memory
+
+
+def persist_memory(session_id: str, memory: BaseChatMemory):
+    """
+    Write the memory's (already pruned) history back to the session store after a turn.
+    """
+    session_store.update(
+        session_id,
+        history=messages_to_history(memory.chat_memory.messages),
+        summary=getattr(memory, "moving_summary_buffer", ""),
+    )
@@ -1,130 +1,644 @@
 from fastapi import APIRouter,UploadFile, File,Form,Body, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+import json
 import os
 import uuid
-from ingest.load_document import extract_text_from_pdf, chunk_pdf_text
-from ingest.embed_and_store import store_in_qdrant
-from vectorstores.qdrant_store import create_qdrant_client
-from retriever.answer_question import answer_question
-from langchain.memory import ConversationBufferMemory
-from chains.qa_chain import get_conversational_chain
-from active_sessions.sessions import active_sessions
+from retriever.answer_question import astream_answer_questions, BATCH_MAX_QUESTIONS
+from chains.qa_chain import get_conversational_chain, chain_cache, astream_conversational_answer, with_retrieval_options, create_chat_memory, evict_conversational_chain
+from chains.session_memory import PromptTokenCounter, prompt_token_stats
+from retriever.hybrid_retriever import RetrievalOptions
+from retriever.bm25_index import bm25_indexes
+from retriever.reranker import get_reranker
+from chains.answer_cache import answer_cache, CachedAnswer, ANSWER_CACHE_ENABLED
+from chains.rulebook_summary import answer_from_summaries, RULEBOOK_SUMMARY_ENABLED
+from typing import List, Optional, Tuple
+from active_sessions.session_store import SESSION_STORE_BACKEND, session_store, Session, PROCESSING, READY as SESSION_READY, FAILED as SESSION_FAILED
+from active_sessions.sessions import restore_memory, persist_memory
+from active_sessions.lifecycle import end_session as end_stored_session, replace_session_rulebook, delete_unused_rulebooks
+from active_sessions.reaper import ensure_capacity, resource_stats, CapacityError
+from observability.metrics import render_metrics, timed
+from observability.llm_timing import LLMStageTimer
+from embeddings.embedding_service import embedding_service_stats, get_embedding_service
+from workers.pools import run_cpu_bound, pool_stats
+from llm.gateway import get_llm_gateway, llm_deadline, llm_stats, LLMUnavailableError, LLM_RETRY_MAX_SECONDS
+from jobs.ingestion import submit_ingestion_job
+from jobs.job_store import JOB_STORE_BACKEND, job_store
+from ingest.rulebook_registry import rulebook_registry, rulebook_key, rulebook_file_path, READY
+from vectorstores.qdrant_store import RULEBOOK_COLLECTION, rulebook_filter
+from ingest.uploads import save_upload, commit_upload, discard_upload, UploadTooLargeError, UPLOAD_DIR
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @router.get("/")
 def get_status():
-    return {"message": "Backend is running"}
+    return {
+        "message": "Backend is running",
+        "embedding_models": embedding_service_stats(),
+        "reranker": get_reranker().stats(),
+        "chain_cache": chain_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "prompt_tokens": prompt_token_stats.stats(),
+        "pools": pool_stats(),
+        "rulebooks": rulebook_registry.stats(),
+        "sessions": session_store.stats(),
+        "bm25_indexes": bm25_indexes.stats(),
+        "llm": llm_stats(),
+    }
+
+@router.get("/resources")
+def get_resources():
+    return resource_stats(UPLOAD_DIR)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus text format: stage/request latency histograms and LLM token counters,
+    # plus the numeric fields of the stats above as gauges
+    return PlainTextResponse(
+        render_metrics(gauges={
+            "chain_cache": chain_cache.stats(),
+            "answer_cache": answer_cache.stats(),
+            "prompt_tokens": prompt_token_stats.stats(),
+            "pools": pool_stats(),
+            "rulebooks": rulebook_registry.stats(),
+            "sessions": session_store.stats(),
+            "bm25_indexes": bm25_indexes.stats(),
+            "embedding_models": {f"{stats['model_name']}_{stats['backend']}": stats for stats in embedding_service_stats()},
+            "reranker": get_reranker().stats(),
+            "llm": llm_stats(),
+        }),
+        media_type="text/plain; version=0.0.4",
+    )
+
+async def _store_rulebook(file: UploadFile, game_name: str, new_session: bool = True) -> Tuple[str, str, str, Optional[str], bool, bool]:
+    """
+    Save an uploaded rulebook and take a reference on it, unless an identical one is known:
+    the same PDF uploaded under the same game and file name (both are stored with its chunks).
+    `new_session` is False when the rulebook goes into an existing session (attach, revise),
+    which only counts against the rulebook cap.
+
+    A rulebook only another worker knows (found through a session sharing it) is reused
+    without a reference in this worker's registry.
+
+    Returns:
+        (rulebook key, collection name, session status, job id, whether the caller must ingest it,
+        whether a registry reference was taken that the caller must release if it drops the rulebook)
+    """
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    # Streamed to a per-upload temp file in chunks; the PDF is never held in memory whole
+    try:
+        temp_path, content_hash, _ = await save_upload(file, UPLOAD_DIR)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    key = rulebook_key(content_hash, game_name=game_name, source_filename=file.filename)
+
+    # Identical rulebooks share one set of points; only the first upload has to ingest it
+    shared = _session_sharing_rulebook(key)
+    try:
+        await ensure_capacity(
+            new_rulebook=shared is None and rulebook_registry.get(key) is None,
+            new_session=new_session,
+        )
+    except CapacityError as e:
+        discard_upload(temp_path)
+        raise HTTPException(status_code=503, detail=str(e))
+
+    if shared is not None:
+        is_new = referenced = False
+        collection_name, status, job_id = shared.collection_name, shared.status, shared.job_id
+    else:
+        rulebook, is_new = rulebook_registry.acquire(key, content_hash, UPLOAD_DIR)
+        referenced = True
+        if is_new:
+            commit_upload(temp_path, rulebook.file_path)
+        collection_name = rulebook.collection_name
+        status = SESSION_READY if rulebook.status == READY else PROCESSING
+        job_id = rulebook.job_id
+    # Duplicates of a known rulebook reuse its stored file
+    discard_upload(temp_path)
+    return key, collection_name, status, job_id, is_new, referenced
 
 @router.post("/upload")
 async def upload_rulebook(
     file : UploadFile = File(...),
     game_name: str = Form(...),
 ):
-    
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-    
-    # Save the uploaded file
-    file_path = os.path.join(UPLOAD_DIR,file.filename)
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    key, collection_name, status, job_id, is_new, _ = await _store_rulebook(file, game_name)
+    file_path = rulebook_file_path(key, UPLOAD_DIR)
 
-    raw_pages = extract_text_from_pdf(file_path)
-    documents = chunk_pdf_text(raw_pages, source_filename=file.filename, game_name=game_name)
+    session_id = uuid.uuid4().hex
 
-    collection_name = f"rulebook_{uuid.uuid4().hex[:8]}"
+    session_store.create(Session(
+        session_id=session_id,
+        collection_name=collection_name,
+        rulebook_key=key,
+        file_path=file_path,
+        game_name=game_name,
+        status=status,
+        job_id=job_id,
+    ))
 
-    try:
-        store_in_qdrant(documents, collection_name)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to store documents: {str(e)}")
-    
-    session_id = uuid.uuid4().hex
+    if is_new:
+        # Extraction, embedding and the Qdrant upsert run on the ingestion pool; poll /jobs/{job_id}
+        job = submit_ingestion_job(
+            session_id=session_id,
+            collection_name=collection_name,
+            rulebook_key=key,
+            game_name=game_name,
+            source_filename=file.filename,
+            file_path=file_path,
+        )
+        session_store.update(session_id, job_id=job.job_id)
+        return JSONResponse(status_code=202, content={
+            "session_id": session_id,
+            "job_id": job.job_id,
+            "collection_name": collection_name,
+            "status": job.stage,
+            "message": "Rulebook upload accepted. Poll /jobs/{job_id} for ingestion progress."
+        })
 
-    memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        return_messages=True,
-        input_key="question",
-        output_key="answer"
-    )
+    if status != SESSION_READY:
+        # Someone else is already ingesting this exact rulebook; wait on their job
+        return JSONResponse(status_code=202, content={
+            "session_id": session_id,
+            "job_id": job_id,
+            "collection_name": collection_name,
+            "status": "processing",
+            "message": "Rulebook is already being processed. Poll /jobs/{job_id} for ingestion progress."
+        })
 
-    active_sessions[session_id] = {
-        "file_path": file_path,
-        "collection_name": collection_name,
-        "game_name": game_name,
-        "memory": memory
-    }
     return {
         "session_id": session_id,
+        "job_id": None,
         "collection_name": collection_name,
-        "message": f"Successfully uploaded and processed {len(documents)} chunks."
+        "status": "ready",
+        "message": "Rulebook already processed; reusing its stored embeddings."
     }
 
+@router.post("/sessions/{session_id}/rulebooks")
+async def attach_rulebook(
+    session_id: str,
+    file : UploadFile = File(...),
+    game_name: str = Form(...),
+):
+    """
+    Add another rulebook (e.g. an expansion) to a session. Questions are then answered from
+    all of the session's rulebooks, searched together in the shared collection.
+    """
+    session = session_store.get(session_id, touch=True)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.status == SESSION_FAILED:
+        raise HTTPException(status_code=422, detail=f"Rulebook ingestion failed: {session.error}")
+
+    key, collection_name, status, job_id, is_new, referenced = await _store_rulebook(file, game_name, new_session=False)
+    if key in session.rulebook_keys:
+        if referenced:
+            rulebook_registry.release(key)
+        return {
+            "session_id": session_id,
+            "job_id": None,
+            "rulebooks": session.rulebook_keys,
+            "status": session.status,
+            "message": "Rulebook is already part of this session."
+        }
+    if collection_name != session.collection_name:
+        if referenced:
+            rulebook_registry.release(key)
+        raise HTTPException(status_code=409, detail="Session was created before rulebooks were shared; start a new session")
+
+    attached = session.attached_rulebooks + [key]
+    changes = {"attached_rulebooks": attached}
+    if is_new:
+        job = submit_ingestion_job(
+            session_id=session_id,
+            collection_name=collection_name,
+            rulebook_key=key,
+            game_name=game_name,
+            source_filename=file.filename,
+            file_path=rulebook_file_path(key, UPLOAD_DIR),
+        )
+        status, job_id = PROCESSING, job.job_id
+    if status != SESSION_READY:
+        # Unanswerable until the new rulebook is in; its job marks the session ready again
+        changes.update(status=PROCESSING, job_id=job_id)
+    session_store.update(session_id, **changes)
+    # Cached chains search the old set of rulebooks
+    evict_conversational_chain(session_id)
+
+    return JSONResponse(status_code=200 if status == SESSION_READY else 202, content={
+        "session_id": session_id,
+        "job_id": job_id if status != SESSION_READY else None,
+        "rulebooks": [session.rulebook_key] + attached,
+        "status": "ready" if status == SESSION_READY else "processing",
+        "message": "Rulebook attached." if status == SESSION_READY
+        else "Rulebook attached. Poll /jobs/{job_id} for ingestion progress."
+    })
+
+@router.put("/sessions/{session_id}/rulebooks/{previous_key}")
+async def update_rulebook(
+    session_id: str,
+    previous_key: str,
+    file : UploadFile = File(...),
+    game_name: Optional[str] = Form(None),
+):
+    """
+    Replace one of the session's rulebooks with a revised PDF (errata, a new printing).
+    Only chunks whose text changed are embedded, and the session keeps its chat history;
+    it answers from the previous revision until the job completes.
+    """
+    session = session_store.get(session_id, touch=True)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if previous_key not in session.rulebook_keys:
+        raise HTTPException(status_code=404, detail="Rulebook is not part of this session")
+    if session.status != SESSION_READY:
+        raise HTTPException(status_code=409, detail="Session is not ready; wait for its rulebooks to be processed")
+
+    game_name = game_name or session.game_name
+    key, collection_name, status, job_id, is_new, referenced = await _store_rulebook(file, game_name, new_session=False)
+    if key == previous_key:
+        if referenced:
+            rulebook_registry.release(key)
+        return {
+            "session_id": session_id,
+            "job_id": None,
+            "rulebooks": session.rulebook_keys,
+            "status": "ready",
+            "message": "Rulebook is unchanged."
+        }
+
+    if not is_new:
+        if status != SESSION_READY:
+            if referenced:
+                rulebook_registry.release(key)
+            raise HTTPException(status_code=409, detail="This revision is still being processed for another session; retry once it is ready")
+        # Someone already stored this exact revision: switch over without ingesting anything
+        session = replace_session_rulebook(session_id, previous_key, key)
+        rulebook_registry.release(previous_key)
+        try:
+            await delete_unused_rulebooks({previous_key: collection_name})
+        except Exception as e:
+            print(f"Could not delete replaced rulebook '{previous_key[:16]}': {e}")
+        return {
+            "session_id": session_id,
+            "job_id": None,
+            "rulebooks": session.rulebook_keys if session else [key],
+            "status": "ready",
+            "message": "Revision already processed; the session now uses it."
+        }
+
+    job = submit_ingestion_job(
+        session_id=session_id,
+        collection_name=collection_name,
+        rulebook_key=key,
+        game_name=game_name,
+        source_filename=file.filename,
+        file_path=rulebook_file_path(key, UPLOAD_DIR),
+        previous_rulebook_key=previous_key,
+    )
+    return JSONResponse(status_code=202, content={
+        "session_id": session_id,
+        "job_id": job.job_id,
+        "rulebooks": session.rulebook_keys,
+        "status": job.stage,
+        "message": "Revision accepted. Poll /jobs/{job_id}; answers use the previous revision until it completes."
+    })
+
+def _session_sharing_rulebook(key: str) -> Optional[Session]:
+    """
+    A live session of another worker that already uses this rulebook, if this worker doesn't
+    know the rulebook itself. Its points are reused instead of ingesting the PDF again.
+    """
+    if rulebook_registry.get(key) is not None:
+        return None
+    sessions = [
+        s for s in session_store.list_by_rulebook(key)
+        if s.status != SESSION_FAILED and s.collection_name == RULEBOOK_COLLECTION
+    ]
+    # A session that only attached the rulebook may be waiting on one of its other rulebooks,
+    # so prefer sessions created with it
+    sessions.sort(key=lambda s: (s.status != SESSION_READY, s.rulebook_key != key))
+    return sessions[0] if sessions else None
+
+@router.get("/jobs/{job_id}")
+def get_ingestion_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        detail = "Job not found"
+        if JOB_STORE_BACKEND == "memory" and SESSION_STORE_BACKEND != "memory":
+            detail += ("; jobs are only visible to the worker that accepted the upload "
+                       "(set JOB_STORE_BACKEND=sqlite to share them)")
+        raise HTTPException(status_code=404, detail=detail)
+    return job.to_dict()
+
+def _get_ready_session(session_id: str) -> Session:
+    # Every request counts as activity for the idle-session reaper
+    session = session_store.get(session_id, touch=True)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    if session.status == PROCESSING:
+        raise HTTPException(status_code=409, detail="Rulebook is still being processed")
+    if session.status == SESSION_FAILED:
+        raise HTTPException(status_code=422, detail=f"Rulebook ingestion failed: {session.error}")
+
+    return session
+
+def _format_sources(source_documents) -> list:
+    sources=[]
+
+    for doc in source_documents:
+        metadata = doc.metadata
+        sources.append({
+            "page":metadata.get("page", "Unknown"),
+            "source": metadata.get("source", "Unknown"),
+            "text": doc.page_content
+        })
+
+    return sources
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _lookup_cached_answer(
+    session: Session,
+    question: str,
+    retrieval: Optional[RetrievalOptions],
+) -> Tuple[Optional[CachedAnswer], Optional[List[float]]]:
+    """
+    Look the question up in the semantic answer cache.
+
+    Only standalone questions are cacheable: once the session has chat history the chain
+    rewrites the question against it ("what about kings?"), and per-request retrieval
+    options change which chunks the answer is based on. Those turns bypass the cache.
+
+    Returns:
+        (cached answer or None, query embedding to store the fresh answer under, or None on bypass)
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None, None
+    if (retrieval is not None and retrieval.overrides()) or session.has_history:
+        answer_cache.record_bypass()
+        return None, None
+
+    query_embedding = await run_cpu_bound(get_embedding_service().embed_query, question)
+    with timed("answer_cache_lookup"):
+        cached = answer_cache.lookup(session.rulebook_scope, query_embedding)
+    return cached, query_embedding
+
+async def _lookup_summary_answer(
+    session: Session,
+    question: str,
+    retrieval: Optional[RetrievalOptions],
+) -> Optional[Tuple[str, list]]:
+    """
+    Answer generic questions ("how do I play?") from the precomputed rulebook summaries.
+    Like the answer cache, only standalone questions without retrieval options qualify.
+
+    Returns:
+        (answer, sources), or None if the question must go through the chain.
+    """
+    if not RULEBOOK_SUMMARY_ENABLED or session.has_history or (retrieval is not None and retrieval.overrides()):
+        return None
+    return await run_cpu_bound(answer_from_summaries, session.rulebook_keys, question)
+
+async def _record_cached_turn(session: Session, question: str, answer: str):
+    # Record the turn so follow-up questions see it in the chat history
+    memory = restore_memory(session, create_chat_memory())
+    await memory.asave_context({"question": question}, {"answer": answer})
+    persist_memory(session.session_id, memory)
+
 @router.post("/ask")
 async def ask_question(
     session_id: str = Body(...),
     question: str = Body(...),
+    retrieval: Optional[RetrievalOptions] = Body(None),
 ):
-    if session_id not in active_sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    session_data = active_sessions[session_id]
-    collection_name = session_data["collection_name"]
+    session = _get_ready_session(session_id)
+    collection_name = session.collection_name
 
     try:
-        chain = get_conversational_chain(
+        summary = await _lookup_summary_answer(session, question, retrieval)
+        if summary is not None:
+            answer, sources = summary
+            await _record_cached_turn(session, question, answer)
+            return {
+                "answer": answer,
+                "sources": sources,
+                "cached": True,
+                "summary": True
+            }
+
+        cached, query_embedding = await _lookup_cached_answer(session, question, retrieval)
+        if cached is not None:
+            await _record_cached_turn(session, question, cached.answer)
+            return {
+                "answer": cached.answer,
+                "sources": cached.sources,
+                "cached": True
+            }
+
+        chain = await run_cpu_bound(
+            get_conversational_chain,
             collection_name=collection_name,
-            session_id=session_id
+            session_id=session_id,
+            rulebook_keys=session.rulebook_keys,
         )
 
-        result = chain.invoke({
-            "question": question
-        })
+        # The stored history is authoritative: another worker may have answered the last turn
+        restore_memory(session, chain.memory)
+        chain = with_retrieval_options(chain, retrieval.overrides() if retrieval else None)
+
+        token_counter = PromptTokenCounter()
+        # The condense and answer calls of the turn share one deadline
+        with llm_deadline():
+            async with get_llm_gateway().slot(session_id):
+                result = await chain.ainvoke({
+                    "question": question
+                }, config={"callbacks": [token_counter, LLMStageTimer()]})
+        persist_memory(session_id, chain.memory)
+        prompt_token_stats.record(token_counter.prompt_tokens)
 
         answer = result.get("answer", "No answer found")
         source_documents = result.get("source_documents", [])
+        sources = _format_sources(source_documents)
 
-        sources=[]
-
-        for doc in source_documents:
-            metadata = doc.metadata
-            sources.append({
-                "page":metadata.get("page", "Unknown"),
-                "source": metadata.get("source", "Unknown"),
-                "text": doc.page_content
-            })
+        if query_embedding is not None:
+            answer_cache.store(session.rulebook_scope, question, query_embedding, answer, sources)
 
         return{
             "answer": answer,
-            "sources": sources
+            "sources": sources,
+            "cached": False,
+            "prompt_tokens": token_counter.prompt_tokens
         }
     
+    except LLMUnavailableError as e:
+        raise _llm_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to answer question: {str(e)}")
 
+def _llm_unavailable(error: LLMUnavailableError) -> HTTPException:
+    # Quota and overload errors are temporary: tell the client to come back instead of a 500
+    return HTTPException(
+        status_code=503,
+        detail=f"The language model is temporarily unavailable: {str(error)}",
+        headers={"Retry-After": str(max(int(LLM_RETRY_MAX_SECONDS), 1))},
+    )
+
+@router.post("/ask/stream")
+async def ask_question_stream(
+    session_id: str = Body(...),
+    question: str = Body(...),
+    retrieval: Optional[RetrievalOptions] = Body(None),
+):
+    """
+    Server-Sent Events version of /ask.
+
+    Emits a `sources` event as soon as retrieval finishes, a `token` event per generated
+    chunk, then a `done` event with the full answer (or an `error` event).
+    """
+    session = _get_ready_session(session_id)
+    collection_name = session.collection_name
+
+    try:
+        summary = await _lookup_summary_answer(session, question, retrieval)
+        if summary is not None:
+            answer, sources = summary
+            await _record_cached_turn(session, question, answer)
+
+            async def summary_stream():
+                yield _sse_event("sources", {"sources": sources})
+                yield _sse_event("token", {"text": answer})
+                yield _sse_event("done", {"answer": answer, "cached": True, "summary": True})
+
+            return StreamingResponse(
+                summary_stream(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        cached, query_embedding = await _lookup_cached_answer(session, question, retrieval)
+        if cached is not None:
+            await _record_cached_turn(session, question, cached.answer)
+
+            async def cached_stream():
+                yield _sse_event("sources", {"sources": cached.sources})
+                yield _sse_event("token", {"text": cached.answer})
+                yield _sse_event("done", {"answer": cached.answer, "cached": True})
+
+            return StreamingResponse(
+                cached_stream(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        chain = await run_cpu_bound(
+            get_conversational_chain,
+            collection_name=collection_name,
+            session_id=session_id,
+            rulebook_keys=session.rulebook_keys,
+        )
+        restore_memory(session, chain.memory)
+        chain = with_retrieval_options(chain, retrieval.overrides() if retrieval else None)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to answer question: {str(e)}")
+
+    async def event_stream():
+        try:
+            sources = []
+            token_counter = PromptTokenCounter()
+            with llm_deadline():
+                async with get_llm_gateway().slot(session_id):
+                    async for event in astream_conversational_answer(
+                        chain, question, callbacks=[token_counter, LLMStageTimer()]
+                    ):
+                        if event["type"] == "sources":
+                            sources = _format_sources(event["documents"])
+                            yield _sse_event("sources", {"sources": sources})
+                        elif event["type"] == "token":
+                            yield _sse_event("token", {"text": event["text"]})
+                        else:
+                            persist_memory(session_id, chain.memory)
+                            prompt_token_stats.record(token_counter.prompt_tokens)
+                            if query_embedding is not None:
+                                answer_cache.store(
+                                    session.rulebook_scope, question, query_embedding, event["answer"], sources
+                                )
+                            yield _sse_event("done", {
+                                "answer": event["answer"],
+                                "cached": False,
+                                "prompt_tokens": token_counter.prompt_tokens,
+                            })
+        except LLMUnavailableError as e:
+            yield _sse_event("error", {"detail": f"Failed to answer question: {str(e)}", "retryable": True})
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"Failed to answer question: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/ask/batch")
+async def ask_questions_batch(
+    session_id: str = Body(...),
+    questions: List[str] = Body(...),
+    top_k: int = Body(5, ge=1, le=50),
+):
+    """
+    Answer many independent questions about the session's rulebooks, e.g. to pre-generate
+    a FAQ. The questions don't use or extend the chat history.
+
+    Server-Sent Events: an `answer` event per question as soon as it is answered (with its
+    `index` in the request, and `error` instead of `answer` if it failed), then `done`.
+    """
+    if not questions or len(questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=422, detail=f"Send between 1 and {BATCH_MAX_QUESTIONS} questions")
+    session = _get_ready_session(session_id)
+    query_filter = rulebook_filter(session.rulebook_keys)
+
+    async def event_stream():
+        failed = 0
+        try:
+            async for result in astream_answer_questions(
+                questions, session.collection_name, top_k, query_filter, session_id=session_id
+            ):
+                failed += "error" in result
+                yield _sse_event("answer", result)
+            yield _sse_event("done", {"questions": len(questions), "failed": failed})
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"Failed to answer questions: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.post("/end")
 async def end_session(
     session_id:str = Body(...,embed=True),
 ):
-    if session_id not in active_sessions:
+    # Rulebooks are shared by every session using them; only the last one out deletes their points.
+    # Rulebooks still being ingested are cleaned up by their job.
+    try:
+        ended = await end_stored_session(session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete rulebook: {str(e)}")
+
+    if ended is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    session_data = active_sessions[session_id]
-    collection_name = session_data["collection_name"]
-    rulebook_path = session_data["file_path"]
 
-    qdrant_client = create_qdrant_client()
+    _, deleted = ended
+    if not deleted:
+        return {"message": f"Session {session_id} ended."}
 
-    try:
-        qdrant_client.delete_collection(collection_name=collection_name)
-        os.remove(rulebook_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete collection: {str(e)}")
-    
-    del active_sessions[session_id]
-    
-    return {"message": f"Session {session_id} ended and collection '{collection_name}' deleted."}
\ No newline at end of file
+    return {"message": f"Session {session_id} ended and {len(deleted)} rulebook(s) deleted."}
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_SIZE = int(os.getenv("ANSWER_CACHE_MAX_SIZE", "5000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+# Minimum cosine similarity between two questions for one to reuse the other's answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    sources: List[Dict[str, Any]]
+    embedding: np.ndarray
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SemanticAnswerCache:
+    """
+    Cache of answers to standalone questions, keyed by rulebook and query embedding.
+
+    A lookup returns the most similar cached question of the same rulebook if its cosine
+    similarity reaches `threshold`. Rulebooks are identified by their registry key (content
+    hash + chunking + embedding model), so entries survive the rulebook's collection being
+    deleted and are reused when the same PDF is uploaded again.
+
+    Entries expire `ttl_seconds` after they were stored; the least recently used entry is
+    evicted once `max_size` is reached.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, threshold: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._rulebooks: Dict[str, "OrderedDict[str, CachedAnswer]"] = {}
+        # Global recency order over (rulebook_key, entry_id), least recently used first
+        self._lru: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, key: str, entry_id: str):
+        entries = self._rulebooks.get(key)
+        if entries is not None:
+            entries.pop(entry_id, None)
+            if not entries:
+                del self._rulebooks[key]
+        self._lru.pop((key, entry_id), None)
+
+    def _expire(self, key: str, now: float):
+        entries = self._rulebooks.get(key)
+        if not entries:
+            return
+        # Entries of a rulebook are kept in insertion order, so expired ones are at the front
+        expired = []
+        for entry_id, entry in entries.items():
+            if now - entry.created_at <= self.ttl_seconds:
+                break
+            expired.append(entry_id)
+        for entry_id in expired:
+            self._remove(key, entry_id)
+            self.evictions += 1
+
+    def lookup(self, rulebook_key: str, embedding: Sequence[float]) -> Optional[CachedAnswer]:
+        query = self._normalize(embedding)
+        with self._lock:
+            self._expire(rulebook_key, time.monotonic())
+            entries = self._rulebooks.get(rulebook_key)
+            if not entries:
+                self.misses += 1
+                return None
+
+            entry_ids = list(entries)
+            similarities = np.stack([entries[entry_id].embedding for entry_id in entry_ids]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._lru.move_to_end((rulebook_key, entry_ids[best]))
+            self.hits += 1
+            return entries[entry_ids[best]]
+
+    def store(
+        self,
+        rulebook_key: str,
+        question: str,
+        embedding: Sequence[float],
+        answer: str,
+        sources: List[Dict[str, Any]],
+    ):
+        entry_id = uuid.uuid4().hex
+        entry = CachedAnswer(question=question, answer=answer, sources=sources, embedding=self._normalize(embedding))
+        with self._lock:
+            self._rulebooks.setdefault(rulebook_key, OrderedDict())[entry_id] = entry
+            self._lru[(rulebook_key, entry_id)] = None
+            while len(self._lru) > self.max_size:
+                (key, oldest_id), _ = self._lru.popitem(last=False)
+                self._remove(key, oldest_id)
+                self.evictions += 1
+
+    def record_bypass(self):
+        """
+        Count a question that could not use the cache (follow-up or per-request retrieval options).
+        """
+        with self._lock:
+            self.bypasses += 1
+
+    def drop_rulebook(self, rulebook_key: str) -> int:
+        with self._lock:
+            entries = self._rulebooks.pop(rulebook_key, None) or {}
+            for entry_id in entries:
+                self._lru.pop((rulebook_key, entry_id), None)
+            return len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": ANSWER_CACHE_ENABLED,
+                "size": len(self._lru),
+                "rulebooks": len(self._rulebooks),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+answer_cache = SemanticAnswerCache(
+    max_size=ANSWER_CACHE_MAX_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    threshold=ANSWER_CACHE_THRESHOLD,
+)
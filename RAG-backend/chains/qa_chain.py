@@ -1,45 +1,149 @@
-from langchain.chains.conversational_retrieval.base import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import ConversationalRetrievalChain, _get_chat_history
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun
 from langchain.memory import ConversationBufferMemory
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.vectorstores import VectorStoreRetriever
 from retriever.hybrid_retriever import create_hybrid_retriever
 from llm.call_LLM import call_gemini
-from active_sessions.sessions import active_sessions
-from langchain_google_genai import ChatGoogleGenerativeAI
+from llm.gateway import GatewayChatModel, get_llm_gateway
+from chains.session_memory import create_session_memory, MEMORY_STRATEGY
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.language_models import BaseChatModel
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+from observability.llm_timing import CONDENSE_TAG, GENERATE_TAG
+from observability.metrics import observe_stage
 import google.generativeai as genai
+import threading
+import time
 import os
 
-def get_conversational_chain(
+CHAIN_CACHE_MAX_SIZE = int(os.getenv("CHAIN_CACHE_MAX_SIZE", "1000"))
+CHAIN_CACHE_TTL_SECONDS = float(os.getenv("CHAIN_CACHE_TTL_SECONDS", "1800"))
+
+
+class ChainCache:
+    """
+    LRU cache of compiled conversational chains keyed by (session_id, scope), where the scope
+    names the collection and rulebooks the chain searches (see `get_conversational_chain`).
+
+    Entries idle for longer than `ttl_seconds` are dropped on the next access,
+    and the least recently used entry is evicted once `max_size` is reached.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[ConversationalRetrievalChain, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (_, last_used) = next(iter(self._entries.items()))
+            if now - last_used <= self.ttl_seconds:
+                break
+            del self._entries[key]
+            self.evictions += 1
+
+    def get(self, session_id: str, scope: str) -> Optional[ConversationalRetrievalChain]:
+        key = (session_id, scope)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = (entry[0], now)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, session_id: str, scope: str, chain: ConversationalRetrievalChain):
+        key = (session_id, scope)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._entries[key] = (chain, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def evict_session(self, session_id: str) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == session_id]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+chain_cache = ChainCache(max_size=CHAIN_CACHE_MAX_SIZE, ttl_seconds=CHAIN_CACHE_TTL_SECONDS)
+
+_llm: Optional[BaseChatModel] = None
+_llm_lock = threading.Lock()
+
+
+def get_chat_model() -> BaseChatModel:
+    """
+    Return the shared chat model. It sends every call through the LLM gateway (one pooled
+    client, timeouts, retries), so all sessions can use it.
+    """
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = GatewayChatModel(gateway=get_llm_gateway())
+    return _llm
+
+
+def create_chat_memory() -> BaseChatMemory:
+    """
+    Create an empty memory of the configured strategy, summarizing with the shared chat model if needed.
+    """
+    return create_session_memory(llm=get_chat_model() if MEMORY_STRATEGY == "summary" else None)
+
+
+def build_conversational_chain(
     collection_name: str,
     session_id: str,
+    rulebook_keys: Optional[List[str]] = None,
 ) -> ConversationalRetrievalChain:
     """
     Create a conversational retrieval chain for the given session.
 
+    The chain gets its own memory object; callers load the session's stored history into
+    `chain.memory` before each turn (`restore_memory`) and write it back afterwards.
+
     Args:
         collection_name (str): The name of the Qdrant collection to use.
         session_id (str): The unique identifier for the session.
+        rulebook_keys (Optional[List[str]]): The session's rulebooks in that collection.
 
     Returns:
         ConversationalRetrievalChain: The configured conversational retrieval chain.
     """
-    retriever  = create_hybrid_retriever(collection_name)
+    retriever  = create_hybrid_retriever(collection_name, rulebook_keys=rulebook_keys)
 
-
-    geminimodel = ChatGoogleGenerativeAI(
-        model="gemini-1.5-flash",
-        temperature=0.2,
-        google_api_key=os.getenv("GEMINI_API_KEY")
-    )
+    geminimodel = get_chat_model()
     #geminimodel = genai.GenerativeModel(model_name="models/gemini-1.5-flash-latest")
-    session_data = active_sessions.get(session_id)
-    if not session_data:
-        raise ValueError(f"No active session found for session_id: {session_id}")
-    
-    memory = session_data.get("memory")
-    if not memory:
-        raise ValueError(f"No memory found for session_id: {session_id}")
-    
+    memory = create_chat_memory()
+
     chain  = ConversationalRetrievalChain.from_llm(
         llm=geminimodel,
         retriever=retriever,
@@ -47,5 +151,119 @@ def get_conversational_chain(
         verbose=True,
         return_source_documents=True
     )
+    # Lets LLMStageTimer tell the two LLM calls of a turn apart
+    chain.question_generator.tags = [CONDENSE_TAG]
+    chain.combine_docs_chain.tags = [GENERATE_TAG]
 
     return chain
+
+
+def get_conversational_chain(
+    collection_name: str,
+    session_id: str,
+    rulebook_keys: Optional[List[str]] = None,
+) -> ConversationalRetrievalChain:
+    """
+    Return the cached conversational retrieval chain for the session, building it on a miss.
+
+    The cache key includes the rulebooks, so attaching one (possibly via another worker)
+    makes every worker build a chain over the new set on its next turn.
+
+    Args:
+        collection_name (str): The name of the Qdrant collection to use.
+        session_id (str): The unique identifier for the session.
+        rulebook_keys (Optional[List[str]]): The session's rulebooks in that collection.
+
+    Returns:
+        ConversationalRetrievalChain: The configured conversational retrieval chain.
+    """
+    scope = "|".join([collection_name, *(rulebook_keys or [])])
+    chain = chain_cache.get(session_id, scope)
+    if chain is None:
+        chain = build_conversational_chain(collection_name, session_id, rulebook_keys)
+        chain_cache.put(session_id, scope, chain)
+    return chain
+
+
+def with_retrieval_options(
+    chain: ConversationalRetrievalChain,
+    options: Optional[Dict[str, Any]],
+) -> ConversationalRetrievalChain:
+    """
+    Return a shallow copy of the chain whose retriever uses the given per-request options.
+    The copy shares the session memory, so the turn is still recorded on the cached chain's history.
+    """
+    if not options:
+        return chain
+    retriever = chain.retriever.model_copy(update=options)
+    return chain.model_copy(update={"retriever": retriever})
+
+
+def evict_conversational_chain(session_id: str) -> int:
+    """
+    Drop every cached chain for the session. Returns the number of entries removed.
+    """
+    return chain_cache.evict_session(session_id)
+
+
+async def astream_conversational_answer(
+    chain: ConversationalRetrievalChain,
+    question: str,
+    callbacks: Optional[List[BaseCallbackHandler]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the conversational retrieval chain step by step, yielding events as they become available.
+
+    Mirrors `ConversationalRetrievalChain._acall`: the question is condensed against the chat
+    history, documents are retrieved, then the answer is generated. The question/answer pair is
+    saved to the chain's memory exactly as `chain.invoke` would.
+
+    `callbacks` are attached to both LLM calls (e.g. a `PromptTokenCounter`).
+
+    Yields:
+        Dict[str, Any]: {"type": "sources", "documents": [...]} once retrieval finishes,
+        {"type": "token", "text": ...} for every generated chunk, and finally
+        {"type": "answer", "answer": ...} with the full text.
+    """
+    run_manager = AsyncCallbackManagerForChainRun.get_noop_manager()
+    inputs = {"question": question, **chain.memory.load_memory_variables({"question": question})}
+
+    get_chat_history = chain.get_chat_history or _get_chat_history
+    chat_history_str = get_chat_history(inputs["chat_history"])
+    if chat_history_str:
+        new_question = await chain.question_generator.arun(
+            question=question, chat_history=chat_history_str, callbacks=callbacks
+        )
+    else:
+        new_question = question
+
+    docs = await chain._aget_docs(new_question, inputs, run_manager=run_manager)
+    yield {"type": "sources", "documents": docs}
+
+    if chain.response_if_no_docs_found is not None and len(docs) == 0:
+        answer = chain.response_if_no_docs_found
+        yield {"type": "token", "text": answer}
+    else:
+        combine_chain = chain.combine_docs_chain
+        prompt_inputs = combine_chain._get_inputs(
+            docs,
+            question=new_question if chain.rephrase_question else question,
+            chat_history=chat_history_str,
+        )
+        prompt = combine_chain.llm_chain.prompt.format_prompt(**prompt_inputs)
+
+        parts = []
+        start = time.perf_counter()
+        async for chunk in combine_chain.llm_chain.llm.astream(
+            prompt.to_messages(), config={"callbacks": callbacks, "tags": [GENERATE_TAG]}
+        ):
+            if chunk.content:
+                if not parts:
+                    observe_stage("generate_first_token", time.perf_counter() - start)
+                parts.append(chunk.content)
+                yield {"type": "token", "text": chunk.content}
+        answer = "".join(parts)
+
+    # Async save, so a summarizing memory doesn't block the event loop on its LLM call
+    await chain.memory.asave_context({"question": question}, {"answer": answer})
+    yield {"type": "answer", "answer": answer}
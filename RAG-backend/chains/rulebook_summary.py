@@ -0,0 +1,170 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseLanguageModel
+
+from chains.qa_chain import get_chat_model
+from embeddings.embedding_service import get_embedding_service
+from observability.metrics import timed
+from retriever.bm25_index import BM25Index
+from vectorstores.qdrant_store import get_rulebook_summaries, store_rulebook_summary
+
+RULEBOOK_SUMMARY_ENABLED = os.getenv("RULEBOOK_SUMMARY_ENABLED", "true").lower() == "true"
+# Chunks per section, picked by BM25, that the summary is written from
+SUMMARY_CHUNKS_PER_SECTION = int(os.getenv("SUMMARY_CHUNKS_PER_SECTION", "4"))
+# Minimum cosine similarity between a question and a generic one for the summary to answer it
+GENERIC_QUESTION_THRESHOLD = float(os.getenv("GENERIC_QUESTION_THRESHOLD", "0.85"))
+
+# section -> (heading, BM25 query picking the chunks the section is written from)
+SUMMARY_SECTIONS = {
+    "setup": ("Setup", "setup set up prepare board place placed pieces components start beginning"),
+    "turns": ("Turn structure", "turn turns player players move moves order first each play"),
+    "winning": ("Winning", "win wins winner won end ends game over lose loses draw drawn victory"),
+}
+
+# Generic questions a summary answers, and the sections that answer them
+GENERIC_QUESTIONS = {
+    "How do I play?": list(SUMMARY_SECTIONS),
+    "How do you play this game?": list(SUMMARY_SECTIONS),
+    "What are the rules?": list(SUMMARY_SECTIONS),
+    "Give me an overview of the game": list(SUMMARY_SECTIONS),
+    "How do I set up the game?": ["setup"],
+    "How is the game set up?": ["setup"],
+    "How does a turn work?": ["turns"],
+    "What can I do on my turn?": ["turns"],
+    "How do you win?": ["winning"],
+    "What are the winning conditions?": ["winning"],
+    "How does the game end?": ["winning"],
+}
+
+NOT_COVERED = "Not covered in the rulebook."
+
+SUMMARY_PROMPT = """You are summarizing the rulebook of the board game "{game}" for a new player.
+Using only the rulebook excerpts below, write the following sections, each starting with its heading on its own line:
+{headings}
+Keep each section under 120 words. If the excerpts do not cover a section, write "{not_covered}" under its heading.
+
+Rulebook excerpts:
+{excerpts}
+"""
+
+_HEADING = re.compile(r"^\s*#+\s*(.+?)\s*:?\s*$")
+
+
+def select_summary_chunks(index: BM25Index, per_section: int = SUMMARY_CHUNKS_PER_SECTION) -> List[Document]:
+    """
+    The chunks most relevant to any summary section, without duplicates, in page order.
+    """
+    chunks: Dict[Tuple, Document] = {}
+    for _, query in SUMMARY_SECTIONS.values():
+        for doc, _ in index.search(query, k=per_section):
+            chunks.setdefault((doc.page_content, doc.metadata.get("page")), doc)
+    return sorted(chunks.values(), key=lambda doc: doc.metadata.get("page") or 0)
+
+
+def parse_sections(text: str) -> Dict[str, str]:
+    """
+    Split the model's answer into its sections, dropping the ones the rulebook did not cover.
+    """
+    by_heading = {heading.lower(): section for section, (heading, _) in SUMMARY_SECTIONS.items()}
+    sections: Dict[str, List[str]] = {}
+    current = None
+    for line in text.splitlines():
+        match = _HEADING.match(line)
+        if match:
+            current = by_heading.get(match.group(1).strip("*").lower())
+            if current is not None:
+                sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    parsed = {section: "\n".join(lines).strip() for section, lines in sections.items()}
+    return {section: body for section, body in parsed.items() if body and body != NOT_COVERED}
+
+
+def summarize_rulebook(
+    rulebook_key: str,
+    game_name: str,
+    index: BM25Index,
+    llm: Optional[BaseLanguageModel] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Write a rulebook's setup / turn structure / winning summary from its most relevant
+    chunks and store it for `answer_from_summaries`. Called once per rulebook at ingest time.
+
+    Returns:
+        The stored summary, or None if the rulebook had no chunks or the model wrote no section.
+    """
+    chunks = select_summary_chunks(index)
+    if not chunks:
+        return None
+    prompt = SUMMARY_PROMPT.format(
+        game=game_name,
+        headings="\n".join(f"## {heading}" for heading, _ in SUMMARY_SECTIONS.values()),
+        not_covered=NOT_COVERED,
+        excerpts="\n\n".join(f"[Page {doc.metadata.get('page', '?')}]\n{doc.page_content}" for doc in chunks),
+    )
+    with timed("summarize_rulebook"):
+        response = (llm or get_chat_model()).invoke(prompt)
+    sections = parse_sections(getattr(response, "content", response))
+    if not sections:
+        return None
+
+    summary = {
+        "game": game_name,
+        "sections": sections,
+        "sources": [
+            {"page": doc.metadata.get("page", "Unknown"), "source": doc.metadata.get("source", "Unknown"), "text": doc.page_content}
+            for doc in chunks
+        ],
+    }
+    store_rulebook_summary(rulebook_key, summary)
+    return summary
+
+
+def match_generic_question(question: str) -> Optional[List[str]]:
+    """
+    The summary sections answering `question` if it is one of the generic questions
+    (or close enough to one), otherwise None.
+    """
+    embedding = get_embedding_service()
+    questions = list(GENERIC_QUESTIONS)
+    # Both are served from the query embedding cache after the first call
+    vectors = embedding.embed_queries(questions + [question])
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    similarities = vectors[:-1] @ vectors[-1]
+    best = int(np.argmax(similarities))
+    if similarities[best] < GENERIC_QUESTION_THRESHOLD:
+        return None
+    return GENERIC_QUESTIONS[questions[best]]
+
+
+def answer_from_summaries(rulebook_keys: List[str], question: str) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Answer a generic question ("how do I play?") from the precomputed summaries of the
+    given rulebooks, without retrieval or an LLM call.
+
+    Returns:
+        (answer, sources), or None if the question isn't generic or a rulebook has no
+        summary covering it.
+    """
+    sections = match_generic_question(question)
+    if sections is None:
+        return None
+    with timed("summary_lookup"):
+        summaries = get_rulebook_summaries(rulebook_keys)
+
+    parts, sources = [], []
+    for key in rulebook_keys:
+        summary = summaries.get(key)
+        if summary is None or any(section not in summary["sections"] for section in sections):
+            return None
+        if len(sections) == 1:
+            body = summary["sections"][sections[0]]
+        else:
+            body = "\n\n".join(f"**{SUMMARY_SECTIONS[section][0]}**\n{summary['sections'][section]}" for section in sections)
+        parts.append(f"### {summary['game']}\n{body}" if len(rulebook_keys) > 1 else body)
+        sources.extend(summary["sources"])
+    return "\n\n".join(parts), sources
@@ -0,0 +1,204 @@
+import math
+from abc import abstractmethod
+import os
+import statistics
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from langchain.memory import ConversationBufferMemory, ConversationSummaryBufferMemory
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage
+
+# buffer (unbounded, the original behaviour) | window | token | summary
+MEMORY_STRATEGY = os.getenv("MEMORY_STRATEGY", "token")
+MEMORY_WINDOW_TURNS = int(os.getenv("MEMORY_WINDOW_TURNS", "6"))
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "1500"))
+PROMPT_METRICS_WINDOW = int(os.getenv("PROMPT_METRICS_WINDOW", "1000"))
+
+# Gemini averages roughly four characters per token on English text. Counting locally keeps
+# pruning off the network (the Gemini client's get_num_tokens calls the API).
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_message_tokens(messages: List[BaseMessage]) -> int:
+    return sum(estimate_tokens(message.content) for message in messages if isinstance(message.content, str))
+
+
+class _PrunedBufferMemory(ConversationBufferMemory):
+    """
+    Buffer memory that drops old messages from the stored history after every turn,
+    so both the prompt and the server-side history stay bounded.
+    """
+
+    @abstractmethod
+    def _prune(self) -> List[BaseMessage]:
+        """
+        Drop old messages from `chat_memory` and return them.
+        """
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self._prune()
+
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        await super().asave_context(inputs, outputs)
+        self._prune()
+
+
+class WindowedMemory(_PrunedBufferMemory):
+    """
+    Keep only the last `k` question/answer turns.
+    """
+    k: int = MEMORY_WINDOW_TURNS
+
+    def _prune(self) -> List[BaseMessage]:
+        messages = self.chat_memory.messages
+        overflow = max(0, len(messages) - 2 * self.k)
+        pruned = messages[:overflow]
+        del messages[:overflow]
+        return pruned
+
+
+class TokenBudgetMemory(_PrunedBufferMemory):
+    """
+    Keep the most recent messages whose combined size fits in `max_token_limit` tokens.
+    """
+    max_token_limit: int = MEMORY_MAX_TOKENS
+
+    def _prune(self) -> List[BaseMessage]:
+        messages = self.chat_memory.messages
+        pruned = []
+        while messages and count_message_tokens(messages) > self.max_token_limit:
+            pruned.append(messages.pop(0))
+        return pruned
+
+
+class RollingSummaryMemory(ConversationSummaryBufferMemory):
+    """
+    Recent messages verbatim plus an LLM-written summary of everything older.
+
+    When the buffer exceeds `max_token_limit`, the oldest messages are folded into the
+    summary until the buffer is back under half the limit. Folding in batches means the
+    summarizer runs every few turns rather than on every turn once the budget is reached.
+    """
+    max_token_limit: int = MEMORY_MAX_TOKENS
+
+    def _messages_to_summarize(self) -> List[BaseMessage]:
+        messages = self.chat_memory.messages
+        if count_message_tokens(messages) <= self.max_token_limit:
+            return []
+        pruned = []
+        while messages and count_message_tokens(messages) > self.max_token_limit // 2:
+            pruned.append(messages.pop(0))
+        return pruned
+
+    def prune(self) -> None:
+        pruned = self._messages_to_summarize()
+        if pruned:
+            self.moving_summary_buffer = self.predict_new_summary(pruned, self.moving_summary_buffer)
+
+    async def aprune(self) -> None:
+        pruned = self._messages_to_summarize()
+        if pruned:
+            self.moving_summary_buffer = await self.apredict_new_summary(pruned, self.moving_summary_buffer)
+
+
+def create_session_memory(
+    strategy: str = MEMORY_STRATEGY,
+    llm: Optional[BaseLanguageModel] = None,
+) -> BaseChatMemory:
+    """
+    Create the chat memory for a new session using the configured strategy.
+
+    Args:
+        strategy (str): "buffer", "window", "token" or "summary".
+        llm (Optional[BaseLanguageModel]): Model used to write summaries; only needed for "summary".
+
+    Returns:
+        A LangChain memory that exposes the history as `chat_history` messages.
+    """
+    options = dict(memory_key="chat_history", return_messages=True, input_key="question", output_key="answer")
+
+    if strategy == "buffer":
+        return ConversationBufferMemory(**options)
+    if strategy == "window":
+        return WindowedMemory(**options)
+    if strategy == "token":
+        return TokenBudgetMemory(**options)
+    if strategy == "summary":
+        if llm is None:
+            raise ValueError("The summary memory strategy needs an LLM")
+        return RollingSummaryMemory(llm=llm, **options)
+    raise ValueError(f"Unknown MEMORY_STRATEGY: {strategy}")
+
+
+def has_chat_history(memory) -> bool:
+    """
+    Whether the next question will be condensed against earlier turns (kept or summarized).
+    """
+    return bool(memory.chat_memory.messages) or bool(getattr(memory, "moving_summary_buffer", ""))
+
+
+class PromptTokenCounter(BaseCallbackHandler):
+    """
+    Callback that adds up the (estimated) prompt tokens of every LLM call made for one question,
+    i.e. the condense-question prompt (follow-ups only) and the answer prompt.
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.llm_calls = 0
+
+    def on_chat_model_start(self, serialized, messages: List[List[BaseMessage]], **kwargs: Any) -> None:
+        for prompt in messages:
+            self.prompt_tokens += count_message_tokens(prompt)
+            self.llm_calls += 1
+
+    def on_llm_start(self, serialized, prompts: List[str], **kwargs: Any) -> None:
+        for prompt in prompts:
+            self.prompt_tokens += estimate_tokens(prompt)
+            self.llm_calls += 1
+
+
+class PromptTokenStats:
+    """
+    Prompt tokens per answered question over the last `window` turns, across all sessions.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._turns: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.total_turns = 0
+
+    def record(self, prompt_tokens: int):
+        with self._lock:
+            self._turns.append(prompt_tokens)
+            self.total_turns += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            turns = sorted(self._turns)
+        stats = {
+            "strategy": MEMORY_STRATEGY,
+            "total_turns": self.total_turns,
+            "window": len(turns),
+        }
+        if turns:
+            stats.update({
+                "prompt_tokens_mean": round(statistics.fmean(turns), 1),
+                "prompt_tokens_p50": turns[len(turns) // 2],
+                "prompt_tokens_p95": turns[min(len(turns) - 1, int(len(turns) * 0.95))],
+                "prompt_tokens_max": turns[-1],
+            })
+        return stats
+
+
+prompt_token_stats = PromptTokenStats(window=PROMPT_METRICS_WINDOW)
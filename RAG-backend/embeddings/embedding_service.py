@@ -0,0 +1,332 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+from observability.metrics import timed
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# Inference backend: "torch" (PyTorch) or "onnx" (ONNX Runtime, needs sentence-transformers[onnx])
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# "int8" runs dynamically quantized Linear layers (torch) or a quantized ONNX export (onnx)
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "none")
+# ONNX file inside the model repo; defaults to the plain or the AVX2 int8 export
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")
+# Intra-op threads of the inference runtime (0 = runtime default, usually one per core)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Texts per forward pass
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# With length bucketing, a forward pass holds at most this many (padded) tokens: short texts
+# such as queries are batched widely, long chunks narrowly (0 = fixed EMBED_BATCH_SIZE batches)
+EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "0"))
+# Query strings whose embeddings are kept (LRU, shared by every session; 0 = no cache)
+EMBED_QUERY_CACHE_SIZE = int(os.getenv("EMBED_QUERY_CACHE_SIZE", "2048"))
+
+EMBEDDING_BACKENDS = {"torch", "onnx"}
+EMBEDDING_QUANTIZATIONS = {"none", "int8"}
+_ONNX_FILES = {"none": "onnx/model.onnx", "int8": "onnx/model_quint8_avx2.onnx"}
+# Rough characters per word-piece token, to estimate padded lengths without tokenizing twice
+_CHARS_PER_TOKEN = 4
+
+
+def current_rss_mb() -> Optional[float]:
+    """
+    Best-effort resident memory of the current process in MB.
+    Uses psutil when installed, otherwise the peak RSS reported by `resource`.
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    divisor = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024
+    return max_rss / divisor
+
+
+class EmbeddingService(Embeddings):
+    """
+    Process-wide, lazily loaded SentenceTransformer model.
+
+    The model is loaded on first use (or by `warmup`) and shared by the ingest
+    path, the retrievers and the LangChain chain. It also implements the
+    LangChain `Embeddings` interface so it can be passed to `QdrantVectorStore`.
+
+    `backend` and `quantization` select how the same model is run on the CPU; every
+    combination produces vectors of the same model, so they can search each other's points.
+
+    Query embeddings are kept in an LRU cache keyed by the exact query string, so repeated
+    questions (such as the frontend's suggested ones) are embedded once per process.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        backend: str = EMBEDDING_BACKEND,
+        quantization: str = EMBEDDING_QUANTIZATION,
+        threads: int = EMBEDDING_THREADS,
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_batch_tokens: int = EMBED_MAX_BATCH_TOKENS,
+        query_cache_size: int = EMBED_QUERY_CACHE_SIZE,
+    ):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+        if quantization not in EMBEDDING_QUANTIZATIONS:
+            raise ValueError(f"Unknown EMBEDDING_QUANTIZATION: {quantization}")
+        self.model_name = model_name
+        self.backend = backend
+        self.quantization = quantization
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self._model: Optional[SentenceTransformer] = None
+        self._load_lock = threading.Lock()
+        # Fast tokenizers are not safe to call from several threads at once
+        self._encode_lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.memory_mb: Optional[float] = None
+        self.query_cache_size = query_cache_size
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
+
+    @property
+    def model(self) -> SentenceTransformer:
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._load()
+        return self._model
+
+    def _load(self):
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+
+        if self.backend == "onnx":
+            model = self._load_onnx()
+        else:
+            model = self._load_torch()
+
+        self.load_seconds = time.perf_counter() - start
+        rss_after = current_rss_mb()
+        if rss_before is not None and rss_after is not None:
+            self.memory_mb = rss_after - rss_before
+        self._model = model
+
+        print(f"Loaded embedding model '{self.model_name}' ({self.label}) in {self.load_seconds:.2f}s.")
+
+    def _load_torch(self) -> SentenceTransformer:
+        if self.threads:
+            import torch
+
+            # Process-wide: torch has a single intra-op thread pool
+            torch.set_num_threads(self.threads)
+        if self.quantization == "none":
+            return SentenceTransformer(self.model_name)
+
+        import torch
+
+        # Dynamic quantization: int8 weights, activations quantized on the fly; CPU only
+        model = SentenceTransformer(self.model_name, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    def _load_onnx(self) -> SentenceTransformer:
+        model_kwargs: Dict[str, Any] = {
+            "provider": "CPUExecutionProvider",
+            "file_name": EMBEDDING_ONNX_FILE or _ONNX_FILES[self.quantization],
+        }
+        if self.threads:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            model_kwargs["session_options"] = options
+        return SentenceTransformer(self.model_name, backend="onnx", device="cpu", model_kwargs=model_kwargs)
+
+    @property
+    def label(self) -> str:
+        return self.backend if self.quantization == "none" else f"{self.backend}-{self.quantization}"
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None, **kwargs: Any) -> np.ndarray:
+        """
+        Encode a list of texts into a 2D numpy array of embeddings.
+
+        Args:
+            texts (List[str]): Texts to encode.
+            batch_size (Optional[int]): Texts per forward pass (the most per pass when length
+                bucketing is on). Defaults to EMBED_BATCH_SIZE.
+            **kwargs: Extra keyword arguments forwarded to `SentenceTransformer.encode`.
+
+        Returns:
+            np.ndarray: Array of shape (len(texts), dimension).
+        """
+        model = self.model
+        batch_size = batch_size or self.batch_size
+        if not self.max_batch_tokens or len(texts) <= 1:
+            with self._encode_lock:
+                return model.encode(texts, batch_size=batch_size, convert_to_numpy=True, **kwargs)
+
+        kwargs.pop("show_progress_bar", None)
+        embeddings = None
+        with self._encode_lock:
+            for batch in self._length_buckets(texts, batch_size):
+                vectors = model.encode(
+                    [texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True,
+                    show_progress_bar=False, **kwargs
+                )
+                if embeddings is None:
+                    embeddings = np.empty((len(texts), vectors.shape[1]), dtype=vectors.dtype)
+                embeddings[batch] = vectors
+        return embeddings
+
+    def _length_buckets(self, texts: List[str], max_batch_size: int) -> List[List[int]]:
+        """
+        Group text indices, shortest first, into batches of similar length whose padded size
+        (longest text x batch size) stays within `max_batch_tokens`.
+        """
+        max_tokens = getattr(self.model, "max_seq_length", None) or 512
+        lengths = [min(len(text) // _CHARS_PER_TOKEN + 2, max_tokens) for text in texts]
+        batches, current, longest = [], [], 0
+        for i in sorted(range(len(texts)), key=lambda i: lengths[i]):
+            longest_if_added = max(longest, lengths[i])
+            if current and (len(current) >= max_batch_size
+                            or longest_if_added * (len(current) + 1) > self.max_batch_tokens):
+                batches.append(current)
+                current, longest_if_added = [], lengths[i]
+            current.append(i)
+            longest = longest_if_added
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed query strings, reusing the cached vectors of strings embedded before.
+        The misses are encoded together in one call.
+
+        Returns:
+            np.ndarray: Array of shape (len(texts), dimension), in input order.
+        """
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        vectors: Dict[str, np.ndarray] = {}
+        with self._query_cache_lock:
+            for text in texts:
+                vector = self._query_cache.get(text)
+                if vector is not None:
+                    self._query_cache.move_to_end(text)
+                    vectors[text] = vector
+            self.query_cache_hits += sum(1 for text in texts if text in vectors)
+
+        missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+        if missing:
+            encoded = self.encode(missing)
+            with self._query_cache_lock:
+                self.query_cache_misses += len(missing)
+                for text, vector in zip(missing, encoded):
+                    vectors[text] = vector
+                    if self.query_cache_size:
+                        self._query_cache[text] = vector
+                        self._query_cache.move_to_end(text)
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+
+        return np.stack([vectors[text] for text in texts])
+
+    def embed_query(self, text: str) -> List[float]:
+        with timed("embed_query"):
+            return self.embed_queries([text])[0].tolist()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "backend": self.label,
+            "threads": self.threads,
+            "batch_size": self.batch_size,
+            "max_batch_tokens": self.max_batch_tokens,
+            "loaded": self.is_loaded,
+            "load_seconds": self.load_seconds,
+            "memory_mb": self.memory_mb,
+            "query_cache": {
+                "size": len(self._query_cache),
+                "max_size": self.query_cache_size,
+                "hits": self.query_cache_hits,
+                "misses": self.query_cache_misses,
+            },
+        }
+
+
+_services: Dict[Tuple[str, str, str], EmbeddingService] = {}
+_registry_lock = threading.Lock()
+
+
+def get_embedding_service(
+    model_name: Optional[str] = None,
+    backend: Optional[str] = None,
+    quantization: Optional[str] = None,
+) -> EmbeddingService:
+    """
+    Return the shared embedding service for the given model, creating it on first use.
+
+    Args:
+        model_name (Optional[str]): SentenceTransformer model name. Defaults to EMBEDDING_MODEL.
+        backend (Optional[str]): "torch" or "onnx". Defaults to EMBEDDING_BACKEND.
+        quantization (Optional[str]): "none" or "int8". Defaults to EMBEDDING_QUANTIZATION.
+
+    Returns:
+        EmbeddingService: The process-wide service for that model and runtime.
+    """
+    key = (model_name or DEFAULT_EMBEDDING_MODEL, backend or EMBEDDING_BACKEND, quantization or EMBEDDING_QUANTIZATION)
+    service = _services.get(key)
+    if service is None:
+        with _registry_lock:
+            service = _services.get(key)
+            if service is None:
+                service = EmbeddingService(*key)
+                _services[key] = service
+    return service
+
+
+def warmup_embedding_service(model_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load the embedding model eagerly and run one dummy encode.
+
+    Returns:
+        Dict[str, Any]: Load time and memory stats of the warmed-up service.
+    """
+    service = get_embedding_service(model_name)
+    service.encode(["warmup"])
+    return service.stats()
+
+
+def embedding_service_stats() -> List[Dict[str, Any]]:
+    """
+    Return stats for every embedding service created in this process.
+    """
+    return [service.stats() for service in _services.values()]
@@ -1,153 +1,213 @@
-from vectorstores.qdrant_store import create_qdrant_client
-from sentence_transformers import SentenceTransformer
-from typing import Any, Dict,List
+from vectorstores.qdrant_store import create_qdrant_client, ensure_collection
+from vectorstores import qdrant_store
+from embeddings.embedding_service import get_embedding_service, EMBED_BATCH_SIZE
+from workers.pools import upsert_executor
+from observability.metrics import timed
+from concurrent.futures import FIRST_COMPLETED, wait
+from collections import Counter
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 from langchain_core.documents import Document
+import contextvars
+import hashlib
 import uuid
 from qdrant_client.models import PointStruct,VectorParams, Distance
-<<<<<<< HEAD
-=======
-<<<<<<< HEAD
-=======
->>>>>>> 8b34fe62d8cae1929ab2ef49956a9f1d590b0b9e
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-<<<<<<< HEAD
-=======
->>>>>>> 64c0f14d9ee34178ef5a7679b610a56439595244
->>>>>>> 8b34fe62d8cae1929ab2ef49956a9f1d590b0b9e
+# Points per upsert request and how many upsert requests may be in flight at once
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+UPSERT_MAX_IN_FLIGHT = int(os.getenv("UPSERT_MAX_IN_FLIGHT", "4"))
 
-def generate_embeddings(documents:list[Document]) -> list[list[float]]:
+# Namespace of the deterministic point ids; changing it would orphan every stored point
+POINT_ID_NAMESPACE = uuid.UUID("2f6b7f0e-8d5c-4a57-9b1e-3c4d5a6e7f80")
+
+def chunk_hash(text: str) -> str:
+    """
+    Content hash of a chunk, used to tell unchanged chunks apart when a rulebook is revised.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+def point_id(rulebook_key: str, content_hash: str, occurrence: int = 0) -> str:
+    """
+    Deterministic Qdrant point id of the `occurrence`-th chunk with this content in a rulebook.
+    Re-running an ingestion overwrites its points instead of duplicating them.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{rulebook_key}:{content_hash}:{occurrence}"))
+
+def tag_chunks(documents: Iterable[Document], rulebook_key: str) -> Iterator[Document]:
+    """
+    Tag chunks with their rulebook, content hash and how often the same text occurred
+    earlier in the rulebook; together these determine the chunk's point id.
+    """
+    seen = Counter()
+    for doc in documents:
+        content_hash = chunk_hash(doc.page_content)
+        doc.metadata.update(rulebook=rulebook_key, chunk_hash=content_hash, occurrence=seen[content_hash])
+        seen[content_hash] += 1
+        yield doc
+
+def document_point_id(doc: Document) -> str:
+    """
+    Point id of a chunk tagged by `tag_chunks`; untagged documents get a random id.
+    """
+    metadata = doc.metadata
+    if "rulebook" in metadata and "chunk_hash" in metadata:
+        return point_id(metadata["rulebook"], metadata["chunk_hash"], metadata.get("occurrence", 0))
+    return str(uuid.uuid4())
+
+def generate_embeddings(
+    documents:list[Document],
+    show_progress_bar:bool=True,
+    batch_size:int=EMBED_BATCH_SIZE,
+) -> list[list[float]]:
     """
-    Generate embeddings for a list of texts using a specified SentenceTransformer model.
-    
+    Generate embeddings for a list of texts using the shared SentenceTransformer model.
+
     """
-    embedmodel = SentenceTransformer('all-MiniLM-L6-v2')
+    embedmodel = get_embedding_service()
     texts = [doc.page_content for doc in documents]
-    embeddings = embedmodel.encode(texts, show_progress_bar=True,convert_to_numpy=True).tolist()
+    with timed("embed_documents"):
+        embeddings = embedmodel.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar).tolist()
     return embeddings
 
 def build_points(documents: list[Document], embeddings: list[list[float]]) -> list[PointStruct]:
     """
     Build a list of PointStruct objects from documents and their corresponding embeddings.
-    
+
     """
     points = []
 
     for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
         point = PointStruct(
-            id=str(uuid.uuid4()),
+            id=document_point_id(doc),
             vector=embedding,
+            # Same payload layout as QdrantVectorStore, so LangChain retrievers can read these points
             payload={
-                "text": doc.page_content,
-                **doc.metadata
+                "page_content": doc.page_content,
+                "metadata": doc.metadata,
             }
         )
         points.append(point)
     return points
-    
-def store_in_qdrant(documents:List[Document],collection_name:str,vector_dim:int=384):
+
+def _upsert_batch(qdrant_client, collection_name: str, points: list[PointStruct]):
+    with timed("qdrant_upsert"):
+        qdrant_client.upsert(collection_name=collection_name, points=points, wait=True)
+
+def store_in_qdrant(
+    documents:Iterable[Document],
+    collection_name:str,
+    vector_dim:int=384,
+    batch_size:int=UPSERT_BATCH_SIZE,
+    progress_callback:Optional[Callable[[int, Optional[int]], None]]=None,
+    max_in_flight:int=UPSERT_MAX_IN_FLIGHT,
+    embed_batch_size:int=EMBED_BATCH_SIZE,
+) -> int:
     """
     Store documents in Qdrant vector database.
-    
+
     Args:
-        documents (List[Document]): List of LangChain Document objects to store.
+        documents (Iterable[Document]): LangChain Documents to store. May be a
+            generator (e.g. `iter_pdf_chunks`); batches are embedded as they fill up.
         collection_name (str): Name of the Qdrant collection to store the documents in.
         vector_dim (int): Dimension of the embedding vectors.
-        
+        batch_size (int): Number of documents embedded and upserted per batch.
+        progress_callback (Optional[Callable[[int, Optional[int]], None]]): Called with
+            (chunks_stored, total_chunks) after every batch. total_chunks is None
+            when `documents` is a generator.
+        max_in_flight (int): Maximum number of upsert requests running while
+            the next batch is being embedded.
+        embed_batch_size (int): Number of documents per embedding forward pass.
+
     Returns:
-        None
+        int: Number of documents stored.
     """
-<<<<<<< HEAD
     # embeddings = generate_embeddings(documents)
-=======
-<<<<<<< HEAD
-    # Generate embeddings for the documents
-    embeddings = generate_embeddings(documents)
->>>>>>> 8b34fe62d8cae1929ab2ef49956a9f1d590b0b9e
-    
+
     # points = build_points(documents, embeddings)
 
     # qdrant_client = create_qdrant_client()
-    
+
     # qdrant_client.recreate_collection(
     #     collection_name=collection_name,
     #     vectors_config=VectorParams(size=vector_dim, distance=Distance.COSINE)
     # )
-    
+
     # qdrant_client.upsert(
     #     collection_name=collection_name,
     #     points=points
     # )
-    
-    embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
 
-    vector_store = QdrantVectorStore.from_documents(
-        documents=documents,
-        embedding=embedding_model,
-        url=QDRANT_URL,
-        api_key=QDRANT_API_KEY,
-        prefer_grpc=False,
-        collection_name=collection_name,
-    )
+    total = len(documents) if hasattr(documents, "__len__") else None
+    documents = iter(documents)
 
-    print(f"Stored {len(documents)} documents in Qdrant collection '{collection_name}'.")
+    # Goes through the vector-store layer, so this works for Qdrant Cloud and in-process backends.
+    # The rulebook collection is shared, so it is only created (with its payload indexes) once.
+    ensure_collection(collection_name, vector_dim)
+    qdrant_client = create_qdrant_client()
 
-def delete_collection(collection_name: str):
-<<<<<<< HEAD
+    stored = 0
+    in_flight = {}
+
+    def collect(futures):
+        nonlocal stored
+        for future in futures:
+            # .result() re-raises upsert errors so the ingestion job fails
+            future.result()
+            stored += in_flight.pop(future)
+            if progress_callback:
+                progress_callback(stored, total)
 
-=======
+    try:
+        while True:
+            batch = list(islice(documents, batch_size))
+            if not batch:
+                break
+            points = build_points(batch, generate_embeddings(batch, show_progress_bar=False, batch_size=embed_batch_size))
+
+            # Embedding the next batch overlaps with the network round-trips of the previous ones
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            # Run in a copy of the job's context so slow upserts are logged with its trace id
+            future = upsert_executor.submit(
+                contextvars.copy_context().run, _upsert_batch, qdrant_client, collection_name, points
+            )
+            in_flight[future] = len(batch)
+
+        collect(list(in_flight))
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+    print(f"Stored {stored} documents in Qdrant collection '{collection_name}'.")
+    return stored
+
+def delete_collection(collection_name: str):
     """
     Delete a collection from Qdrant.
-    
+
     Args:
         collection_name (str): Name of the Qdrant collection to delete.
-        
+
     Returns:
         None
     """
-=======
-    # embeddings = generate_embeddings(documents)
-    
-    # points = build_points(documents, embeddings)
-
-    # qdrant_client = create_qdrant_client()
-    
-    # qdrant_client.recreate_collection(
-    #     collection_name=collection_name,
-    #     vectors_config=VectorParams(size=vector_dim, distance=Distance.COSINE)
-    # )
-    
-    # qdrant_client.upsert(
-    #     collection_name=collection_name,
-    #     points=points
-    # )
-    
-    embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    # Delete the collection
+    qdrant_store.delete_collection(collection_name)
 
-    vector_store = QdrantVectorStore.from_documents(
-        documents=documents,
-        embedding=embedding_model,
-        url=QDRANT_URL,
-        api_key=QDRANT_API_KEY,
-        prefer_grpc=False,
-        collection_name=collection_name,
-    )
+    print(f"Deleted Qdrant collection '{collection_name}'.")
 
-    print(f"Stored {len(documents)} documents in Qdrant collection '{collection_name}'.")
+def delete_rulebook(collection_name: str, rulebook_key: str):
+    """
+    Delete one rulebook's points from the shared collection.
 
-def delete_collection(collection_name: str):
+    Args:
+        collection_name (str): Name of the Qdrant collection holding the rulebook.
+        rulebook_key (str): Key of the rulebook whose points are deleted.
+    """
+    qdrant_store.delete_rulebook_points(collection_name, rulebook_key)
 
->>>>>>> 64c0f14d9ee34178ef5a7679b610a56439595244
->>>>>>> 8b34fe62d8cae1929ab2ef49956a9f1d590b0b9e
-    qdrant_client = create_qdrant_client()
-    
-    # Delete the collection
-    qdrant_client.delete_collection(collection_name=collection_name)
-    
-    print(f"Deleted Qdrant collection '{collection_name}'.")
\ No newline at end of file
+    print(f"Deleted rulebook '{rulebook_key[:16]}' from Qdrant collection '{collection_name}'.")
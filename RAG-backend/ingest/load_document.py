@@ -1,11 +1,26 @@
 # ingest/load_documents.py
 
+import mmap
 import os
 import fitz 
 import re
-from typing import List
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from workers.pools import get_pdf_process_pool, PDF_EXTRACT_WORKERS
+from observability.metrics import timed
+
+# Pages handed to one extraction process at a time
+PDF_SHARD_PAGES = int(os.getenv("PDF_SHARD_PAGES", "16"))
+# "file" lets PyMuPDF read the PDF itself; "mmap" hands it a memory-mapped buffer backed by the page cache
+PDF_OPEN_MODE = os.getenv("PDF_OPEN_MODE", "file")
+
+# Compiled once instead of on every page
+_EXCESS_NEWLINES = re.compile(r'\n{3,}')
+_BULLETS = re.compile(r'[•·►\uf0b7\xa0]')
+_PAGE_FOOTER = re.compile(r'page\s+\d+', flags=re.IGNORECASE)
 
 
 def clean_text(text: str) -> str:
@@ -18,13 +33,13 @@ def clean_text(text: str) -> str:
     5. (Optional) Lowercase everything
     """
     # Step 1: Collapse 3+ newlines to 2
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = _EXCESS_NEWLINES.sub('\n\n', text)
 
     # Step 2: Remove bullets and unicode artifacts
-    text = re.sub(r'[•·►\uf0b7\xa0]', '', text)
+    text = _BULLETS.sub('', text)
 
     # Step 3: Remove "Page 3" type headers/footers
-    text = re.sub(r'page\s+\d+', '', text, flags=re.IGNORECASE)
+    text = _PAGE_FOOTER.sub('', text)
 
     # Step 4: Strip leading/trailing whitespace per line
     text = '\n'.join([line.strip() for line in text.splitlines()])
@@ -35,34 +50,101 @@ def clean_text(text: str) -> str:
     return text
 
 
-def extract_text_from_pdf(pdf_path: str) -> List[str]:
+@contextmanager
+def open_pdf(pdf_path: str, mode: str = PDF_OPEN_MODE) -> Iterator[fitz.Document]:
     """
-    Extracts and cleans text from each page of a PDF file.
-    Returns a list of cleaned text strings, one per page.
+    Open a PDF either by path or over a read-only memory map of the file.
+
+    A freshly uploaded file is still in the page cache, so the mapped buffer is
+    parsed without reading it from disk again or copying it into process memory.
+    """
+    if mode != "mmap":
+        with fitz.open(pdf_path) as doc:
+            yield doc
+        return
+
+    with open(pdf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        buffer = memoryview(mapped)
+        try:
+            with fitz.open(stream=buffer, filetype="pdf") as doc:
+                yield doc
+        finally:
+            # The map cannot be closed while a view of it is still exported
+            buffer.release()
+
+
+def extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    """
+    Extract and clean pages [start, stop) of a PDF, skipping pages without text.
+    Runs inside the extraction processes, so it opens the file itself.
     """
-    doc = fitz.open(pdf_path)
     pages = []
+    with open_pdf(pdf_path) as doc:
+        for page_index in range(start, min(stop, doc.page_count)):
+            cleaned_text = clean_text(doc[page_index].get_text())
+            if cleaned_text.strip():
+                pages.append(cleaned_text)
+    return pages
 
-    for i,page in enumerate(doc):
-        raw_text = page.get_text()
-        cleaned_text = clean_text(raw_text)
-        if cleaned_text.strip():
-            pages.append(cleaned_text)
 
-    doc.close()
-    return pages
+def iter_pdf_pages(pdf_path: str, shard_pages: int = PDF_SHARD_PAGES) -> Iterator[str]:
+    """
+    Stream the cleaned text of every non-empty page, in page order.
 
+    Large PDFs are split into `shard_pages`-page ranges extracted on the PDF process pool.
+    Only a couple of shards per worker are in flight at once, so memory stays bounded
+    however long the rulebook is. Small PDFs are extracted inline.
+    """
+    with open_pdf(pdf_path) as doc:
+        page_count = doc.page_count
+
+    if page_count <= shard_pages or PDF_EXTRACT_WORKERS <= 1:
+        for start in range(0, page_count, shard_pages):
+            with timed("pdf_extract"):
+                pages = extract_page_range(pdf_path, start, start + shard_pages)
+            yield from pages
+        return
+
+    pool = get_pdf_process_pool()
+    shards = iter(range(0, page_count, shard_pages))
+    in_flight = deque()
+    try:
+        for start in shards:
+            in_flight.append(pool.submit(extract_page_range, pdf_path, start, start + shard_pages))
+            if len(in_flight) >= 2 * PDF_EXTRACT_WORKERS:
+                break
+        while in_flight:
+            # Time spent waiting on the extraction processes, i.e. how far extraction lags behind
+            with timed("pdf_extract"):
+                pages = in_flight.popleft().result()
+            # Refill the window before handing pages downstream, so workers stay busy
+            next_start = next(shards, None)
+            if next_start is not None:
+                in_flight.append(pool.submit(extract_page_range, pdf_path, next_start, next_start + shard_pages))
+            yield from pages
+    finally:
+        for future in in_flight:
+            future.cancel()
 
-def chunk_pdf_text(
-    text_pages: List[str],
+
+def extract_text_from_pdf(pdf_path: str) -> List[str]:
+    """
+    Extracts and cleans text from each page of a PDF file.
+    Returns a list of cleaned text strings, one per page.
+    """
+    return list(iter_pdf_pages(pdf_path))
+
+
+def iter_pdf_chunks(
+    text_pages: Iterable[str],
     source_filename: str,
     game_name: str,
     chunk_size: int = 500,
     chunk_overlap: int = 100
-) -> List[Document]:
+) -> Iterator[Document]:
     """
-    Chunk the cleaned text into overlapping segments and attach metadata.
-    Each chunk becomes a LangChain Document for use in embedding/RAG.
+    Lazily chunk pages as they arrive (e.g. from `iter_pdf_pages`), so embedding
+    can start before the whole PDF has been extracted.
     """
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
@@ -70,13 +152,12 @@ def chunk_pdf_text(
         separators=["\n\n", "\n", ".", " ", ""]
     )
 
-    documents = []
-
     for page_number, page_text in enumerate(text_pages, start=1):
-        chunks = splitter.split_text(page_text)
+        with timed("chunk"):
+            chunks = splitter.split_text(page_text)
 
         for chunk in chunks:
-            doc = Document(
+            yield Document(
                 page_content=chunk,
                 metadata={
                     "source": source_filename,
@@ -84,6 +165,17 @@ def chunk_pdf_text(
                     "game": game_name
                 }
             )
-            documents.append(doc)
 
-    return documents
+
+def chunk_pdf_text(
+    text_pages: List[str],
+    source_filename: str,
+    game_name: str,
+    chunk_size: int = 500,
+    chunk_overlap: int = 100
+) -> List[Document]:
+    """
+    Chunk the cleaned text into overlapping segments and attach metadata.
+    Each chunk becomes a LangChain Document for use in embedding/RAG.
+    """
+    return list(iter_pdf_chunks(text_pages, source_filename, game_name, chunk_size, chunk_overlap))
@@ -0,0 +1,126 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from qdrant_client.models import PointStruct, Record
+
+from ingest.embed_and_store import (
+    UPSERT_BATCH_SIZE,
+    chunk_hash,
+    document_point_id,
+    store_in_qdrant,
+    _upsert_batch,
+)
+from vectorstores.qdrant_store import create_qdrant_client, scroll_rulebook_points
+
+
+@dataclass
+class ChunkDiff:
+    """
+    How the chunks of a revised rulebook relate to the stored points of the previous revision.
+    """
+    # (stored point, chunk of the new revision with the same text)
+    unchanged: List[Tuple[Record, Document]] = field(default_factory=list)
+    # Chunks whose text is new and must be embedded
+    added: List[Document] = field(default_factory=list)
+    # Stored points whose text no longer occurs
+    stale: List[Record] = field(default_factory=list)
+
+    @property
+    def pages_changed(self) -> List[int]:
+        """
+        Pages of the new revision with at least one new chunk.
+        """
+        return sorted({doc.metadata.get("page") for doc in self.added if doc.metadata.get("page") is not None})
+
+
+def _stored_hash(record: Record) -> str:
+    payload = record.payload or {}
+    metadata = payload.get("metadata") or {}
+    # Points stored before chunks carried their hash are matched by text
+    return metadata.get("chunk_hash") or chunk_hash(payload.get("page_content", ""))
+
+
+def diff_chunks(stored: List[Record], documents: List[Document]) -> ChunkDiff:
+    """
+    Match the chunks of a new revision against the stored points of the old one by content hash.
+
+    A chunk whose text is stored is unchanged, even if it moved to another page; when the
+    same text occurs several times, the stored point on the same page is preferred.
+    """
+    by_hash: Dict[str, List[Record]] = defaultdict(list)
+    for record in stored:
+        by_hash[_stored_hash(record)].append(record)
+
+    diff = ChunkDiff()
+    for doc in documents:
+        candidates = by_hash.get(doc.metadata.get("chunk_hash") or chunk_hash(doc.page_content))
+        if not candidates:
+            diff.added.append(doc)
+            continue
+        page = doc.metadata.get("page")
+        match = next(
+            (r for r in candidates if ((r.payload or {}).get("metadata") or {}).get("page") == page),
+            candidates[0],
+        )
+        candidates.remove(match)
+        diff.unchanged.append((match, doc))
+
+    diff.stale = [record for records in by_hash.values() for record in records]
+    return diff
+
+
+def _copy_points(collection_name: str, unchanged: List[Tuple[Record, Document]], batch_size: int):
+    """
+    Store unchanged chunks under the new revision reusing their stored vectors (no embedding).
+    """
+    qdrant_client = create_qdrant_client()
+    pairs = iter(unchanged)
+    while batch := list(islice(pairs, batch_size)):
+        _upsert_batch(qdrant_client, collection_name, [
+            PointStruct(
+                id=document_point_id(doc),
+                vector=record.vector,
+                payload={"page_content": doc.page_content, "metadata": doc.metadata},
+            )
+            for record, doc in batch
+        ])
+
+
+def apply_revision(
+    collection_name: str,
+    old_key: str,
+    new_key: str,
+    documents: List[Document],
+    progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+    batch_size: int = UPSERT_BATCH_SIZE,
+) -> ChunkDiff:
+    """
+    Store a revised rulebook (chunks tagged with `new_key`) by embedding only the chunks
+    whose text changed; unchanged chunks are copied with their stored vectors.
+
+    The new revision gets its own points (ids derived from `new_key`) and the old revision
+    is left untouched, so sessions keep answering from it until they switch, and the old
+    points can be deleted like any unused rulebook's afterwards. Reusing the old points in
+    place would tie their ids to `old_key`: a later upload of the old revision would take
+    them back.
+
+    Args:
+        collection_name (str): The collection holding both revisions.
+        old_key (str): Rulebook key of the stored revision.
+        new_key (str): Rulebook key of the new revision.
+        documents (List[Document]): Every chunk of the new revision, tagged by `tag_chunks`.
+        progress_callback: Called with (chunks_embedded, chunks_to_embed) while embedding.
+
+    Returns:
+        ChunkDiff: What was reused and embedded, and which stored chunks the new revision drops.
+    """
+    stored = scroll_rulebook_points(collection_name, old_key, with_vectors=True)
+    diff = diff_chunks(stored, documents)
+
+    if diff.added:
+        store_in_qdrant(diff.added, collection_name, batch_size=batch_size, progress_callback=progress_callback)
+    _copy_points(collection_name, diff.unchanged, batch_size)
+    return diff
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from embeddings.embedding_service import DEFAULT_EMBEDDING_MODEL
+from vectorstores.qdrant_store import RULEBOOK_COLLECTION
+
+DEFAULT_CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
+DEFAULT_CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
+
+INGESTING = "ingesting"
+READY = "ready"
+FAILED = "failed"
+
+
+def hash_content(content: bytes) -> str:
+    """
+    SHA-256 hex digest of an uploaded file.
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def rulebook_key(
+    content_hash: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    game_name: str = "",
+    source_filename: str = "",
+) -> str:
+    """
+    Identify a rulebook by its content, by everything that changes its vectors, and by the
+    game and file name stored in its chunks' metadata (used by filters, citations and its
+    summary). Two uploads with the same key share one set of points in the rulebook collection.
+    """
+    params = f"{content_hash}:{chunk_size}:{chunk_overlap}:{embedding_model}"
+    if game_name or source_filename:
+        params += f":{game_name}:{source_filename}"
+    return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+
+def rulebook_file_path(key: str, upload_dir: str) -> str:
+    """
+    Where the uploaded PDF of a rulebook is kept; the same on every worker.
+    """
+    return os.path.join(upload_dir, f"rulebook_{key[:16]}.pdf")
+
+
+@dataclass
+class RulebookEntry:
+    key: str
+    content_hash: str
+    collection_name: str
+    file_path: str
+    status: str = INGESTING
+    job_id: Optional[str] = None
+    refcount: int = 0
+
+
+class RulebookRegistry:
+    """
+    Refcounted map of unique rulebooks to where their embeddings and PDF are stored.
+
+    Every session that uses a rulebook holds one reference. The rulebook's points and the
+    stored PDF may only be dropped once the last reference is released.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, RulebookEntry] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, content_hash: str, upload_dir: str) -> Tuple[RulebookEntry, bool]:
+        """
+        Take a reference on the rulebook, registering it if it is new.
+
+        Returns:
+            Tuple[RulebookEntry, bool]: The entry and whether this call created it
+            (i.e. the caller must ingest the rulebook).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            created = entry is None
+            if created:
+                entry = RulebookEntry(
+                    key=key,
+                    content_hash=content_hash,
+                    collection_name=RULEBOOK_COLLECTION,
+                    file_path=rulebook_file_path(key, upload_dir),
+                )
+                self._entries[key] = entry
+            entry.refcount += 1
+            return entry, created
+
+    def release(self, key: str) -> Optional[RulebookEntry]:
+        """
+        Drop one reference. Returns the entry if that was the last one, so the caller
+        can delete its points and file; returns None otherwise.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.refcount -= 1
+            if entry.refcount > 0:
+                return None
+            # An entry still being ingested is cleaned up by its job instead
+            if entry.status == INGESTING:
+                return None
+            del self._entries[key]
+            return entry
+
+    def forget(self, key: str) -> bool:
+        """
+        Drop the entry regardless of its local refcount, e.g. once the shared session store
+        shows no session on any worker still uses the rulebook. Entries still being ingested
+        are kept (their job cleans them up) and False is returned.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.status == INGESTING:
+                return False
+            self._entries.pop(key, None)
+            return True
+
+    def get(self, key: str) -> Optional[RulebookEntry]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set_job(self, key: str, job_id: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.job_id = job_id
+
+    def finish_ingestion(self, key: str, status: str) -> Optional[RulebookEntry]:
+        """
+        Record the outcome of the ingestion job. Returns the entry if nobody references
+        it any more (or ingestion failed), meaning its resources should be discarded.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.status = status
+            if status == FAILED or entry.refcount <= 0:
+                del self._entries[key]
+                return entry
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries: List[RulebookEntry] = list(self._entries.values())
+        return {
+            "rulebooks": len(entries),
+            "ingesting": sum(1 for e in entries if e.status == INGESTING),
+            "references": sum(e.refcount for e in entries),
+        }
+
+
+rulebook_registry = RulebookRegistry()
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import time
+import uuid
+from typing import BinaryIO, Tuple
+from fastapi import UploadFile
+from workers.pools import run_cpu_bound
+
+# Where rulebook PDFs (and in-flight uploads) are stored
+UPLOAD_DIR = "uploads"
+# Largest rulebook accepted by /upload
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+# Bytes copied per read/write, so an upload never needs more than one chunk in RAM
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# In-flight uploads untouched for this long were abandoned (client gone, worker died) and are deleted
+UPLOAD_STALE_SECONDS = float(os.getenv("UPLOAD_STALE_SECONDS", "3600"))
+
+
+_INCOMING_PREFIX = ".incoming_"
+_INCOMING_SUFFIX = ".part"
+
+
+class UploadTooLargeError(Exception):
+    """
+    Raised when an upload exceeds UPLOAD_MAX_BYTES.
+    """
+
+
+def _copy_to_disk(source: BinaryIO, dest_path: str, max_bytes: int, chunk_bytes: int) -> Tuple[str, int]:
+    """
+    Copy `source` to `dest_path` chunk by chunk, hashing as it goes.
+    The partial file is removed if the size limit is exceeded or the copy fails.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(dest_path, "wb") as dest:
+            while chunk := source.read(chunk_bytes):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+                digest.update(chunk)
+                dest.write(chunk)
+    except BaseException:
+        discard_upload(dest_path)
+        raise
+    return digest.hexdigest(), size
+
+
+async def save_upload(
+    file: UploadFile,
+    upload_dir: str,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    chunk_bytes: int = UPLOAD_CHUNK_BYTES,
+) -> Tuple[str, str, int]:
+    """
+    Stream an uploaded file to a unique temporary path in `upload_dir`.
+
+    The temporary name is per upload, so concurrent uploads never overwrite each other;
+    move it into place with `commit_upload` or drop it with `discard_upload`.
+
+    Returns:
+        Tuple[str, str, int]: (temporary path, SHA-256 hex digest, size in bytes).
+
+    Raises:
+        UploadTooLargeError: The file is larger than `max_bytes`.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+
+    temp_path = os.path.join(upload_dir, f"{_INCOMING_PREFIX}{uuid.uuid4().hex}{_INCOMING_SUFFIX}")
+    # The request body is already spooled by the framework; copying it is blocking file I/O
+    content_hash, size = await run_cpu_bound(_copy_to_disk, file.file, temp_path, max_bytes, chunk_bytes)
+    return temp_path, content_hash, size
+
+
+def commit_upload(temp_path: str, file_path: str):
+    """
+    Atomically move a saved upload to its final path.
+    """
+    os.replace(temp_path, file_path)
+
+
+def discard_upload(temp_path: str):
+    """
+    Remove a saved upload that is not needed (duplicate rulebook or rejected request).
+    A no-op once the upload has been committed.
+    """
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+
+def purge_stale_uploads(upload_dir: str, older_than_seconds: float = UPLOAD_STALE_SECONDS) -> int:
+    """
+    Delete in-flight upload files not written to for `older_than_seconds`. A request that
+    dies mid-upload (or a worker killed during one) never gets to discard its file.
+
+    Returns:
+        int: The number of files deleted.
+    """
+    cutoff = time.time() - older_than_seconds
+    try:
+        entries = list(os.scandir(upload_dir))
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for entry in entries:
+        if not (entry.name.startswith(_INCOMING_PREFIX) and entry.name.endswith(_INCOMING_SUFFIX)):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # Committed or discarded by its upload in the meantime
+            pass
+    return removed
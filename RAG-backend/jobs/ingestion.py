@@ -0,0 +1,335 @@
+import contextvars
+import os
+import time
+from typing import Optional
+from ingest.load_document import iter_pdf_pages, iter_pdf_chunks
+from ingest.embed_and_store import store_in_qdrant, delete_rulebook, tag_chunks
+from ingest.revisions import apply_revision
+from ingest.uploads import UPLOAD_DIR
+from retriever.bm25_index import bm25_indexes, BM25Index
+from chains.qa_chain import get_conversational_chain
+from chains.rulebook_summary import summarize_rulebook, RULEBOOK_SUMMARY_ENABLED
+from active_sessions.session_store import session_store, READY as SESSION_READY, FAILED as SESSION_FAILED, PROCESSING
+from active_sessions.lifecycle import replace_session_rulebook
+from ingest.rulebook_registry import rulebook_registry, rulebook_file_path, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, READY
+from ingest.rulebook_registry import FAILED as RULEBOOK_FAILED
+from vectorstores.qdrant_store import delete_rulebook_summaries
+from jobs.job_store import (
+    job_store,
+    IngestionJob,
+    JOB_RETENTION_SECONDS,
+    EXTRACTING,
+    EMBEDDING,
+    FINALIZING,
+    COMPLETED,
+    FAILED,
+)
+from workers.pools import ingest_executor
+from observability.metrics import timed, observe_stage
+
+
+def _discard_resources(collection_name: str, key: str, file_path: str):
+    """
+    Best-effort removal of a rulebook's points and upload file nobody references any more.
+    """
+    bm25_indexes.drop(key)
+    try:
+        delete_rulebook(collection_name, key)
+        delete_rulebook_summaries([key])
+    except Exception as e:
+        print(f"Could not delete rulebook '{key[:16]}' from collection '{collection_name}': {e}")
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def _sessions_waiting_on(key: str):
+    # Read from the shared store: sessions on other workers may be waiting on this job too
+    return session_store.list_by_rulebook(key, status=PROCESSING)
+
+
+def _summarize(rulebook_key: str, game_name: str, index: BM25Index):
+    """
+    Precompute the rulebook's summary for generic questions. Not fatal: without one,
+    those questions go through retrieval and generation like any other.
+    """
+    if not RULEBOOK_SUMMARY_ENABLED:
+        return
+    try:
+        summarize_rulebook(rulebook_key, game_name, index)
+    except Exception as e:
+        print(f"Could not summarize rulebook '{rulebook_key[:16]}': {e}")
+
+
+def _rulebooks_ready(session) -> bool:
+    """
+    Whether none of the session's rulebooks is still being ingested by this worker.
+    Rulebooks this worker doesn't know were ingested elsewhere and are ready.
+    """
+    for key in session.rulebook_keys:
+        entry = rulebook_registry.get(key)
+        if entry is not None and entry.status != READY:
+            return False
+    return True
+
+
+def run_ingestion_job(job_id: str, file_path: str):
+    """
+    Run extract -> chunk -> embed/store for one uploaded rulebook, recording progress on the job.
+
+    The stages are streamed: pages are extracted in shards on the PDF process pool,
+    chunked as they arrive and embedded/upserted batch by batch, so a long rulebook
+    never sits fully extracted in memory.
+
+    Every chunk is tagged with the rulebook key and its content hash, so the rulebook's points
+    can be searched and deleted within the shared collection and have deterministic ids.
+
+    When the pipeline finishes, every session waiting on this rulebook is marked ready once all
+    of its rulebooks are, then the rulebook's summary is precomputed. If all of them ended while
+    the job was running, the new points and file are discarded. If it fails, sessions that only
+    attached the rulebook keep working without it; sessions created by its upload fail.
+
+    Args:
+        job_id (str): The id of a job created in `job_store`.
+        file_path (str): Path of the saved PDF.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        return
+
+    started_at = time.time()
+    job_store.update(job_id, stage=EXTRACTING, started_at=started_at)
+
+    try:
+        pages_extracted = 0
+        # The sparse (BM25) side of hybrid retrieval is built from the same chunks
+        documents = []
+
+        def pages():
+            nonlocal pages_extracted
+            for page_text in iter_pdf_pages(file_path):
+                pages_extracted += 1
+                yield page_text
+
+        def chunks():
+            for doc in tag_chunks(iter_pdf_chunks(
+                pages(),
+                source_filename=job.source_filename,
+                game_name=job.game_name,
+                chunk_size=DEFAULT_CHUNK_SIZE,
+                chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+            ), job.rulebook_key):
+                documents.append(doc)
+                yield doc
+
+        def report(stored, _total):
+            job_store.update(
+                job_id,
+                stage=EMBEDDING,
+                pages_extracted=pages_extracted,
+                total_chunks=len(documents),
+                chunks_embedded=stored,
+            )
+
+        job_store.update(job_id, embedding_started_at=time.time())
+        store_in_qdrant(chunks(), job.collection_name, progress_callback=report)
+        if not documents:
+            raise ValueError("No text could be extracted from the PDF")
+
+        job_store.update(
+            job_id,
+            stage=FINALIZING,
+            pages_extracted=pages_extracted,
+            total_chunks=len(documents),
+        )
+        with timed("bm25_build"):
+            index = bm25_indexes.build(job.rulebook_key, documents)
+
+        rulebook_registry.finish_ingestion(job.rulebook_key, READY)
+        if session_store.count_by_rulebook(job.rulebook_key) == 0:
+            # Every session using this rulebook ended while we were still ingesting
+            rulebook_registry.forget(job.rulebook_key)
+            _discard_resources(job.collection_name, job.rulebook_key, file_path)
+        else:
+            for session in _sessions_waiting_on(job.rulebook_key):
+                if not _rulebooks_ready(session):
+                    # Still waiting on another of its rulebooks; that job marks it ready
+                    continue
+                session_store.update(session.session_id, status=SESSION_READY)
+                try:
+                    get_conversational_chain(
+                        collection_name=session.collection_name,
+                        session_id=session.session_id,
+                        rulebook_keys=session.rulebook_keys,
+                    )
+                except Exception as e:
+                    # Not fatal: /ask builds the chain on a cache miss and reports the error there
+                    print(f"Could not pre-build chain for session {session.session_id}: {e}")
+            _summarize(job.rulebook_key, job.game_name, index)
+
+        finished_at = time.time()
+        job_store.update(job_id, stage=COMPLETED, finished_at=finished_at)
+        observe_stage("ingest_job", finished_at - started_at)
+
+    except Exception as e:
+        job_store.update(job_id, stage=FAILED, error=str(e), finished_at=time.time())
+        rulebook_registry.finish_ingestion(job.rulebook_key, RULEBOOK_FAILED)
+        for session in session_store.list_by_rulebook(job.rulebook_key):
+            if session.rulebook_key == job.rulebook_key:
+                if session.status == PROCESSING:
+                    session_store.update(session.session_id, status=SESSION_FAILED, error=str(e))
+                continue
+            # Only attached to this session: detach it and keep answering from the others
+            attached = [key for key in session.attached_rulebooks if key != job.rulebook_key]
+            detached = session.copy()
+            detached.attached_rulebooks = attached
+            changes = {"attached_rulebooks": attached, "error": f"Attaching rulebook failed: {e}"}
+            if session.status == PROCESSING and _rulebooks_ready(detached):
+                changes["status"] = SESSION_READY
+            session_store.update(session.session_id, **changes)
+        # Leave the points alone if another worker's session already uses the rulebook
+        if not any(s.status != SESSION_FAILED for s in session_store.list_by_rulebook(job.rulebook_key)):
+            _discard_resources(job.collection_name, job.rulebook_key, file_path)
+        print(f"Ingestion job {job_id} failed: {e}")
+
+
+def run_revision_job(job_id: str, file_path: str):
+    """
+    Ingest a revised rulebook (errata, new printing) for one session, embedding only the
+    chunks whose text changed since the revision the session uses.
+
+    The session keeps answering from the previous revision while the job runs, then switches
+    to the new one with its chat history intact. The new revision is stored under its own
+    point ids (unchanged chunks are copied with their vectors), and the previous one is only
+    deleted after the switch, once no session uses it. If the job fails, the previous revision
+    is untouched and only the new points are discarded.
+
+    Args:
+        job_id (str): The id of a job created in `job_store` with `previous_rulebook_key`.
+        file_path (str): Path of the saved revised PDF.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        return
+
+    started_at = time.time()
+    job_store.update(job_id, stage=EXTRACTING, started_at=started_at)
+    old_key = job.previous_rulebook_key
+    switched = False
+
+    try:
+        pages_extracted = 0
+
+        def pages():
+            nonlocal pages_extracted
+            for page_text in iter_pdf_pages(file_path):
+                pages_extracted += 1
+                yield page_text
+
+        # The whole revision is chunked up front: it has to be diffed before anything is embedded
+        documents = list(tag_chunks(iter_pdf_chunks(
+            pages(),
+            source_filename=job.source_filename,
+            game_name=job.game_name,
+            chunk_size=DEFAULT_CHUNK_SIZE,
+            chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+        ), job.rulebook_key))
+        if not documents:
+            raise ValueError("No text could be extracted from the PDF")
+
+        job_store.update(
+            job_id,
+            stage=EMBEDDING,
+            pages_extracted=pages_extracted,
+            total_chunks=len(documents),
+            embedding_started_at=time.time(),
+        )
+        diff = apply_revision(
+            job.collection_name,
+            old_key,
+            job.rulebook_key,
+            documents,
+            progress_callback=lambda stored, _total: job_store.update(job_id, chunks_embedded=stored),
+        )
+
+        job_store.update(
+            job_id,
+            stage=FINALIZING,
+            chunks_embedded=len(diff.added),
+            chunks_reused=len(diff.unchanged),
+            pages_changed=len(diff.pages_changed),
+        )
+        with timed("bm25_build"):
+            index = bm25_indexes.build(job.rulebook_key, documents)
+        rulebook_registry.finish_ingestion(job.rulebook_key, READY)
+
+        session = replace_session_rulebook(job.session_id, old_key, job.rulebook_key)
+        if session is None:
+            # The session ended (or dropped the rulebook) while we were ingesting
+            rulebook_registry.release(job.rulebook_key)
+            if session_store.count_by_rulebook(job.rulebook_key) == 0:
+                rulebook_registry.forget(job.rulebook_key)
+                _discard_resources(job.collection_name, job.rulebook_key, file_path)
+        else:
+            switched = True
+            rulebook_registry.release(old_key)
+            # Other sessions may still use the previous revision; the last one out deletes it
+            if session_store.count_by_rulebook(old_key) == 0 and rulebook_registry.forget(old_key):
+                _discard_resources(job.collection_name, old_key, rulebook_file_path(old_key, UPLOAD_DIR))
+                job_store.update(job_id, chunks_deleted=len(diff.stale))
+            try:
+                get_conversational_chain(
+                    collection_name=session.collection_name,
+                    session_id=session.session_id,
+                    rulebook_keys=session.rulebook_keys,
+                )
+            except Exception as e:
+                print(f"Could not pre-build chain for session {session.session_id}: {e}")
+            _summarize(job.rulebook_key, job.game_name, index)
+
+        finished_at = time.time()
+        job_store.update(job_id, stage=COMPLETED, finished_at=finished_at)
+        observe_stage("revision_job", finished_at - started_at)
+
+    except Exception as e:
+        job_store.update(job_id, stage=FAILED, error=str(e), finished_at=time.time())
+        if switched:
+            # Only cleanup after the switch failed; the session already uses the new revision
+            print(f"Revision job {job_id} failed after switching session {job.session_id}: {e}")
+            return
+        # The session still uses the previous revision, which was never modified
+        session_store.update(job.session_id, error=f"Updating rulebook failed: {e}")
+        rulebook_registry.finish_ingestion(job.rulebook_key, RULEBOOK_FAILED)
+        _discard_resources(job.collection_name, job.rulebook_key, file_path)
+        print(f"Revision job {job_id} failed: {e}")
+
+
+def submit_ingestion_job(
+    session_id: str,
+    collection_name: str,
+    rulebook_key: str,
+    game_name: str,
+    source_filename: str,
+    file_path: str,
+    previous_rulebook_key: Optional[str] = None,
+) -> IngestionJob:
+    """
+    Create an ingestion job and queue it on the ingestion worker pool.
+    With `previous_rulebook_key`, the job ingests a revision of that rulebook (see `run_revision_job`).
+
+    Returns:
+        IngestionJob: The newly created (queued) job.
+    """
+    job_store.purge_finished(JOB_RETENTION_SECONDS)
+    job = job_store.create(
+        session_id=session_id,
+        collection_name=collection_name,
+        rulebook_key=rulebook_key,
+        game_name=game_name,
+        source_filename=source_filename,
+        previous_rulebook_key=previous_rulebook_key,
+    )
+    rulebook_registry.set_job(rulebook_key, job.job_id)
+    run_job = run_revision_job if previous_rulebook_key else run_ingestion_job
+    # The job keeps the trace id of the upload request that queued it
+    ingest_executor.submit(contextvars.copy_context().run, run_job, job.job_id, file_path)
+    return job
@@ -0,0 +1,270 @@
+from abc import ABC, abstractmethod
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, Iterator, Optional
+
+from active_sessions.session_store import SESSION_STORE_BACKEND, SESSION_STORE_PATH
+
+# Follows the session store by default: a job polled on another worker than the one that
+# accepted the upload must be visible there too. "sqlite" keeps jobs next to the sessions.
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", SESSION_STORE_BACKEND)
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", SESSION_STORE_PATH)
+# Finished jobs are kept this long so clients can still poll their final state
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+QUEUED = "queued"
+EXTRACTING = "extracting"
+CHUNKING = "chunking"
+EMBEDDING = "embedding"
+FINALIZING = "finalizing"
+COMPLETED = "completed"
+FAILED = "failed"
+
+FINISHED_STAGES = {COMPLETED, FAILED}
+
+
+@dataclass
+class IngestionJob:
+    job_id: str
+    session_id: str
+    collection_name: str
+    rulebook_key: str
+    game_name: str
+    source_filename: str
+    # Set for revision jobs: the rulebook the new one replaces in the session
+    previous_rulebook_key: Optional[str] = None
+    stage: str = QUEUED
+    pages_extracted: int = 0
+    total_chunks: int = 0
+    chunks_embedded: int = 0
+    # Revision jobs only: chunks reused from the previous revision, its stale chunks, pages with new text
+    chunks_reused: int = 0
+    chunks_deleted: int = 0
+    pages_changed: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    embedding_started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.stage in FINISHED_STAGES
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        end = self.finished_at or time.time()
+        data["elapsed_seconds"] = round(end - self.started_at, 3) if self.started_at else 0.0
+
+        embedding_seconds = end - self.embedding_started_at if self.embedding_started_at else 0.0
+        data["chunks_per_second"] = (
+            round(self.chunks_embedded / embedding_seconds, 2) if embedding_seconds > 0 else 0.0
+        )
+        return data
+
+
+class JobStore(ABC):
+    """
+    Interface for ingestion job storage. Subclass it to keep jobs somewhere other
+    than process memory (e.g. a database shared by several workers).
+    """
+
+    @abstractmethod
+    def create(self, session_id: str, collection_name: str, rulebook_key: str,
+               game_name: str, source_filename: str,
+               previous_rulebook_key: Optional[str] = None) -> IngestionJob:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, job_id: str, **changes: Any) -> Optional[IngestionJob]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_finished(self, older_than_seconds: float) -> int:
+        raise NotImplementedError
+
+
+_COLUMNS = [f.name for f in fields(IngestionJob)]
+
+
+def _check_fields(changes: Dict[str, Any]):
+    unknown = set(changes) - set(_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+
+
+class InMemoryJobStore(JobStore):
+    """
+    Default job store: a lock-protected dict local to this worker process.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._lock = threading.Lock()
+
+    def create(self, session_id: str, collection_name: str, rulebook_key: str,
+               game_name: str, source_filename: str,
+               previous_rulebook_key: Optional[str] = None) -> IngestionJob:
+        job = IngestionJob(
+            job_id=uuid.uuid4().hex,
+            session_id=session_id,
+            collection_name=collection_name,
+            rulebook_key=rulebook_key,
+            game_name=game_name,
+            source_filename=source_filename,
+            previous_rulebook_key=previous_rulebook_key,
+        )
+        with self._lock:
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def update(self, job_id: str, **changes: Any) -> Optional[IngestionJob]:
+        _check_fields(changes)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            for key, value in changes.items():
+                setattr(job, key, value)
+            return job
+
+    def purge_finished(self, older_than_seconds: float) -> int:
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            stale = [
+                job_id for job_id, job in self._jobs.items()
+                if job.is_finished and job.finished_at and job.finished_at < cutoff
+            ]
+            for job_id in stale:
+                del self._jobs[job_id]
+            return len(stale)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job store in a SQLite file, so every worker process on the host can report the
+    progress of a job that another worker is running.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    collection_name TEXT NOT NULL,
+                    rulebook_key TEXT NOT NULL,
+                    game_name TEXT NOT NULL,
+                    source_filename TEXT NOT NULL,
+                    previous_rulebook_key TEXT,
+                    stage TEXT NOT NULL,
+                    pages_extracted INTEGER NOT NULL,
+                    total_chunks INTEGER NOT NULL,
+                    chunks_embedded INTEGER NOT NULL,
+                    chunks_reused INTEGER NOT NULL,
+                    chunks_deleted INTEGER NOT NULL,
+                    pages_changed INTEGER NOT NULL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    embedding_started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ingestion_jobs_finished_at ON ingestion_jobs (finished_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # One connection per thread; autocommit mode with explicit transactions below
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _select(self, conn, job_id: str) -> Optional[IngestionJob]:
+        row = conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM ingestion_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return IngestionJob(**dict(zip(_COLUMNS, row))) if row else None
+
+    def create(self, session_id: str, collection_name: str, rulebook_key: str,
+               game_name: str, source_filename: str,
+               previous_rulebook_key: Optional[str] = None) -> IngestionJob:
+        job = IngestionJob(
+            job_id=uuid.uuid4().hex,
+            session_id=session_id,
+            collection_name=collection_name,
+            rulebook_key=rulebook_key,
+            game_name=game_name,
+            source_filename=source_filename,
+            previous_rulebook_key=previous_rulebook_key,
+        )
+        data = asdict(job)
+        with self._transaction() as conn:
+            conn.execute(
+                f"INSERT INTO ingestion_jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                tuple(data[column] for column in _COLUMNS),
+            )
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._select(self._connection(), job_id)
+
+    def update(self, job_id: str, **changes: Any) -> Optional[IngestionJob]:
+        _check_fields(changes)
+        with self._transaction() as conn:
+            if changes:
+                assignments = ", ".join(f"{column} = ?" for column in changes)
+                conn.execute(
+                    f"UPDATE ingestion_jobs SET {assignments} WHERE job_id = ?", (*changes.values(), job_id)
+                )
+            return self._select(conn, job_id)
+
+    def purge_finished(self, older_than_seconds: float) -> int:
+        cutoff = time.time() - older_than_seconds
+        with self._transaction() as conn:
+            return conn.execute(
+                "DELETE FROM ingestion_jobs WHERE stage IN (?, ?) AND finished_at < ?", (*FINISHED_STAGES, cutoff)
+            ).rowcount
+
+
+def create_job_store(backend: str = JOB_STORE_BACKEND) -> JobStore:
+    """
+    Build the job store selected by JOB_STORE_BACKEND.
+    """
+    if backend == "memory":
+        return InMemoryJobStore()
+    if backend == "sqlite":
+        return SQLiteJobStore(JOB_STORE_PATH)
+    raise ValueError(f"Unknown JOB_STORE_BACKEND: {backend}")
+
+
+job_store = create_job_store()
@@ -1,9 +1,11 @@
-import google.generativeai as genai
-import os 
+from llm.gateway import get_llm_gateway
+from observability.metrics import timed
+
 
 def call_gemini(prompt:str)->str:
     """
     Call the Gemini API to generate a response based on the provided prompt.
+    Goes through the shared LLM gateway (pooled client, timeouts, retries).
     
     Args:
         prompt (str): The input prompt for the Gemini model.
@@ -11,9 +13,21 @@ def call_gemini(prompt:str)->str:
     Returns:
         str: The generated response from the Gemini model.
     """
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    with timed("gemini_generate"):
+        response = get_llm_gateway().generate(prompt)
+    return response.strip()
 
-    geminimodel = genai.GenerativeModel(model_name="models/gemini-1.5-flash-latest")
-    response = geminimodel.generate_content(prompt)
-    return response.text.strip()
+async def acall_gemini(prompt:str)->str:
+    """
+    Async version of `call_gemini`, so many prompts can be in flight without a thread each.
+    Retried and, if enabled, hedged by the gateway.
     
+    Args:
+        prompt (str): The input prompt for the Gemini model.
+        
+    Returns:
+        str: The generated response from the Gemini model.
+    """
+    with timed("gemini_generate"):
+        response = await get_llm_gateway().agenerate(prompt)
+    return response.strip()
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Simulated Gemini behaviour of LLM_BACKEND=fake (for load tests and offline runs)
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "200"))
+# Share of calls that take FAKE_LLM_SLOW_MS instead (the tail hedging is meant for)
+FAKE_LLM_SLOW_RATE = float(os.getenv("FAKE_LLM_SLOW_RATE", "0.02"))
+FAKE_LLM_SLOW_MS = float(os.getenv("FAKE_LLM_SLOW_MS", "5000"))
+# Share of calls failing with a transient (retryable) error, like a quota error
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+# Delay between streamed words
+FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "5"))
+
+_FOLLOW_UP = re.compile(r"Follow Up Input:\s*(.+?)\s*(?:\n|$)")
+
+
+class FakeLLMError(RuntimeError):
+    """
+    Simulated transient failure (quota exhausted, overloaded backend).
+    """
+
+
+def fake_answer(prompt: str) -> str:
+    """
+    A cheap, deterministic answer: condense-question prompts get their follow-up question
+    back, anything else a canned answer sized by its context.
+    """
+    follow_up = _FOLLOW_UP.search(prompt)
+    if follow_up:
+        return follow_up.group(1)
+    return f"This is a simulated answer based on {len(prompt)} characters of prompt."
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Local stand-in for the Gemini chat model with configurable latency, tail latency and
+    error rate, so the request path can be load tested without quota or cost.
+    """
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    jitter_ms: float = FAKE_LLM_JITTER_MS
+    slow_rate: float = FAKE_LLM_SLOW_RATE
+    slow_ms: float = FAKE_LLM_SLOW_MS
+    error_rate: float = FAKE_LLM_ERROR_RATE
+    token_ms: float = FAKE_LLM_TOKEN_MS
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    def _delay_seconds(self) -> float:
+        if random.random() < self.error_rate:
+            raise FakeLLMError("Simulated quota exhausted (429)")
+        if random.random() < self.slow_rate:
+            return self.slow_ms / 1000
+        return (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+
+    @staticmethod
+    def _answer(messages: List[BaseMessage]) -> str:
+        return fake_answer("\n".join(str(message.content) for message in messages))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._delay_seconds())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self._delay_seconds())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._delay_seconds())
+        for i, word in enumerate(self._answer(messages).split(" ")):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            time.sleep(self.token_ms / 1000)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._delay_seconds())
+        for i, word in enumerate(self._answer(messages).split(" ")):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(self.token_ms / 1000)
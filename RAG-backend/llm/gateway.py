@@ -0,0 +1,462 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import BaseMessage, BaseMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from llm.fake_llm import FakeChatModel, FakeLLMError
+from workers.pools import llm_slots
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # only needed by the "gemini" backend
+    google_exceptions = None
+
+T = TypeVar("T")
+
+# "gemini" calls the Gemini API; "fake" simulates it locally (see llm/fake_llm.py) for load tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_CHAT_MODEL = os.getenv("GEMINI_CHAT_MODEL", "gemini-1.5-flash")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+# Time allowed for one attempt (for streams: until the first token)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+# Time allowed for a whole call including retries; one question's LLM calls share it
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "45"))
+# Retries of transient failures (quota, overload, timeouts), with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+# Send a second identical request when the first is still unanswered after this long (0 = never)
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+# LLM calls one session may have in flight at once (0 = only the global limit applies)
+MAX_CONCURRENT_LLM_CALLS_PER_SESSION = int(os.getenv("MAX_CONCURRENT_LLM_CALLS_PER_SESSION", "4"))
+
+_TRANSIENT_ERRORS: Tuple[type, ...] = (asyncio.TimeoutError, TimeoutError, ConnectionError, FakeLLMError)
+if google_exceptions is not None:
+    _TRANSIENT_ERRORS += (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+
+# Calls made by the gateway must not report to the callbacks of the chain that called it
+_NO_CALLBACKS = {"callbacks": []}
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class LLMUnavailableError(RuntimeError):
+    """
+    The LLM did not answer: transient failures outlasted the retries or the deadline.
+    """
+
+
+def is_transient_llm_error(error: BaseException) -> bool:
+    return isinstance(error, _TRANSIENT_ERRORS)
+
+
+@contextmanager
+def llm_deadline(seconds: float = LLM_DEADLINE_SECONDS):
+    """
+    Give every LLM call made inside the block one shared deadline, e.g. the condense and
+    answer calls of a chat turn, so retries of the first can't push the second past it.
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class SessionSemaphores:
+    """
+    Per-session concurrency limits. A session's semaphore exists only while one of its
+    calls holds or waits for it. Used from the event loop only.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphores: Dict[str, Tuple[asyncio.Semaphore, int]] = {}
+
+    @asynccontextmanager
+    async def hold(self, session_id: Optional[str]):
+        if not session_id or self.limit <= 0:
+            yield
+            return
+        semaphore, users = self._semaphores.get(session_id, (None, 0))
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limit)
+        self._semaphores[session_id] = (semaphore, users + 1)
+        try:
+            async with semaphore:
+                yield
+        finally:
+            semaphore, users = self._semaphores[session_id]
+            if users == 1:
+                del self._semaphores[session_id]
+            else:
+                self._semaphores[session_id] = (semaphore, users - 1)
+
+    def __len__(self) -> int:
+        return len(self._semaphores)
+
+
+class LLMGateway:
+    """
+    Process-wide entry point for LLM calls.
+
+    One pooled backend client, created on first call, serves every session. `slot` bounds the calls in flight per
+    session and per process (`llm_slots`). Each attempt gets `timeout_seconds`; transient
+    failures (quota, overload, timeouts) are retried with full-jitter exponential backoff as
+    long as the retry can start before the call's deadline, otherwise `LLMUnavailableError`
+    is raised.
+
+    With `hedge_after_seconds`, an attempt still unanswered after that long is raced against
+    a second identical request, which takes a global LLM slot of its own and is only sent if
+    one is free; the first answer wins and the other request is cancelled.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[BaseChatModel] = None,
+        backend_name: str = LLM_BACKEND,
+        timeout_seconds: float = LLM_TIMEOUT_SECONDS,
+        deadline_seconds: float = LLM_DEADLINE_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_base_seconds: float = LLM_RETRY_BASE_SECONDS,
+        retry_max_seconds: float = LLM_RETRY_MAX_SECONDS,
+        hedge_after_seconds: float = LLM_HEDGE_AFTER_SECONDS,
+        per_session_limit: int = MAX_CONCURRENT_LLM_CALLS_PER_SESSION,
+    ):
+        self._backend = backend
+        self.backend_name = backend_name if backend is None else getattr(backend, "_llm_type", type(backend).__name__)
+        self._backend_lock = threading.Lock()
+        self.timeout_seconds = timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+        self._sessions = SessionSemaphores(per_session_limit)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    @property
+    def backend(self) -> BaseChatModel:
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = create_llm_backend(self.backend_name)
+        return self._backend
+
+    def _count(self, **counters: int):
+        with self._stats_lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def _call_deadline(self) -> float:
+        deadline = time.monotonic() + self.deadline_seconds
+        scoped = _deadline.get()
+        return min(deadline, scoped) if scoped is not None else deadline
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+
+    def _retry_or_raise(self, error: Exception, attempt: int, deadline: float) -> float:
+        """
+        The backoff before retrying after `error`, or raise if it must not be retried.
+        """
+        if not is_transient_llm_error(error):
+            raise error
+        delay = self._backoff(attempt)
+        if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+            self._count(failures=1)
+            raise LLMUnavailableError(f"LLM unavailable after {attempt + 1} attempt(s): {error!r}") from error
+        self._count(retries=1)
+        return delay
+
+    @asynccontextmanager
+    async def slot(self, session_id: Optional[str] = None):
+        """
+        Hold one of the session's LLM slots and one of the process's. The session's own limit
+        is waited on first, so a busy session queues behind itself, not in front of others.
+        """
+        async with self._sessions.hold(session_id):
+            async with llm_slots:
+                yield
+
+    async def _race(
+        self,
+        attempt: Callable[[], Awaitable[T]],
+        timeout: float,
+        discard: Optional[Callable[[T], Any]] = None,
+    ) -> T:
+        """
+        Run one attempt, hedged when it is slow, and return the first successful result.
+        `discard` releases the result of a hedge that finished but lost.
+        """
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + timeout
+        first = asyncio.ensure_future(attempt())
+        hedge = None
+        pending = {first}
+        if 0 < self.hedge_after_seconds < timeout:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_after_seconds)
+            # Hedges only use spare capacity: under load they would just add to it. A free
+            # slot is taken without suspending, so no other call can take it in between.
+            if not done and not llm_slots.locked():
+                await llm_slots.acquire()
+                hedge = asyncio.ensure_future(attempt())
+                hedge.add_done_callback(lambda _: llm_slots.release())
+                pending.add(hedge)
+                self._count(hedges=1)
+
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(give_up_at - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError(f"LLM call timed out after {timeout:.1f}s")
+                winners = [task for task in done if task.exception() is None]
+                if winners:
+                    if winners[0] is hedge:
+                        self._count(hedge_wins=1)
+                    for loser in winners[1:]:
+                        if discard is not None:
+                            discard(loser.result())
+                    return winners[0].result()
+                error = next(iter(done)).exception()
+            raise error
+        finally:
+            for task in (first, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _call(
+        self,
+        attempt: Callable[[], Awaitable[T]],
+        deadline: float,
+        discard: Optional[Callable[[T], Any]] = None,
+    ) -> T:
+        self._count(calls=1)
+        tries = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count(failures=1)
+                raise LLMUnavailableError("LLM deadline exceeded")
+            try:
+                return await self._race(attempt, min(self.timeout_seconds, remaining), discard)
+            except Exception as e:
+                delay = self._retry_or_raise(e, tries, deadline)
+            tries += 1
+            await asyncio.sleep(delay)
+
+    async def ainvoke(self, messages: LanguageModelInput) -> BaseMessage:
+        return await self._call(lambda: self.backend.ainvoke(messages, config=_NO_CALLBACKS), self._call_deadline())
+
+    async def agenerate(self, prompt: str) -> str:
+        return str((await self.ainvoke(prompt)).content)
+
+    async def astream(self, messages: LanguageModelInput) -> AsyncIterator[BaseMessageChunk]:
+        """
+        Stream a response. Opening the stream (up to its first chunk) is retried and hedged
+        like any call; once chunks flow, the rest only has to arrive before the deadline.
+        """
+        deadline = self._call_deadline()
+
+        async def open_stream():
+            stream = self.backend.astream(messages, config=_NO_CALLBACKS).__aiter__()
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+
+        stream, first = await self._call(
+            open_stream, deadline, discard=lambda opened: asyncio.ensure_future(opened[0].aclose())
+        )
+        try:
+            if first is None:
+                return
+            yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), max(deadline - time.monotonic(), 0))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError as e:
+                    self._count(failures=1)
+                    raise LLMUnavailableError("LLM stream exceeded its deadline") from e
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def bind_event_loop(self, loop: asyncio.AbstractEventLoop):
+        """
+        The event loop owning `llm_slots`, so blocking calls from worker threads can take
+        their global slot from it (see `invoke`).
+        """
+        self._loop = loop
+
+    @contextmanager
+    def _sync_slot(self, deadline: float):
+        loop = self._loop
+        try:
+            in_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            in_loop = False
+        # Without a running loop there is nobody to share the slots with; on the loop's own
+        # thread, waiting for a slot would block the loop that has to free it
+        if loop is None or loop.is_closed() or not loop.is_running() or in_loop:
+            yield
+            return
+        wait = max(deadline - time.monotonic(), 0)
+        try:
+            asyncio.run_coroutine_threadsafe(asyncio.wait_for(llm_slots.acquire(), wait), loop).result()
+        except (asyncio.TimeoutError, TimeoutError) as e:
+            self._count(failures=1)
+            raise LLMUnavailableError("No LLM slot became free before the deadline") from e
+        try:
+            yield
+        finally:
+            loop.call_soon_threadsafe(llm_slots.release)
+
+    def invoke(self, messages: LanguageModelInput) -> BaseMessage:
+        """
+        Blocking call for worker threads (e.g. ingestion's rulebook summaries). Retried like
+        `ainvoke` but not hedged; each attempt is bounded by the backend client's own timeout.
+        Each attempt holds one of the global `llm_slots`, borrowed from the bound event loop.
+        """
+        deadline = self._call_deadline()
+        self._count(calls=1)
+        tries = 0
+        while True:
+            try:
+                with self._sync_slot(deadline):
+                    return self.backend.invoke(messages, config=_NO_CALLBACKS)
+            except Exception as e:
+                delay = self._retry_or_raise(e, tries, deadline)
+            tries += 1
+            time.sleep(delay)
+
+    def generate(self, prompt: str) -> str:
+        return str(self.invoke(prompt).content)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "backend": self.backend_name,
+                "timeout_seconds": self.timeout_seconds,
+                "deadline_seconds": self.deadline_seconds,
+                "max_retries": self.max_retries,
+                "hedge_after_seconds": self.hedge_after_seconds,
+                "per_session_limit": self._sessions.limit,
+                "sessions_calling": len(self._sessions),
+                "calls": self.calls,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failures": self.failures,
+            }
+
+
+class GatewayChatModel(BaseChatModel):
+    """
+    LangChain chat model that sends every call through an `LLMGateway`, so chains get the
+    same retries, deadlines and hedging as direct calls. Streams are retried and hedged up
+    to their first token.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    gateway: LLMGateway
+
+    @property
+    def _llm_type(self) -> str:
+        return f"gateway-{self.gateway.backend_name}"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self.gateway.invoke(messages))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=await self.gateway.ainvoke(messages))])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async for message_chunk in self.gateway.astream(messages):
+            chunk = ChatGenerationChunk(message=message_chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def create_llm_backend(backend: str = LLM_BACKEND) -> BaseChatModel:
+    if backend == "fake":
+        return FakeChatModel()
+    if backend != "gemini":
+        raise ValueError(f"Unknown LLM_BACKEND: {backend}")
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    # The gateway retries; the client only bounds each attempt
+    return ChatGoogleGenerativeAI(
+        model=GEMINI_CHAT_MODEL,
+        temperature=LLM_TEMPERATURE,
+        google_api_key=os.getenv("GEMINI_API_KEY"),
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_retries=0,
+    )
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """
+    Return the shared LLM gateway, creating its backend client on first use.
+    """
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
+
+
+def llm_stats() -> Dict[str, Any]:
+    return get_llm_gateway().stats()
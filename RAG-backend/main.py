@@ -1,11 +1,42 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from api.routes import router as api_router
+from embeddings.embedding_service import warmup_embedding_service
+from retriever.reranker import warmup_reranker, RERANK_WARMUP
+from workers.pools import shutdown_pools
+from llm.gateway import get_llm_gateway
+from vectorstores.qdrant_store import close_qdrant_clients
+from active_sessions.reaper import session_reaper
+from observability.tracing import TRACE_HEADER, new_trace_id, set_trace_id, reset_trace_id
+from observability.metrics import observe_request
 
-app = FastAPI()
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the shared embedding model once so the first upload/ask doesn't pay for it
+    if EMBEDDING_WARMUP:
+        stats = warmup_embedding_service()
+        print(f"Embedding model warmed up: {stats}")
+    if RERANK_WARMUP:
+        print(f"Reranking model warmed up: {warmup_reranker()}")
+    # Blocking LLM calls from worker threads take their concurrency slots from this loop
+    get_llm_gateway().bind_event_loop(asyncio.get_running_loop())
+    # Ends idle sessions and frees their collections/files in the background
+    session_reaper.start()
+    yield
+    await session_reaper.stop()
+    shutdown_pools()
+    await close_qdrant_clients()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",   
@@ -21,4 +52,22 @@ app.add_middleware(
     allow_headers=["*"],             
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Reuse the caller's trace id if it sent one, so traces can span services
+    trace_id = request.headers.get(TRACE_HEADER) or new_trace_id()
+    token = set_trace_id(trace_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        # Label by route template, not raw path, to keep the number of series bounded
+        route = request.scope.get("route")
+        observe_request(request.method, getattr(route, "path", "unmatched"), status, time.perf_counter() - start)
+        reset_trace_id(token)
+    response.headers[TRACE_HEADER] = trace_id
+    return response
+
 app.include_router(api_router)
@@ -0,0 +1,79 @@
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from chains.session_memory import count_message_tokens, estimate_tokens
+from observability.metrics import observe_stage, llm_tokens
+
+# Tags put on the two LLM steps of the conversational chain (see `build_conversational_chain`)
+CONDENSE_TAG = "condense_question"
+GENERATE_TAG = "generate_answer"
+
+
+def _stage(tags) -> str:
+    for tag in tags or ():
+        if tag in (CONDENSE_TAG, GENERATE_TAG):
+            return tag
+    return "llm_call"
+
+
+class LLMStageTimer(BaseCallbackHandler):
+    """
+    Callback that records the latency and token counts of every LLM call under its chain step:
+    condensing the follow-up question or generating the answer.
+    """
+
+    def __init__(self):
+        self._runs: Dict[UUID, Any] = {}
+        # Chain tags are not inherited by the LLM run, so remember which chain run is which step
+        self._chain_stages: Dict[UUID, str] = {}
+
+    def on_chain_start(
+        self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None, tags=None, **kwargs: Any
+    ) -> None:
+        # Nested chains (e.g. the LLMChain inside StuffDocumentsChain) inherit their parent's step
+        stage = self._chain_stages.get(parent_run_id) or _stage(tags)
+        if stage != "llm_call":
+            self._chain_stages[run_id] = stage
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any) -> None:
+        self._chain_stages.pop(run_id, None)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._chain_stages.pop(run_id, None)
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], tags, prompt_tokens: int):
+        stage = self._chain_stages.get(parent_run_id) or _stage(tags)
+        self._runs[run_id] = (stage, time.perf_counter())
+        llm_tokens.inc(prompt_tokens, stage, "prompt")
+
+    def on_chat_model_start(
+        self, serialized, messages: List[List[BaseMessage]], *, run_id: UUID,
+        parent_run_id: Optional[UUID] = None, tags=None, **kwargs: Any
+    ) -> None:
+        self._start(run_id, parent_run_id, tags, sum(count_message_tokens(prompt) for prompt in messages))
+
+    def on_llm_start(
+        self, serialized, prompts: List[str], *, run_id: UUID,
+        parent_run_id: Optional[UUID] = None, tags=None, **kwargs: Any
+    ) -> None:
+        self._start(run_id, parent_run_id, tags, sum(estimate_tokens(prompt) for prompt in prompts))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        stage, start = run
+        observe_stage(stage, time.perf_counter() - start)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    llm_tokens.inc(usage.get("output_tokens", 0), stage, "completion")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            observe_stage(f"{run[0]}_error", time.perf_counter() - run[1])
@@ -0,0 +1,186 @@
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from observability.tracing import current_trace_id
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Stages slower than this are logged with their trace id (0 disables the log)
+SLOW_STAGE_SECONDS = float(os.getenv("SLOW_STAGE_SECONDS", "2.0"))
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """
+    Prometheus-style latency histogram with fixed buckets, keyed by label values.
+    `observe` is a bisect plus a few integer updates under a lock.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total[0]) for labels, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.label_names, label_values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    """
+    Monotonic counter keyed by label values.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+stage_latency = Histogram(
+    "rag_stage_duration_seconds",
+    "Latency of individual pipeline stages (extraction, embedding, search, LLM calls, ...).",
+    ("stage",),
+)
+request_latency = Histogram(
+    "rag_http_request_duration_seconds",
+    "Latency of HTTP requests until the response headers are sent.",
+    ("method", "route", "status"),
+)
+llm_tokens = Counter(
+    "rag_llm_tokens_total",
+    "LLM tokens by stage and kind (prompt tokens are estimated, completion tokens as reported).",
+    ("stage", "kind"),
+)
+
+_metrics = [stage_latency, request_latency, llm_tokens]
+
+
+def observe_stage(stage: str, seconds: float):
+    if not METRICS_ENABLED:
+        return
+    stage_latency.observe(seconds, stage)
+    if SLOW_STAGE_SECONDS and seconds >= SLOW_STAGE_SECONDS:
+        print(f"[trace {current_trace_id() or '-'}] slow stage '{stage}': {seconds:.3f}s")
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    if METRICS_ENABLED:
+        request_latency.observe(seconds, method, route, str(status))
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Record the duration of the enclosed block under `stage`, whether or not it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def stage_summary() -> Dict[str, Dict[str, float]]:
+    """
+    Count, total and mean seconds per stage recorded so far (used by the benchmarks).
+    """
+    with stage_latency._lock:
+        series = {labels[0]: (sum(counts), total[0]) for labels, (counts, total) in stage_latency._series.items()}
+    return {
+        stage: {"count": count, "total_seconds": round(total, 4), "mean_ms": round(total / count * 1000, 3)}
+        for stage, (count, total) in sorted(series.items())
+        if count
+    }
+
+
+def reset_metrics():
+    """
+    Clear every histogram and counter, e.g. between benchmark phases.
+    """
+    for metric in _metrics:
+        metric.reset()
+
+
+def _flatten_gauges(prefix: str, values: Dict[str, Any], lines: List[str]):
+    for key, value in values.items():
+        name = _INVALID_NAME_CHARS.sub("_", f"{prefix}_{key}")
+        if isinstance(value, dict):
+            _flatten_gauges(name, value, lines)
+        elif isinstance(value, bool):
+            lines.append(f"{name} {int(value)}")
+        elif isinstance(value, (int, float)):
+            lines.append(f"{name} {value}")
+
+
+def render_metrics(gauges: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """
+    Render every histogram and counter in the Prometheus text format, followed by the numeric
+    fields of the given stats dicts as gauges named `rag_<section>_<field>`.
+    """
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for section, values in (gauges or {}).items():
+        _flatten_gauges(f"rag_{section}", values, lines)
+    return "\n".join(lines) + "\n"
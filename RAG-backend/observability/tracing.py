@@ -0,0 +1,27 @@
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+TRACE_HEADER = "X-Trace-Id"
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    """
+    Trace id of the request (or ingestion job) being handled, if any.
+    Copied into pool threads by `run_cpu_bound` and the ingestion/upsert submitters.
+    """
+    return _trace_id.get()
+
+
+def set_trace_id(trace_id: Optional[str]):
+    return _trace_id.set(trace_id)
+
+
+def reset_trace_id(token):
+    _trace_id.reset(token)
@@ -1,36 +1,55 @@
-from sentence_transformers import SentenceTransformer
-from vectorstores.qdrant_store import create_qdrant_client
+from embeddings.embedding_service import get_embedding_service
+from vectorstores.qdrant_store import search_collection, search_collection_batch
 from qdrant_client.models import Filter, FieldCondition, MatchValue
-from typing import List, Dict, Any
-from llm.call_LLM import call_gemini
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from llm.call_LLM import call_gemini, acall_gemini
+from llm.gateway import get_llm_gateway
+import asyncio
+import os
 import numpy as np
+from observability.metrics import timed
+from retriever.reranker import get_reranker, RERANK_ENABLED, RERANK_CANDIDATES
+from workers.pools import run_cpu_bound, llm_rate_limiter
+
+# Most questions accepted by one batch request
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "200"))
+# Shortest text shared by two chunks that is treated as chunk overlap rather than coincidence
+DEDUPE_MIN_OVERLAP = 20
 
 def search_qdrant_for_chunks(
         query_vector: List[float],
         collection_name: str,
         top_k: int = 5,
+        query: Optional[str] = None,
+        rerank: bool = RERANK_ENABLED,
+        query_filter: Optional[Filter] = None,
 )->List[Dict]:
     """
     Search for the top-k chunks in Qdrant based on the query vector.
+
+    With `rerank` (and the query text), a wider candidate set is fetched and
+    reordered by the cross-encoder before the top-k are kept.
     
     Args:
         query_vector (List[float]): The vector representation of the query.
         collection_name (str): The name of the Qdrant collection to search.
         top_k (int): The number of top results to return.
+        query (Optional[str]): The question text, needed for reranking.
+        rerank (bool): Whether to rerank the candidates.
+        query_filter (Optional[Filter]): Payload filter, e.g. the rulebooks being asked about.
         
     Returns:
         List[Dict[str, Any]]: A list of dictionaries containing the chunk data and metadata.
     """
-    qdrant_client = create_qdrant_client()
-    search_result = qdrant_client.search(
-        collection_name=collection_name,
-        query_vector=query_vector,
-        limit=top_k,
-        with_payload=True,
-
-    )
-    
-    return [hit.payload for hit in search_result]
+    rerank = rerank and query is not None
+    with timed("qdrant_search"):
+        chunks = search_collection(
+            collection_name, query_vector, max(top_k, RERANK_CANDIDATES) if rerank else top_k, query_filter
+        )
+    if not rerank:
+        return chunks
+    order = get_reranker().rank(query, [chunk.get("text", "") for chunk in chunks], top_k)
+    return [chunks[i] for i in order]
 
 def format_rag_prompt(chunks:List[Dict],user_query:str)->str:
     """
@@ -67,6 +86,7 @@ def answer_question(
         query:str,
         collection_name:str,
         top_k:int = 5,
+        query_filter: Optional[Filter] = None,
 )->List[Dict]:
     """
     Answer a question by searching for relevant chunks in Qdrant.
@@ -75,13 +95,14 @@ def answer_question(
         query (str): The question to answer.
         collection_name (str): The name of the Qdrant collection to search.
         top_k (int): The number of top results to return.
+        query_filter (Optional[Filter]): Payload filter, e.g. the rulebooks being asked about
+            (see `rulebook_filter`); the shared collection holds every uploaded rulebook.
         
     Returns:
         List[Dict[str, Any]]: A list of dictionaries containing the chunk data and metadata.
     """
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    query_vector = model.encode(query,convert_to_numpy=True).tolist()
-    retrieved_chunks = search_qdrant_for_chunks(query_vector, collection_name, top_k)
+    query_vector = get_embedding_service().embed_query(query)
+    retrieved_chunks = search_qdrant_for_chunks(query_vector, collection_name, top_k, query=query, query_filter=query_filter)
     #print(retrieved_chunks)
     prompt = format_rag_prompt(retrieved_chunks, query)
     #print(prompt)
@@ -96,4 +117,162 @@ def answer_question(
             }
             for c in retrieved_chunks
         ]
-    }
\ No newline at end of file
+    }
+
+
+def _overlap(first: str, second: str, min_overlap: int) -> int:
+    """
+    Length of the longest suffix of `first` that is also a prefix of `second`, or 0.
+    """
+    for length in range(min(len(first), len(second)) - 1, min_overlap - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+def dedupe_chunks(chunks: List[Dict], min_overlap: int = DEDUPE_MIN_OVERLAP) -> List[Dict]:
+    """
+    Remove repeated text from a retrieved context before it is put into a prompt.
+
+    Neighbouring chunks of a rulebook share CHUNK_OVERLAP characters, and several rulebooks
+    or searches can return the same chunk. Chunks contained in an earlier chunk of the same
+    source are dropped, and text a chunk shares with an earlier one is trimmed from it.
+
+    Args:
+        chunks (List[Dict]): Retrieved chunks, best first.
+        min_overlap (int): Shortest shared prefix/suffix that is trimmed.
+
+    Returns:
+        List[Dict]: The remaining chunks, in the same order, with trimmed text.
+    """
+    kept = []
+    for chunk in chunks:
+        text = chunk.get("text", "")
+        same_source = [other["text"] for other in kept if other.get("source") == chunk.get("source")]
+        if any(text in other for other in same_source):
+            continue
+        for other in same_source:
+            text = text[_overlap(other, text, min_overlap):]
+            tail = _overlap(text, other, min_overlap)
+            if tail:
+                text = text[:-tail]
+        if text.strip():
+            kept.append({**chunk, "text": text.strip()})
+    return kept
+
+def retrieve_for_questions(
+        questions: List[str],
+        collection_name: str,
+        top_k: int = 5,
+        query_filter: Optional[Filter] = None,
+        rerank: bool = RERANK_ENABLED,
+) -> List[List[Dict]]:
+    """
+    Retrieve the top-k chunks for many questions at once: one vectorized `encode` call
+    for every question, then one Qdrant batch search.
+
+    Args:
+        questions (List[str]): The questions to retrieve context for.
+        collection_name (str): The name of the Qdrant collection to search.
+        top_k (int): The number of chunks to keep per question.
+        query_filter (Optional[Filter]): Payload filter, e.g. the session's rulebooks.
+        rerank (bool): Whether to rerank each question's candidates.
+
+    Returns:
+        List[List[Dict]]: The chunks of each question, best first, in question order.
+    """
+    with timed("embed_queries"):
+        query_vectors = get_embedding_service().embed_queries(questions)
+    limit = max(top_k, RERANK_CANDIDATES) if rerank else top_k
+    with timed("qdrant_search"):
+        results = search_collection_batch(collection_name, query_vectors.tolist(), limit, query_filter)
+    if not rerank:
+        return results
+
+    reranker = get_reranker()
+    return [
+        [chunks[i] for i in reranker.rank(question, [chunk.get("text", "") for chunk in chunks], top_k)]
+        for question, chunks in zip(questions, results)
+    ]
+
+async def astream_answer_questions(
+        queries: List[str],
+        collection_name: str,
+        top_k: int = 5,
+        query_filter: Optional[Filter] = None,
+        session_id: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Answer many independent questions (e.g. a game's FAQ), yielding each answer as soon
+    as its LLM call finishes.
+
+    Retrieval for the whole batch runs in one pass on the CPU pool (see
+    `retrieve_for_questions`). Repeated questions are answered once, each context is
+    deduplicated, and the LLM calls run concurrently within the gateway's global and
+    per-session slots and the LLM_RATE_LIMIT_PER_SECOND limit.
+
+    Args:
+        queries (List[str]): The questions to answer.
+        collection_name (str): The name of the Qdrant collection to search.
+        top_k (int): The number of chunks retrieved per question.
+        query_filter (Optional[Filter]): Payload filter, e.g. the session's rulebooks.
+        session_id (Optional[str]): The asking session, whose per-session LLM limit applies.
+
+    Yields:
+        Dict[str, Any]: {"index", "question", "answer", "sources"} per question, in completion
+        order, or {"index", "question", "error"} if its LLM call failed.
+    """
+    positions: Dict[str, List[int]] = {}
+    for index, query in enumerate(queries):
+        positions.setdefault(" ".join(query.split()), []).append(index)
+    questions = list(positions)
+    if not questions:
+        return
+
+    contexts = await run_cpu_bound(retrieve_for_questions, questions, collection_name, top_k, query_filter)
+
+    async def answer(question: str, chunks: List[Dict]) -> Tuple[str, List[Dict], Any]:
+        chunks = dedupe_chunks(chunks)
+        try:
+            await llm_rate_limiter.acquire()
+            async with get_llm_gateway().slot(session_id):
+                return question, chunks, await acall_gemini(format_rag_prompt(chunks, question))
+        except Exception as e:
+            return question, chunks, e
+
+    tasks = [asyncio.create_task(answer(question, chunks)) for question, chunks in zip(questions, contexts)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            question, chunks, result = await next_done
+            for index in positions[question]:
+                if isinstance(result, Exception):
+                    yield {"index": index, "question": queries[index], "error": str(result)}
+                    continue
+                yield {
+                    "index": index,
+                    "question": queries[index],
+                    "answer": result,
+                    "sources": [
+                        {"page": c.get("page"), "source": c.get("source"), "text": c.get("text")}
+                        for c in chunks
+                    ],
+                }
+    finally:
+        # The consumer went away (e.g. the client disconnected): stop the remaining calls
+        for task in tasks:
+            task.cancel()
+
+def answer_questions(
+        queries: List[str],
+        collection_name: str,
+        top_k: int = 5,
+        query_filter: Optional[Filter] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Blocking version of `astream_answer_questions` for scripts: answers every question
+    and returns the results in question order.
+    """
+    async def collect():
+        return [result async for result in astream_answer_questions(queries, collection_name, top_k, query_filter)]
+
+    return sorted(asyncio.run(collect()), key=lambda result: result["index"])
+
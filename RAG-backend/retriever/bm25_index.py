@@ -0,0 +1,175 @@
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# BM25 indexes kept in memory (LRU); an evicted rulebook's index is rebuilt on its next question
+BM25_INDEX_CACHE_SIZE = int(os.getenv("BM25_INDEX_CACHE_SIZE", "256"))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Only the most frequent function words; rule terms like "no", "may" or "not" must stay searchable
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "were", "with",
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase and split text into alphanumeric terms, dropping common stopwords.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory inverted index scoring documents with Okapi BM25.
+
+    Built once per collection at ingest time, it gives exact-term matching
+    ("king me", "double jump", card names) that dense embeddings often miss.
+    """
+
+    def __init__(self, documents: List[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+
+        for doc_id, doc in enumerate(documents):
+            terms = tokenize(doc.page_content)
+            self.doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings[term].append((doc_id, tf))
+
+        total = len(documents)
+        self.avg_doc_length = (sum(self.doc_lengths) / total) if total else 0.0
+        self.idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        predicate: Optional[Callable[[Document], bool]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Return the top-k documents for the query with their BM25 scores, best first.
+        If `predicate` is given, only documents it accepts are returned (e.g. a page range).
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        avg_length = self.avg_doc_length or 1.0
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if predicate is not None:
+            ranked = (item for item in ranked if predicate(self.documents[item[0]]))
+        return [(self.documents[doc_id], score) for doc_id, score in islice(ranked, k)]
+
+
+class BM25IndexRegistry:
+    """
+    Process-wide LRU map of index name (a rulebook key, or a whole collection's name) -> BM25Index.
+
+    Indexes are registered at ingest time. A rulebook with no local index (e.g. after a
+    restart, on another worker, or after eviction) is rebuilt once via `loader`: concurrent
+    first questions wait for one build instead of each scrolling the collection. At most
+    `max_size` indexes are kept; the least recently used one is evicted beyond that.
+    """
+
+    def __init__(self, max_size: int = BM25_INDEX_CACHE_SIZE):
+        self.max_size = max_size
+        self._indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self._lock = threading.Lock()
+        # name -> [lock held while building it, callers holding or waiting for the lock]
+        self._builds: Dict[str, list] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _store(self, collection_name: str, index: BM25Index):
+        # Called with self._lock held
+        self._indexes[collection_name] = index
+        self._indexes.move_to_end(collection_name)
+        while self.max_size and len(self._indexes) > self.max_size:
+            self._indexes.popitem(last=False)
+            self.evictions += 1
+
+    def build(self, collection_name: str, documents: List[Document]) -> BM25Index:
+        index = BM25Index(documents)
+        with self._lock:
+            self._store(collection_name, index)
+        return index
+
+    def _lookup(self, collection_name: str) -> Optional[BM25Index]:
+        with self._lock:
+            index = self._indexes.get(collection_name)
+            if index is not None:
+                self._indexes.move_to_end(collection_name)
+            return index
+
+    def get(
+        self,
+        collection_name: str,
+        loader: Optional[Callable[[str], List[Document]]] = None,
+    ) -> Optional[BM25Index]:
+        index = self._lookup(collection_name)
+        if index is not None or loader is None:
+            with self._lock:
+                self.hits += index is not None
+                self.misses += index is None
+            return index
+
+        with self._lock:
+            self.misses += 1
+            build = self._builds.setdefault(collection_name, [threading.Lock(), 0])
+            build[1] += 1
+        try:
+            with build[0]:
+                # Another caller may have built it while we waited
+                index = self._lookup(collection_name)
+                if index is None:
+                    index = self.build(collection_name, loader(collection_name))
+        finally:
+            with self._lock:
+                build[1] -= 1
+                if build[1] == 0:
+                    del self._builds[collection_name]
+        return index
+
+    def drop(self, collection_name: str):
+        with self._lock:
+            self._indexes.pop(collection_name, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "indexes": len(self._indexes),
+                "max_size": self.max_size,
+                "documents": sum(len(index) for index in self._indexes.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+bm25_indexes = BM25IndexRegistry()
@@ -1,25 +1,273 @@
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_qdrant import Qdrant
 from langchain_qdrant import QdrantVectorStore
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import BaseModel, Field
 from qdrant_client import QdrantClient
-from vectorstores.qdrant_store import create_qdrant_client
+from typing import Dict, List, Literal, Optional, Tuple
+from vectorstores.qdrant_store import (
+    CITATION_PAYLOAD,
+    create_qdrant_client,
+    get_langchain_vector_store,
+    rulebook_filter,
+    storage_search_params,
+)
+from embeddings.embedding_service import get_embedding_service
+from retriever.bm25_index import bm25_indexes
+from retriever.reranker import get_reranker, RERANK_ENABLED, RERANK_CANDIDATES, RERANK_BUDGET_MS
+from observability.metrics import timed
+import os
 
-def create_hybrid_retriever(collection_name: str):
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_FUSION = os.getenv("RETRIEVAL_FUSION", "rrf")
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+RETRIEVAL_DENSE_WEIGHT = float(os.getenv("RETRIEVAL_DENSE_WEIGHT", "1.0"))
+RETRIEVAL_SPARSE_WEIGHT = float(os.getenv("RETRIEVAL_SPARSE_WEIGHT", "1.0"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+class RetrievalOptions(BaseModel):
+    """
+    Per-request overrides for the hybrid retriever. Unset fields keep the deployment defaults.
+    """
+    mode: Optional[Literal["dense", "sparse", "hybrid"]] = None
+    fusion: Optional[Literal["rrf", "weighted"]] = None
+    k: Optional[int] = Field(default=None, ge=1, le=50)
+    candidate_k: Optional[int] = Field(default=None, ge=1, le=200)
+    dense_weight: Optional[float] = Field(default=None, ge=0)
+    sparse_weight: Optional[float] = Field(default=None, ge=0)
+    rrf_k: Optional[int] = Field(default=None, ge=1)
+    rerank: Optional[bool] = None
+    rerank_candidates: Optional[int] = Field(default=None, ge=1, le=100)
+    rerank_budget_ms: Optional[float] = Field(default=None, ge=0)
+    # Restrict the search within the session's rulebooks
+    games: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    page_from: Optional[int] = Field(default=None, ge=1)
+    page_to: Optional[int] = Field(default=None, ge=1)
+
+    def overrides(self) -> Dict:
+        return self.model_dump(exclude_none=True)
+
+
+def _doc_key(doc: Document) -> Tuple:
+    return (doc.page_content, doc.metadata.get("source"), doc.metadata.get("page"))
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[List[Document]],
+    weights: List[float],
+    rrf_k: int = 60,
+) -> List[Tuple[Document, float]]:
+    """
+    Fuse several ranked lists with weighted Reciprocal Rank Fusion: score = sum(w / (rrf_k + rank)).
     """
-    Create a LangChain retriever from Qdrant collection using Sentence Transformers.
+    scores: Dict[Tuple, float] = {}
+    docs: Dict[Tuple, Document] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, doc in enumerate(ranked, start=1):
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+    return sorted(((docs[key], score) for key, score in scores.items()), key=lambda item: item[1], reverse=True)
+
+
+def weighted_score_fusion(
+    scored_lists: List[List[Tuple[Document, float]]],
+    weights: List[float],
+) -> List[Tuple[Document, float]]:
+    """
+    Fuse scored lists by min-max normalising each list's scores and summing them with weights.
+    """
+    scores: Dict[Tuple, float] = {}
+    docs: Dict[Tuple, Document] = {}
+    for scored, weight in zip(scored_lists, weights):
+        if not scored:
+            continue
+        values = [score for _, score in scored]
+        low, high = min(values), max(values)
+        spread = (high - low) or 1.0
+        for doc, score in scored:
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + weight * (score - low) / spread
+    return sorted(((docs[key], score) for key, score in scores.items()), key=lambda item: item[1], reverse=True)
+
+
+def load_collection_documents(
+    collection_name: str,
+    batch_size: int = 256,
+    rulebook_key: Optional[str] = None,
+) -> List[Document]:
+    """
+    Read every stored chunk of a collection (or of one rulebook in it) back as LangChain Documents
+    (used to rebuild the BM25 index).
+    """
+    qdrant_client = create_qdrant_client()
+    scroll_filter = rulebook_filter([rulebook_key]) if rulebook_key else None
+    documents = []
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        for point in points:
+            payload = point.payload or {}
+            documents.append(Document(
+                page_content=payload.get("page_content", ""),
+                metadata=payload.get("metadata", {}),
+            ))
+        if offset is None:
+            return documents
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever combining dense Qdrant similarity search with a sparse BM25 index.
+
+    `mode` selects dense, sparse or hybrid retrieval. In hybrid mode the top
+    `candidate_k` results of each side are fused with RRF or weighted scores.
+
+    `rulebook_keys` scopes both sides to some rulebooks of the shared collection (each has
+    its own BM25 index); `games`, `sources` and the page range narrow the search further.
+
+    With `rerank`, the best `rerank_candidates` results are reordered by a cross-encoder and
+    only the top `k` kept, unless that would take longer than `rerank_budget_ms`.
+    """
+    vector_store: QdrantVectorStore
+    collection_name: str
+    rulebook_keys: Optional[List[str]] = None
+    games: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+    mode: str = RETRIEVAL_MODE
+    fusion: str = RETRIEVAL_FUSION
+    k: int = RETRIEVAL_K
+    candidate_k: int = RETRIEVAL_CANDIDATES
+    dense_weight: float = RETRIEVAL_DENSE_WEIGHT
+    sparse_weight: float = RETRIEVAL_SPARSE_WEIGHT
+    rrf_k: int = RRF_K
+    rerank: bool = RERANK_ENABLED
+    rerank_candidates: int = RERANK_CANDIDATES
+    rerank_budget_ms: float = RERANK_BUDGET_MS
+
+    def _dense(self, query: str, limit: int) -> List[Tuple[Document, float]]:
+        # Embedded separately so query embedding and Qdrant search are timed apart
+        query_vector = self.vector_store.embeddings.embed_query(query)
+        # Served from the payload indexes, so the cost doesn't grow with unrelated rulebooks
+        query_filter = rulebook_filter(self.rulebook_keys, self.games, self.sources, self.page_from, self.page_to)
+        # Queried directly rather than through LangChain to fetch only the citation payload
+        with timed("qdrant_search"):
+            response = self.vector_store.client.query_points(
+                collection_name=self.vector_store.collection_name,
+                query=query_vector,
+                limit=limit,
+                query_filter=query_filter,
+                search_params=storage_search_params(
+                    collection_name=self.vector_store.collection_name, qdrant_client=self.vector_store.client
+                ),
+                with_payload=CITATION_PAYLOAD,
+            )
+        return [
+            (Document(page_content=(point.payload or {}).get("page_content", ""),
+                      metadata=(point.payload or {}).get("metadata", {})), point.score)
+            for point in response.points
+        ]
+
+    def _matches_filters(self, doc: Document) -> bool:
+        metadata = doc.metadata
+        page = metadata.get("page") or 0
+        return (
+            (not self.games or metadata.get("game") in self.games)
+            and (not self.sources or metadata.get("source") in self.sources)
+            and (self.page_from is None or page >= self.page_from)
+            and (self.page_to is None or page <= self.page_to)
+        )
+
+    def _load_rulebook(self, key: str) -> List[Document]:
+        return load_collection_documents(self.collection_name, rulebook_key=key)
+
+    def _sparse(self, query: str, limit: int) -> List[Tuple[Document, float]]:
+        filtered = self.games or self.sources or self.page_from is not None or self.page_to is not None
+        predicate = self._matches_filters if filtered else None
+        with timed("bm25_search"):
+            if not self.rulebook_keys:
+                index = bm25_indexes.get(self.collection_name, loader=load_collection_documents)
+                return index.search(query, k=limit, predicate=predicate) if index is not None else []
+
+            ranked = []
+            for key in self.rulebook_keys:
+                index = bm25_indexes.get(key, loader=self._load_rulebook)
+                if index is not None:
+                    ranked.append(index.search(query, k=limit, predicate=predicate))
+            if len(ranked) == 1:
+                return ranked[0]
+            # BM25 scores of separate indexes aren't comparable (their IDF and average
+            # document length differ), so the rulebooks' lists are fused by rank
+            fused = reciprocal_rank_fusion(
+                [[doc for doc, _ in results] for results in ranked], [1.0] * len(ranked), rrf_k=self.rrf_k
+            )
+            return fused[:limit]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if not self.rerank:
+            return self._retrieve(query, self.k)
+        candidates = self._retrieve(query, max(self.rerank_candidates, self.k))
+        return get_reranker().rerank(query, candidates, self.k, budget_ms=self.rerank_budget_ms)
+
+    def _retrieve(self, query: str, k: int) -> List[Document]:
+        if self.mode == "dense":
+            return [doc for doc, _ in self._dense(query, k)]
+        if self.mode == "sparse":
+            return [doc for doc, _ in self._sparse(query, k)]
+
+        limit = max(self.candidate_k, k)
+        dense = self._dense(query, limit)
+        sparse = self._sparse(query, limit)
+        weights = [self.dense_weight, self.sparse_weight]
+
+        with timed("fusion"):
+            if self.fusion == "weighted":
+                fused = weighted_score_fusion([dense, sparse], weights)
+            else:
+                fused = reciprocal_rank_fusion(
+                    [[doc for doc, _ in dense], [doc for doc, _ in sparse]], weights, rrf_k=self.rrf_k
+                )
+        return [doc for doc, _ in fused[:k]]
+
+
+def create_hybrid_retriever(
+    collection_name: str,
+    rulebook_keys: Optional[List[str]] = None,
+    **options,
+) -> HybridRetriever:
+    """
+    Create a LangChain retriever over a Qdrant collection that fuses dense
+    (shared Sentence Transformers model) and sparse (BM25) results.
+
+    Args:
+        collection_name (str): The name of the Qdrant collection to search.
+        rulebook_keys (Optional[List[str]]): Rulebooks of the collection to search; all when None.
+        **options: Overrides for the retriever fields (see `RetrievalOptions`).
 
     Returns:
-        retriever (VectorStoreRetriever): LangChain-compatible retriever
+        retriever (HybridRetriever): LangChain-compatible retriever
     """
 
-    qdrant_client: QdrantClient = create_qdrant_client()
+    embedding_model = get_embedding_service()
 
-    embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    vector_store = get_langchain_vector_store(collection_name, embedding_model)
 
-    vector_store = QdrantVectorStore(
-        client=qdrant_client,
-        collection_name=collection_name,
-        embedding=embedding_model,
+    return HybridRetriever(
+        vector_store=vector_store, collection_name=collection_name, rulebook_keys=rulebook_keys, **options
     )
-
-    return vector_store.as_retriever(search_kwargs={"k": 5})
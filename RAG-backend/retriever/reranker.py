@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from sentence_transformers import CrossEncoder
+from observability.metrics import timed
+from observability.tracing import current_trace_id
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Candidates retrieved (after fusion) and scored by the cross-encoder; the best `k` are kept
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+# (query, chunk) pairs per cross-encoder forward pass
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# Reranking that would take longer than this falls back to the retrieval order (0 = no budget)
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "250"))
+RERANK_WARMUP = os.getenv("RERANK_WARMUP", str(RERANK_ENABLED)).lower() == "true"
+
+
+class CrossEncoderReranker:
+    """
+    Process-wide, lazily loaded cross-encoder that reorders retrieved chunks by relevance.
+
+    Pairs are scored in batches on the CPU. The time budget is checked after every batch:
+    once it is exhausted the remaining pairs are not scored and the candidates keep their
+    retrieval order, so a slow or overloaded worker never adds more than about one batch
+    of latency over the budget.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model: Optional[CrossEncoder] = None
+        self._load_lock = threading.Lock()
+        # Like the embedding model, the tokenizer must not be called from several threads at once
+        self._predict_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.reranked = 0
+        self.fallbacks = 0
+
+    @property
+    def model(self) -> CrossEncoder:
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+                    self.load_seconds = time.perf_counter() - start
+                    print(f"Loaded reranking model '{self.model_name}' in {self.load_seconds:.2f}s.")
+        return self._model
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def rank(
+        self,
+        query: str,
+        texts: Sequence[str],
+        top_n: int,
+        budget_ms: float = RERANK_BUDGET_MS,
+        batch_size: int = RERANK_BATCH_SIZE,
+    ) -> List[int]:
+        """
+        Indices of the `top_n` most relevant texts, best first.
+
+        Falls back to the first `top_n` indices (the retrieval order) when scoring would
+        exceed `budget_ms` or fails.
+        """
+        fallback = list(range(min(top_n, len(texts))))
+        if len(texts) <= 1:
+            return fallback
+
+        model = self.model
+        deadline = time.perf_counter() + budget_ms / 1000 if budget_ms else None
+        scores = []
+        with timed("rerank"):
+            try:
+                for start in range(0, len(texts), batch_size):
+                    if deadline is not None and time.perf_counter() > deadline:
+                        self._record(fallback=True)
+                        print(f"[trace {current_trace_id() or '-'}] rerank exceeded {budget_ms:.0f}ms, "
+                              f"keeping retrieval order")
+                        return fallback
+                    pairs = [(query, text) for text in texts[start:start + batch_size]]
+                    with self._predict_lock:
+                        scores.extend(np.asarray(model.predict(pairs, batch_size=batch_size)).ravel().tolist())
+            except Exception as e:
+                self._record(fallback=True)
+                print(f"Reranking failed, keeping retrieval order: {e}")
+                return fallback
+
+        self._record(fallback=False)
+        # Stable sort: ties keep their retrieval order
+        return sorted(range(len(texts)), key=lambda i: -scores[i])[:top_n]
+
+    def rerank(self, query: str, documents: List[Document], top_n: int, **kwargs: Any) -> List[Document]:
+        order = self.rank(query, [doc.page_content for doc in documents], top_n, **kwargs)
+        return [documents[i] for i in order]
+
+    def _record(self, fallback: bool):
+        with self._stats_lock:
+            self.reranked += 1
+            self.fallbacks += int(fallback)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "enabled": RERANK_ENABLED,
+            "loaded": self.is_loaded,
+            "load_seconds": self.load_seconds,
+            "reranked": self.reranked,
+            "fallbacks": self.fallbacks,
+        }
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """
+    Return the shared reranker, creating it (but not loading its model) on first use.
+    """
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker(RERANK_MODEL)
+    return _reranker
+
+
+def warmup_reranker() -> Dict[str, Any]:
+    """
+    Load the cross-encoder eagerly and score one dummy pair, so the first reranked
+    question isn't pushed past its budget by the model load.
+    """
+    reranker = get_reranker()
+    reranker.model.predict([("warmup", "warmup")])
+    return reranker.stats()
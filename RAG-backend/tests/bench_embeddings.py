@@ -0,0 +1,142 @@
+"""
+Compare embedding backends on the bundled rulebook.
+
+For each variant ("backend[:int8]", optionally "+bucketed" for token-budget batching) reports
+model load time, ingest throughput (chunks/sec), single-query latency, and the retrieval
+quality delta against the first variant: dense recall@k on the bench_retrieval queries and
+the mean cosine similarity of each chunk vector to the baseline's. Variants whose runtime is
+not installed (ONNX needs `pip install sentence-transformers[onnx]`) are reported as skipped.
+
+Usage:
+    python -m tests.bench_embeddings --output embeddings.json
+    python -m tests.bench_embeddings --variants torch torch:int8 onnx onnx:int8 --threads 4
+    python -m tests.bench_embeddings --variants torch torch+bucketed --max-batch-tokens 4096
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from embeddings.embedding_service import EmbeddingService, DEFAULT_EMBEDDING_MODEL, EMBED_BATCH_SIZE
+from ingest.load_document import extract_text_from_pdf, chunk_pdf_text
+from tests.bench_retrieval import QUERIES, K_VALUES, is_relevant
+
+
+def parse_variant(variant: str):
+    runtime, _, bucketed = variant.partition("+")
+    backend, _, quantization = runtime.partition(":")
+    return backend, quantization or "none", bucketed == "bucketed"
+
+
+def dense_recall(query_vectors: np.ndarray, chunk_vectors: np.ndarray, texts):
+    hits = {k: 0 for k in K_VALUES}
+    scores = query_vectors @ chunk_vectors.T
+    for (_, expected), row in zip(QUERIES, scores):
+        ranked = np.argsort(-row)[:max(K_VALUES)]
+        for k in K_VALUES:
+            if any(is_relevant(texts[i], expected) for i in ranked[:k]):
+                hits[k] += 1
+    return {f"recall@{k}": round(hits[k] / len(QUERIES), 3) for k in K_VALUES}
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run(
+    pdf_path: str,
+    game_name: str,
+    variants,
+    model_name: str = DEFAULT_EMBEDDING_MODEL,
+    batch_size: int = EMBED_BATCH_SIZE,
+    threads: int = 0,
+    max_batch_tokens: int = 4096,
+    repeats: int = 3,
+):
+    documents = chunk_pdf_text(extract_text_from_pdf(pdf_path), source_filename=pdf_path, game_name=game_name)
+    texts = [doc.page_content for doc in documents]
+    questions = [question for question, _ in QUERIES]
+    results = {"chunks": len(texts), "model_name": model_name, "variants": {}}
+    baseline = None
+
+    for variant in variants:
+        backend, quantization, bucketed = parse_variant(variant)
+        service = EmbeddingService(
+            model_name, backend=backend, quantization=quantization, threads=threads,
+            batch_size=batch_size, max_batch_tokens=max_batch_tokens if bucketed else 0,
+        )
+        try:
+            service.encode(["warmup"])
+        except ImportError as e:
+            results["variants"][variant] = {"skipped": str(e)}
+            continue
+
+        ingest_seconds = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            chunk_vectors = service.encode(texts)
+            ingest_seconds.append(time.perf_counter() - start)
+
+        latencies = []
+        for question in questions:
+            start = time.perf_counter()
+            service.encode([question])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        chunk_vectors = normalize(chunk_vectors)
+        query_vectors = normalize(service.encode(questions))
+        row = {
+            "load_seconds": round(service.load_seconds, 2),
+            "chunks_per_second": round(len(texts) / min(ingest_seconds), 1),
+            "query_ms_p50": round(statistics.median(latencies), 2),
+            "query_ms_max": round(max(latencies), 2),
+            **dense_recall(query_vectors, chunk_vectors, texts),
+        }
+        if baseline is None:
+            baseline = (variant, row, chunk_vectors)
+        else:
+            base_variant, base_row, base_vectors = baseline
+            row["vs"] = base_variant
+            row["speedup"] = round(row["chunks_per_second"] / base_row["chunks_per_second"], 2)
+            row["mean_cosine_to_baseline"] = round(float(np.mean(np.sum(chunk_vectors * base_vectors, axis=1))), 4)
+            for k in K_VALUES:
+                row[f"recall@{k}_delta"] = round(row[f"recall@{k}"] - base_row[f"recall@{k}"], 3)
+        results["variants"][variant] = row
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="uploads/cfn.pdf")
+    parser.add_argument("--game", default="Checkers")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--variants", nargs="+", default=["torch", "torch:int8", "torch+bucketed", "onnx", "onnx:int8"],
+                        help="backend[:int8][+bucketed]; the first one is the baseline")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = runtime default)")
+    parser.add_argument("--max-batch-tokens", type=int, default=4096, help="Token budget of +bucketed variants")
+    parser.add_argument("--repeats", type=int, default=3, help="Ingest passes; the fastest is reported")
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(
+        args.pdf, args.game, args.variants, args.model, args.batch_size,
+        args.threads, args.max_batch_tokens, args.repeats,
+    )
+    print(f"{results['chunks']} chunks, {results['model_name']}")
+    print(f"{'variant':>16} {'chunks/s':>9} {'query p50':>10} " + " ".join(f"{'recall@' + str(k):>9}" for k in K_VALUES)
+          + f" {'cosine':>7}")
+    for variant, row in results["variants"].items():
+        if "skipped" in row:
+            print(f"{variant:>16} skipped: {row['skipped']}")
+            continue
+        print(f"{variant:>16} {row['chunks_per_second']:>9} {row['query_ms_p50']:>10} "
+              + " ".join(f"{row['recall@' + str(k)]:>9}" for k in K_VALUES)
+              + f" {row.get('mean_cosine_to_baseline', 1.0):>7}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
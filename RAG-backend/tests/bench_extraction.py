@@ -0,0 +1,90 @@
+"""
+Benchmark PDF extraction + chunking across rulebook sizes.
+
+For each page count a synthetic rulebook is built from cfn.pdf and run through
+  - serial:    one pass over every page, then chunk the full page list
+  - streaming: `iter_pdf_pages` (page-range shards on the process pool) feeding
+               `iter_pdf_chunks`
+Reports total seconds, pages/sec, time until the first chunk is available to
+the embedder, and peak Python heap of the calling process.
+
+Usage:
+    python -m tests.bench_extraction --pages 10,50,100,300 --output extraction.json
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from ingest.load_document import extract_page_range, iter_pdf_pages, iter_pdf_chunks, chunk_pdf_text
+from tests.synthetic_rulebook import make_synthetic_rulebook, synthetic_rulebook_path
+from workers.pools import PDF_EXTRACT_WORKERS, get_pdf_process_pool
+
+
+def run_serial(pdf_path: str, pages: int):
+    start = time.perf_counter()
+    documents = chunk_pdf_text(extract_page_range(pdf_path, 0, pages), source_filename=pdf_path, game_name="Checkers")
+    elapsed = time.perf_counter() - start
+    # Nothing reaches the embedder before the whole list is built
+    return len(documents), elapsed, elapsed
+
+
+def run_streaming(pdf_path: str, pages: int):
+    start = time.perf_counter()
+    first_chunk = None
+    count = 0
+    for _ in iter_pdf_chunks(iter_pdf_pages(pdf_path), source_filename=pdf_path, game_name="Checkers"):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        count += 1
+    return count, time.perf_counter() - start, first_chunk or 0.0
+
+
+def measure(func, pdf_path: str, pages: int):
+    tracemalloc.start()
+    chunks, seconds, first_chunk = func(pdf_path, pages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(pages / seconds, 1) if seconds else 0.0,
+        "first_chunk_seconds": round(first_chunk, 3),
+        "peak_heap_mb": round(peak / 1e6, 2),
+    }
+
+
+def run(page_counts, pdf_path: str):
+    # Start the worker processes outside the timed region
+    get_pdf_process_pool().submit(int).result()
+
+    results = {"pdf_extract_workers": PDF_EXTRACT_WORKERS, "runs": []}
+    for pages in page_counts:
+        rulebook = make_synthetic_rulebook(synthetic_rulebook_path(pages), pages, source_pdf=pdf_path)
+        results["runs"].append({
+            "pages": pages,
+            "serial": measure(run_serial, rulebook, pages),
+            "streaming": measure(run_streaming, rulebook, pages),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="10,50,100,300", help="Comma-separated page counts")
+    parser.add_argument("--pdf", default="uploads/cfn.pdf")
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    results = run([int(p) for p in args.pages.split(",")], args.pdf)
+    print(f"{results['pdf_extract_workers']} extraction processes")
+    print(f"{'pages':>6} {'mode':>10} {'seconds':>8} {'pages/s':>8} {'1st chunk':>10} {'heap MB':>8}")
+    for row in results["runs"]:
+        for mode in ("serial", "streaming"):
+            m = row[mode]
+            print(f"{row['pages']:>6} {mode:>10} {m['seconds']:>8} {m['pages_per_second']:>8} "
+                  f"{m['first_chunk_seconds']:>10} {m['peak_heap_mb']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
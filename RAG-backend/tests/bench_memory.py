@@ -0,0 +1,100 @@
+"""
+Simulate a long chat session under each memory strategy.
+
+Runs the real ConversationalRetrievalChain for N turns with a fake chat model
+and a fixed retriever, and reports prompt tokens per turn (condense + answer
+prompts) and per-turn latency. The fake model sleeps in proportion to its
+prompt size (--ms-per-1k-tokens) to mimic how LLM latency grows with input.
+
+Usage:
+    python -m tests.bench_memory --turns 100 --output memory.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from langchain.chains.conversational_retrieval.base import ConversationalRetrievalChain
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.retrievers import BaseRetriever
+
+from chains.session_memory import create_session_memory, count_message_tokens, PromptTokenCounter
+
+STRATEGIES = ["buffer", "window", "token", "summary"]
+ANSWER = (
+    "A man becomes a king when it reaches the far row of the board. Kings may move and jump "
+    "diagonally forward or backward, and a jump must be taken whenever one is available. "
+) * 3
+
+
+class StaticRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [Document(page_content=ANSWER, metadata={"page": i, "source": "cfn.pdf"}) for i in range(4)]
+
+
+class SlowFakeChatModel(FakeListChatModel):
+    """
+    Fake chat model whose latency grows with the prompt, like a hosted LLM.
+    """
+    ms_per_1k_tokens: float = 0.0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(count_message_tokens(messages) / 1000 * self.ms_per_1k_tokens / 1000)
+        return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+async def run_session(strategy: str, turns: int, ms_per_1k_tokens: float):
+    llm = SlowFakeChatModel(responses=[ANSWER], ms_per_1k_tokens=ms_per_1k_tokens)
+    summarizer = FakeListChatModel(responses=["The players discussed kings, jumps and the king row."])
+    memory = create_session_memory(strategy, llm=summarizer)
+    chain = ConversationalRetrievalChain.from_llm(
+        llm=llm, retriever=StaticRetriever(), memory=memory, return_source_documents=True
+    )
+
+    prompt_tokens, latencies = [], []
+    for turn in range(turns):
+        counter = PromptTokenCounter()
+        start = time.perf_counter()
+        await chain.ainvoke({"question": f"Follow-up question number {turn} about kings?"}, config={"callbacks": [counter]})
+        latencies.append((time.perf_counter() - start) * 1000)
+        prompt_tokens.append(counter.prompt_tokens)
+
+    checkpoints = sorted({1, 10, turns // 2, turns})
+    return {
+        "prompt_tokens_at_turn": {str(t): prompt_tokens[t - 1] for t in checkpoints},
+        "latency_ms_first_10": round(statistics.fmean(latencies[:10]), 2),
+        "latency_ms_last_10": round(statistics.fmean(latencies[-10:]), 2),
+        "history_messages_kept": len(memory.chat_memory.messages),
+    }
+
+
+def run(turns: int, ms_per_1k_tokens: float):
+    return {
+        "turns": turns,
+        "ms_per_1k_tokens": ms_per_1k_tokens,
+        "strategies": {
+            strategy: asyncio.run(run_session(strategy, turns, ms_per_1k_tokens)) for strategy in STRATEGIES
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=50.0)
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.turns, args.ms_per_1k_tokens)
+    checkpoints = list(next(iter(results["strategies"].values()))["prompt_tokens_at_turn"])
+    print(f"{'strategy':>8} " + " ".join(f"{'tok@' + t:>8}" for t in checkpoints)
+          + f" {'ms first10':>11} {'ms last10':>10} {'kept':>5}")
+    for strategy, row in results["strategies"].items():
+        print(f"{strategy:>8} " + " ".join(f"{row['prompt_tokens_at_turn'][t]:>8}" for t in checkpoints)
+              + f" {row['latency_ms_first_10']:>11} {row['latency_ms_last_10']:>10} {row['history_messages_kept']:>5}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,301 @@
+"""
+Offline benchmark of the whole RAG pipeline, for comparing commits.
+
+Runs without Qdrant Cloud or Gemini: the vector store is the in-process Qdrant
+backend and the chat model is a stub that returns a fixed answer after an
+optional simulated delay. Measures
+  - ingestion:  pages/sec and chunks/sec for cfn.pdf and synthetic rulebooks
+                (extract -> chunk -> embed -> upsert -> BM25, as the ingestion job does)
+  - retrieval:  dense / sparse / hybrid retriever latency on cfn.pdf
+  - ask:        end-to-end /upload + /ask latency through the FastAPI app
+                (standalone questions and follow-ups)
+plus peak RSS per phase and the per-stage timings from observability.metrics.
+
+Results are written as JSON together with the git commit, so two runs can be
+compared with --baseline.
+
+Usage:
+    python -m tests.bench_pipeline --pages 200,500 --output bench.json
+    python -m tests.bench_pipeline --baseline bench.json --output bench_new.json
+"""
+import os
+
+# Must be set before the app modules read their configuration
+os.environ.setdefault("VECTOR_STORE_BACKEND", "memory")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_WARMUP", "true")
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import FakeListChatModel
+
+from embeddings.embedding_service import current_rss_mb, get_embedding_service
+from ingest.embed_and_store import store_in_qdrant
+from ingest.load_document import iter_pdf_pages, iter_pdf_chunks
+from observability.metrics import stage_summary, reset_metrics
+from retriever.bm25_index import bm25_indexes
+from retriever.hybrid_retriever import create_hybrid_retriever
+from tests.bench_retrieval import QUERIES
+from tests.synthetic_rulebook import make_synthetic_rulebook, synthetic_rulebook_path
+from vectorstores.qdrant_store import delete_collection
+
+FOLLOW_UPS = ["And what about kings?", "Does that also apply to the first move?"]
+
+
+class StubChatModel(FakeListChatModel):
+    """
+    Chat model returning canned answers after `latency_seconds`, standing in for Gemini.
+    """
+    latency_seconds: float = 0.0
+
+    def _call(self, *args: Any, **kwargs: Any) -> str:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return super()._call(*args, **kwargs)
+
+
+class PeakRSS:
+    """
+    Samples the process RSS in a background thread while the block runs.
+    Without psutil, `current_rss_mb` already reports the process peak.
+    """
+
+    def __init__(self, interval_seconds: float = 0.05):
+        self.interval_seconds = interval_seconds
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb() or 0.0)
+            self._stop.wait(self.interval_seconds)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = round(max(self.peak_mb, current_rss_mb() or 0.0), 1)
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    ordered = sorted(seconds)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def bench_ingestion(pdf_path: str, collection_name: str) -> Dict[str, Any]:
+    pages = 0
+    documents = []
+
+    def counted_pages():
+        nonlocal pages
+        for page in iter_pdf_pages(pdf_path):
+            pages += 1
+            yield page
+
+    def collected_chunks():
+        for doc in iter_pdf_chunks(counted_pages(), source_filename=os.path.basename(pdf_path), game_name="Checkers"):
+            documents.append(doc)
+            yield doc
+
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        store_in_qdrant(collected_chunks(), collection_name)
+        bm25_indexes.build(collection_name, documents)
+        seconds = time.perf_counter() - start
+
+    return {
+        "pdf": pdf_path,
+        "pages": pages,
+        "chunks": len(documents),
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(pages / seconds, 1),
+        "chunks_per_second": round(len(documents) / seconds, 1),
+        "peak_rss_mb": rss.peak_mb,
+    }
+
+
+def bench_retrieval(collection_name: str, rounds: int) -> Dict[str, Any]:
+    results = {}
+    for mode in ("dense", "sparse", "hybrid"):
+        retriever = create_hybrid_retriever(collection_name, mode=mode)
+        retriever.invoke("warmup")
+        latencies = []
+        for _ in range(rounds):
+            for question, _ in QUERIES:
+                start = time.perf_counter()
+                retriever.invoke(question)
+                latencies.append(time.perf_counter() - start)
+        results[mode] = latency_summary(latencies)
+    return results
+
+
+def bench_ask(pdf_path: str, sessions: int, llm_latency_seconds: float) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+    import chains.qa_chain as qa_chain
+    import main
+
+    qa_chain._llm = StubChatModel(
+        responses=["A stubbed answer about the rules."], latency_seconds=llm_latency_seconds
+    )
+
+    upload_latencies, standalone, follow_ups = [], [], []
+    with PeakRSS() as rss, TestClient(main.app) as client:
+        for _ in range(sessions):
+            start = time.perf_counter()
+            with open(pdf_path, "rb") as f:
+                response = client.post(
+                    "/upload",
+                    files={"file": (os.path.basename(pdf_path), f, "application/pdf")},
+                    data={"game_name": "Checkers"},
+                )
+            response.raise_for_status()
+            session_id, job_id = response.json()["session_id"], response.json()["job_id"]
+            while job_id is not None:
+                job = client.get(f"/jobs/{job_id}").json()
+                if job["stage"] == "failed":
+                    raise RuntimeError(f"Ingestion failed: {job['error']}")
+                if job["stage"] == "completed":
+                    break
+                time.sleep(0.05)
+            upload_latencies.append(time.perf_counter() - start)
+
+            for i, question in enumerate([QUERIES[0][0]] + FOLLOW_UPS):
+                start = time.perf_counter()
+                client.post("/ask", json={"session_id": session_id, "question": question}).raise_for_status()
+                (standalone if i == 0 else follow_ups).append(time.perf_counter() - start)
+            client.post("/end", json={"session_id": session_id}).raise_for_status()
+
+    return {
+        "sessions": sessions,
+        "llm_latency_ms": llm_latency_seconds * 1000,
+        "upload_until_ready": latency_summary(upload_latencies),
+        "ask_standalone": latency_summary(standalone),
+        "ask_follow_up": latency_summary(follow_ups),
+        "peak_rss_mb": rss.peak_mb,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(pdf_path: str, page_counts: List[int], retrieval_rounds: int, sessions: int, llm_latency_seconds: float):
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+    with PeakRSS() as rss:
+        get_embedding_service().embed_query("warmup")
+    results["model_loaded_rss_mb"] = rss.peak_mb
+
+    reset_metrics()
+    rulebooks = [pdf_path] + [
+        make_synthetic_rulebook(synthetic_rulebook_path(pages), pages, source_pdf=pdf_path) for pages in page_counts
+    ]
+    results["ingestion"] = []
+    for i, rulebook in enumerate(rulebooks):
+        collection_name = f"bench_pipeline_{i}"
+        results["ingestion"].append(bench_ingestion(rulebook, collection_name))
+        if i == 0:
+            results["retrieval"] = bench_retrieval(collection_name, retrieval_rounds)
+        delete_collection(collection_name)
+        bm25_indexes.drop(collection_name)
+    results["ingestion_stages"] = stage_summary()
+
+    reset_metrics()
+    results["ask"] = bench_ask(pdf_path, sessions, llm_latency_seconds)
+    results["ask_stages"] = stage_summary()
+    return results
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    flat.update(flatten(item, f"{name}[{item.get('pages', '')}]."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """
+    Relative change of every numeric result present in both runs.
+    """
+    old, new = flatten(baseline), flatten(current)
+    lines = []
+    for name in sorted(old.keys() & new.keys()):
+        if old[name] and old[name] != new[name]:
+            lines.append(f"{name:<60} {old[name]:>10} -> {new[name]:>10} ({(new[name] - old[name]) / old[name]:+.1%})")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="uploads/cfn.pdf")
+    parser.add_argument("--pages", default="200,500", help="Comma-separated synthetic rulebook sizes, above cfn.pdf's 167 pages (empty to skip)")
+    parser.add_argument("--retrieval-rounds", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated LLM latency per call")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(
+        args.pdf,
+        [int(p) for p in args.pages.split(",") if p],
+        args.retrieval_rounds,
+        args.sessions,
+        args.llm_latency_ms / 1000,
+    )
+
+    print(f"commit {results['commit']}")
+    print(f"{'rulebook':>28} {'pages':>6} {'chunks':>7} {'pages/s':>8} {'chunks/s':>9} {'peak MB':>8}")
+    for row in results["ingestion"]:
+        print(f"{row['pdf']:>28} {row['pages']:>6} {row['chunks']:>7} {row['pages_per_second']:>8} "
+              f"{row['chunks_per_second']:>9} {row['peak_rss_mb']:>8}")
+    for mode, row in results["retrieval"].items():
+        print(f"retrieval {mode:>7}: p50 {row['p50_ms']} ms, p95 {row['p95_ms']} ms")
+    for name in ("upload_until_ready", "ask_standalone", "ask_follow_up"):
+        row = results["ask"][name]
+        print(f"{name:>18}: p50 {row['p50_ms']} ms, p95 {row['p95_ms']} ms")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nChanges since {baseline.get('commit')}:")
+        print("\n".join(compare(baseline, results)) or "(none)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
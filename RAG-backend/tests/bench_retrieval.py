@@ -0,0 +1,141 @@
+"""
+Compare dense, sparse (BM25) and hybrid retrieval on the bundled rulebook.
+
+Reports recall@k (a query counts as a hit when one of its top-k chunks contains
+the expected rule text) and per-query latency for each mode. Runs fully offline
+against an in-process Qdrant collection.
+
+With --rerank, the dense and hybrid modes are also run with the cross-encoder
+reranking stage ("dense+rerank", "hybrid+rerank"), so the recall it gains can be
+weighed against the latency it adds. The first run downloads the reranking model.
+
+Usage:
+    python -m tests.bench_retrieval --pdf uploads/cfn.pdf --output retrieval.json
+    python -m tests.bench_retrieval --rerank --rerank-budget-ms 0 --rerank-candidates 20
+"""
+import argparse
+import json
+import statistics
+import time
+
+from langchain_qdrant import QdrantVectorStore
+
+from embeddings.embedding_service import get_embedding_service
+from ingest.load_document import extract_text_from_pdf, chunk_pdf_text
+from retriever.bm25_index import bm25_indexes
+from retriever.hybrid_retriever import HybridRetriever
+from retriever.reranker import get_reranker, warmup_reranker
+
+# (question, text that a relevant chunk of cfn.pdf contains)
+QUERIES = [
+    ("How is the game won?", "won by the player who makes the last move"),
+    ("Are jumps compulsory?", "jumping moves are compulsory"),
+    ("Can a king move backwards?", "diagonally forward or backward"),
+    ("What is the 40-move rule?", "40-move rule"),
+    ("What happens when a man reaches the king-row during a jump?", "reaches the king-row by means of a jumping move"),
+    ("Who makes the first move?", "played by the player with the black men"),
+    ("If I touch a piece do I have to move it?", "touches a movable piece he must move that piece"),
+    ("When is a game drawn by repetition?", "same position for the third time"),
+    ("How are moves written down in notation?", "a move is recorded by means of two numbers"),
+    ("What is the penalty for an illegal move?", "cautioned for the first offence"),
+    ("Can the same piece be jumped twice in one sequence?", "may only be jumped once"),
+    ("How many squares does the board have?", "64 squares"),
+    ("Who chooses colours before the first game?", "coin toss"),
+    ("Can a man move backwards?", "moves a man backwards"),
+]
+
+MODES = ["dense", "sparse", "hybrid"]
+K_VALUES = [1, 3, 5]
+
+
+def is_relevant(text: str, expected: str) -> bool:
+    return expected in " ".join(text.split())
+
+
+def run(
+    pdf_path: str,
+    game_name: str,
+    rerank: bool = False,
+    rerank_candidates: int = 20,
+    rerank_budget_ms: float = 0.0,
+):
+    documents = chunk_pdf_text(extract_text_from_pdf(pdf_path), source_filename=pdf_path, game_name=game_name)
+    embedding = get_embedding_service()
+
+    start = time.perf_counter()
+    vector_store = QdrantVectorStore.from_documents(
+        documents, embedding, location=":memory:", collection_name="bench_retrieval"
+    )
+    dense_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bm25_indexes.build("bench_retrieval", documents)
+    sparse_build = time.perf_counter() - start
+
+    results = {
+        "chunks": len(documents),
+        "dense_index_seconds": round(dense_build, 3),
+        "sparse_index_seconds": round(sparse_build, 4),
+        "modes": {},
+    }
+
+    variants = [(mode, False) for mode in MODES]
+    if rerank:
+        results["rerank_model_load_seconds"] = warmup_reranker()["load_seconds"]
+        variants += [("dense", True), ("hybrid", True)]
+
+    for mode, reranked in variants:
+        retriever = HybridRetriever(
+            vector_store=vector_store,
+            collection_name="bench_retrieval",
+            mode=mode,
+            k=max(K_VALUES),
+            rerank=reranked,
+            rerank_candidates=rerank_candidates,
+            rerank_budget_ms=rerank_budget_ms,
+        )
+        fallbacks_before = get_reranker().fallbacks
+        retriever.invoke("warmup")
+
+        hits = {k: 0 for k in K_VALUES}
+        latencies = []
+        for question, expected in QUERIES:
+            start = time.perf_counter()
+            docs = retriever.invoke(question)
+            latencies.append((time.perf_counter() - start) * 1000)
+            for k in K_VALUES:
+                if any(is_relevant(doc.page_content, expected) for doc in docs[:k]):
+                    hits[k] += 1
+
+        row = {
+            **{f"recall@{k}": round(hits[k] / len(QUERIES), 3) for k in K_VALUES},
+            "latency_ms_p50": round(statistics.median(latencies), 2),
+            "latency_ms_max": round(max(latencies), 2),
+        }
+        if reranked:
+            row["rerank_fallbacks"] = get_reranker().fallbacks - fallbacks_before
+        results["modes"][f"{mode}+rerank" if reranked else mode] = row
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="uploads/cfn.pdf")
+    parser.add_argument("--game", default="Checkers")
+    parser.add_argument("--rerank", action="store_true", help="Also benchmark the cross-encoder reranking stage")
+    parser.add_argument("--rerank-candidates", type=int, default=20)
+    parser.add_argument("--rerank-budget-ms", type=float, default=0.0, help="Reranking time budget (0 = none)")
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.pdf, args.game, args.rerank, args.rerank_candidates, args.rerank_budget_ms)
+    print(f"{results['chunks']} chunks")
+    print(f"{'mode':>14} " + " ".join(f"{'recall@' + str(k):>9}" for k in K_VALUES) + f" {'p50 ms':>8}")
+    for mode, row in results["modes"].items():
+        print(f"{mode:>14} " + " ".join(f"{row['recall@' + str(k)]:>9}" for k in K_VALUES)
+              + f" {row['latency_ms_p50']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,185 @@
+"""
+Compare vector storage profiles (full / scalar / binary) at several collection sizes.
+
+Each run fills a fresh collection with `n` synthetic chunks (clustered random 384-dim vectors,
+payloads cut from cfn.pdf with the usual metadata) and reports:
+  - memory: the collection's RAM and disk usage as reported by the Qdrant server, next to the
+    expected size of the vectors kept in RAM
+  - search latency (p50 / p95) with the profile's search parameters
+  - recall@10 against an exact (unquantized, brute-force) search
+  - payload bytes per hit, for the full payload and for the citation fields retrieval fetches
+
+Quantization and on-disk storage only exist on a Qdrant server: run with VECTOR_STORE_BACKEND=cloud
+and QDRANT_URL / QDRANT_API_KEY pointing at a test cluster, or at a local container
+(`docker run -p 6333:6333 qdrant/qdrant`, any non-empty QDRANT_API_KEY). The in-process backend
+ignores both, so there only the "full" rows, latency of brute-force search and payload sizes
+are meaningful, and memory is the growth of this process's RSS.
+
+Usage:
+    python -m tests.bench_storage --sizes 1000 10000 100000 --output storage.json
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+
+import httpx
+import numpy as np
+from qdrant_client.models import PointStruct, SearchParams
+
+from embeddings.embedding_service import current_rss_mb
+from ingest.load_document import extract_text_from_pdf, chunk_pdf_text
+from vectorstores import qdrant_store
+
+DIMENSION = 384
+UPLOAD_BATCH_SIZE = 1024
+# Bytes per dimension of the vectors each profile keeps in RAM
+RAM_BYTES_PER_DIMENSION = {"full": 4, "scalar": 1, "binary": 1 / 8}
+
+
+def synthetic_vectors(n: int, rng: np.random.Generator) -> np.ndarray:
+    # Clusters of ~50 chunks, like the pages of many rulebooks on similar topics
+    centers = rng.normal(size=(max(n // 50, 1), DIMENSION))
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.normal(size=(n, DIMENSION))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def synthetic_points(vectors: np.ndarray, texts):
+    for i, vector in enumerate(vectors):
+        rulebook = f"rulebook-{i // 500}"
+        yield PointStruct(id=str(uuid.uuid4()), vector=vector.tolist(), payload={
+            "page_content": texts[i % len(texts)],
+            "metadata": {
+                "source": f"{rulebook}.pdf", "page": i % 500 // 4 + 1, "game": "Checkers",
+                "rulebook": rulebook, "chunk_hash": uuid.uuid4().hex, "occurrence": 0,
+            },
+        })
+
+
+def server_usage(collection_name: str):
+    """
+    RAM and disk bytes of a collection's segments, from the server's telemetry.
+    """
+    response = httpx.get(
+        f"{qdrant_store.QDRANT_URL.rstrip('/')}/telemetry",
+        params={"details_level": 3},
+        headers={"api-key": qdrant_store.QDRANT_API_KEY},
+        timeout=30,
+    )
+    response.raise_for_status()
+    ram = disk = 0
+    for collection in response.json()["result"]["collections"].get("collections", []):
+        if collection.get("id") != collection_name:
+            continue
+        for shard in collection.get("shards", []):
+            for segment in (shard.get("local") or {}).get("segments", []):
+                info = segment.get("info", {})
+                ram += info.get("ram_usage_bytes", 0)
+                disk += info.get("disk_usage_bytes", 0)
+    return ram, disk
+
+
+def wait_until_indexed(qdrant_client, collection_name: str, timeout: float = 600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if str(qdrant_client.get_collection(collection_name).status).lower().endswith("green"):
+            return
+        time.sleep(1)
+
+
+def bench(n: int, profile: str, texts, queries: int, limit: int, seed: int):
+    rng = np.random.default_rng(seed)
+    vectors = synthetic_vectors(n, rng)
+    query_vectors = vectors[rng.integers(0, n, queries)] + 0.3 * rng.normal(size=(queries, DIMENSION)) / np.sqrt(DIMENSION)
+
+    local = qdrant_store.VECTOR_STORE_BACKEND in qdrant_store.LOCAL_BACKENDS
+    collection = f"bench_storage_{uuid.uuid4().hex[:8]}"
+    qdrant_client = qdrant_store.create_qdrant_client()
+    rss_before = current_rss_mb()
+
+    start = time.perf_counter()
+    qdrant_store.create_collection(collection, DIMENSION, profile=profile)
+    points = synthetic_points(vectors, texts)
+    while batch := [point for _, point in zip(range(UPLOAD_BATCH_SIZE), points)]:
+        qdrant_client.upsert(collection_name=collection, points=batch, wait=True)
+    if not local:
+        wait_until_indexed(qdrant_client, collection)
+    load_seconds = time.perf_counter() - start
+
+    try:
+        search_params = qdrant_store.storage_search_params(profile)
+        latencies, recalls, full_bytes, slim_bytes = [], [], [], []
+        for query in query_vectors.tolist():
+            exact = qdrant_client.query_points(
+                collection_name=collection, query=query, limit=limit,
+                search_params=SearchParams(exact=True), with_payload=True,
+            ).points
+            start = time.perf_counter()
+            hits = qdrant_client.query_points(
+                collection_name=collection, query=query, limit=limit,
+                search_params=search_params, with_payload=qdrant_store.CITATION_PAYLOAD,
+            ).points
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len({p.id for p in hits} & {p.id for p in exact}) / max(len(exact), 1))
+            full_bytes.extend(len(json.dumps(p.payload)) for p in exact)
+            slim_bytes.extend(len(json.dumps(p.payload)) for p in hits)
+
+        row = {
+            "points": n,
+            "profile": profile,
+            "load_seconds": round(load_seconds, 2),
+            "expected_vector_ram_mb": round(n * DIMENSION * RAM_BYTES_PER_DIMENSION[profile] / 2**20, 2),
+            "search_ms_p50": round(statistics.median(latencies), 2),
+            "search_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+            f"recall@{limit}": round(statistics.mean(recalls), 4),
+            "payload_bytes_full": round(statistics.mean(full_bytes)),
+            "payload_bytes_citation": round(statistics.mean(slim_bytes)),
+        }
+        if local:
+            rss_after = current_rss_mb()
+            row["process_rss_growth_mb"] = round(rss_after - rss_before, 1) if rss_before and rss_after else None
+        else:
+            ram, disk = server_usage(collection)
+            row["server_ram_mb"] = round(ram / 2**20, 2)
+            row["server_disk_mb"] = round(disk / 2**20, 2)
+        return row
+    finally:
+        qdrant_store.delete_collection(collection)
+
+
+def run(sizes, profiles, pdf_path: str, queries: int = 200, limit: int = 10, seed: int = 0):
+    texts = [doc.page_content for doc in chunk_pdf_text(
+        extract_text_from_pdf(pdf_path), source_filename=pdf_path, game_name="Checkers"
+    )]
+    return {
+        "backend": qdrant_store.VECTOR_STORE_BACKEND,
+        "oversampling": qdrant_store.QUANTIZATION_OVERSAMPLING,
+        "runs": [bench(n, profile, texts, queries, limit, seed) for n in sizes for profile in profiles],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="uploads/cfn.pdf")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--profiles", nargs="+", default=["full", "scalar", "binary"],
+                        choices=sorted(qdrant_store.STORAGE_PROFILES))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.profiles, args.pdf, args.queries, args.limit)
+    memory_column = "process_rss_growth_mb" if results["backend"] in qdrant_store.LOCAL_BACKENDS else "server_ram_mb"
+    print(f"backend: {results['backend']}")
+    print(f"{'points':>8} {'profile':>8} {'vec RAM MB':>11} {'RAM MB':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'recall':>7} {'payload B':>10} {'cited B':>8}")
+    for row in results["runs"]:
+        print(f"{row['points']:>8} {row['profile']:>8} {row['expected_vector_ram_mb']:>11} "
+              f"{str(row.get(memory_column)):>8} {row['search_ms_p50']:>8} {row['search_ms_p95']:>8} "
+              f"{row[f'recall@{args.limit}']:>7} {row['payload_bytes_full']:>10} {row['payload_bytes_citation']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,89 @@
+"""
+Benchmark concurrent rulebook uploads: peak memory of the old read-everything path vs. streaming.
+
+Each simulated upload is a spooled temp file on disk, as the framework hands it to /upload.
+  - buffered:  `await file.read()` of the whole PDF, then one write (the previous behaviour)
+  - streaming: `save_upload`, chunked copy + incremental hash to a unique temp path
+Reports wall-clock seconds and the peak Python heap while all uploads are in flight.
+
+Usage:
+    python -m tests.bench_upload --uploads 50 --size-mb 20 --output upload.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from fastapi import UploadFile
+from ingest.uploads import save_upload, discard_upload
+
+
+async def buffered_upload(file: UploadFile, upload_dir: str):
+    content = await file.read()
+    hashlib.sha256(content).hexdigest()
+    path = os.path.join(upload_dir, f"{id(file)}.pdf")
+    with open(path, "wb") as f:
+        f.write(content)
+    os.remove(path)
+
+
+async def streaming_upload(file: UploadFile, upload_dir: str):
+    temp_path, _, _ = await save_upload(file, upload_dir)
+    discard_upload(temp_path)
+
+
+def measure(upload, source_path: str, uploads: int, upload_dir: str):
+    files = [UploadFile(open(source_path, "rb"), filename="rules.pdf") for _ in range(uploads)]
+
+    async def run_all():
+        await asyncio.gather(*(upload(f, upload_dir) for f in files))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    asyncio.run(run_all())
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for f in files:
+        f.file.close()
+    return {"seconds": round(seconds, 3), "peak_heap_mb": round(peak / 1e6, 1)}
+
+
+def run(uploads: int, size_mb: int):
+    work_dir = tempfile.mkdtemp(prefix="bench_upload_")
+    try:
+        source_path = os.path.join(work_dir, "source.pdf")
+        with open(source_path, "wb") as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+        return {
+            "uploads": uploads,
+            "size_mb": size_mb,
+            "buffered": measure(buffered_upload, source_path, uploads, work_dir),
+            "streaming": measure(streaming_upload, source_path, uploads, work_dir),
+        }
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.uploads, args.size_mb)
+    print(f"{results['uploads']} concurrent uploads of {results['size_mb']} MB")
+    for mode in ("buffered", "streaming"):
+        m = results[mode]
+        print(f"{mode:>10} {m['seconds']:>8}s {m['peak_heap_mb']:>8} MB peak heap")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
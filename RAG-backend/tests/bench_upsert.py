@@ -0,0 +1,115 @@
+"""
+Measure ingestion throughput (points/sec) for a large rulebook.
+
+Compares the old path (LangChain `add_documents`, one blocking request per
+batch) with `store_in_qdrant` at several batch sizes / in-flight limits. Each
+run embeds and stores every chunk of a synthetic rulebook built from cfn.pdf.
+
+Runs against the in-process Qdrant by default; set VECTOR_STORE_BACKEND=cloud
+(plus QDRANT_URL / QDRANT_API_KEY, optionally QDRANT_PREFER_GRPC=true) to
+measure the real network path.
+
+Usage:
+    python -m tests.bench_upsert --pages 200 --output upsert.json
+"""
+import os
+
+# Must be set before the app modules read their configuration
+os.environ.setdefault("VECTOR_STORE_BACKEND", "memory")
+
+import argparse
+import json
+import time
+import uuid
+
+from embeddings.embedding_service import get_embedding_service
+from ingest.embed_and_store import store_in_qdrant
+from ingest.load_document import extract_text_from_pdf, chunk_pdf_text
+from tests.synthetic_rulebook import make_synthetic_rulebook, synthetic_rulebook_path
+from vectorstores import qdrant_store
+
+# (upsert batch size, max upserts in flight)
+CONFIGS = [(64, 1), (256, 1), (256, 4), (512, 8)]
+
+
+def bench_legacy(documents, batch_size: int = 64) -> float:
+    collection = f"bench_upsert_{uuid.uuid4().hex[:8]}"
+    embedding = get_embedding_service()
+    start = time.perf_counter()
+    qdrant_store.create_collection(collection, embedding.dimension)
+    vector_store = qdrant_store.get_langchain_vector_store(collection, embedding)
+    vector_store.add_documents(documents, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    qdrant_store.delete_collection(collection)
+    return elapsed
+
+
+def bench_batched(documents, batch_size: int, max_in_flight: int) -> float:
+    collection = f"bench_upsert_{uuid.uuid4().hex[:8]}"
+    start = time.perf_counter()
+    store_in_qdrant(
+        documents,
+        collection,
+        vector_dim=get_embedding_service().dimension,
+        batch_size=batch_size,
+        max_in_flight=max_in_flight,
+    )
+    elapsed = time.perf_counter() - start
+    qdrant_store.delete_collection(collection)
+    return elapsed
+
+
+def run(pages: int, pdf_path: str):
+    rulebook = make_synthetic_rulebook(synthetic_rulebook_path(pages), pages, source_pdf=pdf_path)
+    documents = chunk_pdf_text(extract_text_from_pdf(rulebook), source_filename=rulebook, game_name="Checkers")
+
+    # Load the model outside the timed region
+    get_embedding_service().embed_query("warmup")
+
+    results = {
+        "backend": qdrant_store.VECTOR_STORE_BACKEND,
+        "prefer_grpc": qdrant_store.QDRANT_PREFER_GRPC,
+        "pages": pages,
+        "points": len(documents),
+        "runs": [],
+    }
+
+    elapsed = bench_legacy(documents)
+    results["runs"].append({
+        "path": "add_documents",
+        "batch_size": 64,
+        "max_in_flight": 1,
+        "seconds": round(elapsed, 3),
+        "points_per_second": round(len(documents) / elapsed, 1),
+    })
+
+    for batch_size, max_in_flight in CONFIGS:
+        elapsed = bench_batched(documents, batch_size, max_in_flight)
+        results["runs"].append({
+            "path": "store_in_qdrant",
+            "batch_size": batch_size,
+            "max_in_flight": max_in_flight,
+            "seconds": round(elapsed, 3),
+            "points_per_second": round(len(documents) / elapsed, 1),
+        })
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--pdf", default="uploads/cfn.pdf")
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.pages, args.pdf)
+    print(f"{results['points']} points from {results['pages']} pages ({results['backend']} backend)")
+    print(f"{'path':>16} {'batch':>6} {'flight':>6} {'seconds':>8} {'points/s':>9}")
+    for row in results["runs"]:
+        print(f"{row['path']:>16} {row['batch_size']:>6} {row['max_in_flight']:>6} "
+              f"{row['seconds']:>8} {row['points_per_second']:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
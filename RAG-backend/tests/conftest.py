@@ -0,0 +1,16 @@
+import pytest
+from vectorstores import qdrant_store
+
+
+@pytest.fixture
+def memory_backend(monkeypatch):
+    """
+    A fresh in-process Qdrant per test. The per-process collection caches are reset with it,
+    so a test that fails before deleting its collection can't leave later tests believing
+    their collection already exists.
+    """
+    monkeypatch.setattr(qdrant_store, "VECTOR_STORE_BACKEND", "memory")
+    monkeypatch.setattr(qdrant_store, "_local_client", None)
+    monkeypatch.setattr(qdrant_store, "_ensured_collections", set())
+    monkeypatch.setattr(qdrant_store, "_collection_profiles", {})
+    yield
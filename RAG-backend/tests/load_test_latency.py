@@ -0,0 +1,148 @@
+"""
+Load test for the /upload and /ask request path.
+
+Starts `level` concurrent sessions against a running backend, has each one ask
+a few questions, and reports p50/p99 latency per concurrency level. Uploads are
+ingested in the background: the upload latency is the time to the 200/202
+response, the ingest latency the time until its job completes.
+
+Usage:
+    uvicorn main:app --workers 1
+    python -m tests.load_test_latency --url http://127.0.0.1:8000 --levels 1,5,10,25
+
+To load test without Gemini quota, start the backend with LLM_BACKEND=fake (see llm/fake_llm.py
+for its latency and error settings), e.g. to see what hedging does to p99:
+    LLM_BACKEND=fake FAKE_LLM_SLOW_RATE=0.05 LLM_HEDGE_AFTER_SECONDS=1 uvicorn main:app --workers 1
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import Dict, List
+
+import httpx
+
+QUESTIONS = [
+    "How do I win the game?",
+    "How does a piece become a king?",
+    "Can kings move backwards?",
+    "What happens if a player cannot move?",
+]
+
+
+# How often a session polls its ingestion job
+JOB_POLL_SECONDS = 0.5
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def wait_for_job(client: httpx.AsyncClient, job_id: str) -> Dict:
+    while True:
+        response = await client.get(f"/jobs/{job_id}")
+        response.raise_for_status()
+        job = response.json()
+        if job["stage"] in ("completed", "failed"):
+            return job
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+
+async def run_session(client: httpx.AsyncClient, pdf_path: str, game_name: str,
+                      questions_per_session: int, upload_latencies: List[float],
+                      ingest_latencies: List[float], ask_latencies: List[float], errors: List[str]):
+    start = time.perf_counter()
+    with open(pdf_path, "rb") as f:
+        response = await client.post(
+            "/upload",
+            files={"file": (f"rulebook_{uuid.uuid4().hex[:8]}.pdf", f, "application/pdf")},
+            data={"game_name": game_name},
+        )
+    upload_latencies.append(time.perf_counter() - start)
+    # 202: ingestion was queued (or an identical upload is in flight); 200: the rulebook is known
+    if response.status_code not in (200, 202):
+        errors.append(f"upload: {response.status_code} {response.text[:200]}")
+        return
+
+    session_id, job_id = response.json()["session_id"], response.json().get("job_id")
+    try:
+        if job_id:
+            job = await wait_for_job(client, job_id)
+            if job["stage"] != "completed":
+                errors.append(f"ingest: {job.get('error')}")
+                return
+        ingest_latencies.append(time.perf_counter() - start)
+        for i in range(questions_per_session):
+            start = time.perf_counter()
+            response = await client.post(
+                "/ask",
+                json={"session_id": session_id, "question": QUESTIONS[i % len(QUESTIONS)]},
+            )
+            ask_latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append(f"ask: {response.status_code} {response.text[:200]}")
+    finally:
+        await client.post("/end", json={"session_id": session_id})
+
+
+async def run_level(url: str, level: int, pdf_path: str, game_name: str,
+                    questions_per_session: int) -> Dict:
+    upload_latencies: List[float] = []
+    ingest_latencies: List[float] = []
+    ask_latencies: List[float] = []
+    errors: List[str] = []
+
+    async with httpx.AsyncClient(base_url=url, timeout=600) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            run_session(client, pdf_path, game_name, questions_per_session,
+                        upload_latencies, ingest_latencies, ask_latencies, errors)
+            for _ in range(level)
+        ])
+        wall = time.perf_counter() - start
+
+    return {
+        "concurrent_sessions": level,
+        "wall_seconds": round(wall, 3),
+        "upload_p50": round(percentile(upload_latencies, 50), 3),
+        "upload_p99": round(percentile(upload_latencies, 99), 3),
+        "ingest_p50": round(percentile(ingest_latencies, 50), 3),
+        "ingest_p99": round(percentile(ingest_latencies, 99), 3),
+        "ask_p50": round(percentile(ask_latencies, 50), 3),
+        "ask_p99": round(percentile(ask_latencies, 99), 3),
+        "asks": len(ask_latencies),
+        "errors": len(errors),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--pdf", default="uploads/cfn.pdf")
+    parser.add_argument("--game", default="Checkers")
+    parser.add_argument("--levels", default="1,5,10,25")
+    parser.add_argument("--questions-per-session", type=int, default=3)
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'sessions':>8} {'upload p50':>11} {'upload p99':>11} {'ingest p50':>11} {'ingest p99':>11} "
+          f"{'ask p50':>8} {'ask p99':>8} {'errors':>7}")
+    for level in [int(x) for x in args.levels.split(",")]:
+        row = await run_level(args.url, level, args.pdf, args.game, args.questions_per_session)
+        results.append(row)
+        print(f"{row['concurrent_sessions']:>8} {row['upload_p50']:>11} {row['upload_p99']:>11} "
+              f"{row['ingest_p50']:>11} {row['ingest_p99']:>11} {row['ask_p50']:>8} {row['ask_p99']:>8} {row['errors']:>7}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
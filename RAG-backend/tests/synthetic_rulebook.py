@@ -0,0 +1,35 @@
+"""
+Build large synthetic rulebooks for the benchmarks.
+
+The pages of the bundled cfn.pdf (167 pages) are repeated until the requested
+page count is reached. Text and layout stay realistic, while the size can be
+scaled to whatever the benchmark needs. The files go to the temp directory, so
+they stay out of the tracked uploads/ folder and are reused between runs.
+"""
+import os
+import tempfile
+
+import fitz
+
+
+def synthetic_rulebook_path(pages: int) -> str:
+    return os.path.join(tempfile.gettempdir(), f"rulebook_bench_{pages}p.pdf")
+
+
+def make_synthetic_rulebook(path: str, pages: int, source_pdf: str = "uploads/cfn.pdf") -> str:
+    """
+    Write a `pages`-page PDF to `path` by cycling through the pages of `source_pdf`.
+    Reuses an existing file with the right page count.
+    """
+    if os.path.exists(path):
+        with fitz.open(path) as existing:
+            if existing.page_count == pages:
+                return path
+
+    with fitz.open(source_pdf) as source, fitz.open() as target:
+        while target.page_count < pages:
+            last = min(source.page_count, pages - target.page_count) - 1
+            target.insert_pdf(source, from_page=0, to_page=last)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        target.save(path)
+    return path
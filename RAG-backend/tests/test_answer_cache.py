@@ -0,0 +1,34 @@
+import time
+from chains.answer_cache import SemanticAnswerCache
+
+
+def test_similar_question_hits_only_on_the_same_rulebook():
+    cache = SemanticAnswerCache(max_size=10, ttl_seconds=60, threshold=0.9)
+    cache.store("rulebook_a", "how do I win?", [1.0, 0.0, 0.0], "Capture all pieces.", [{"page": 1}])
+
+    hit = cache.lookup("rulebook_a", [0.99, 0.05, 0.0])
+    assert hit is not None and hit.answer == "Capture all pieces."
+
+    assert cache.lookup("rulebook_a", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("rulebook_b", [1.0, 0.0, 0.0]) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 2, 0.333)
+
+
+def test_ttl_and_lru_eviction():
+    cache = SemanticAnswerCache(max_size=2, ttl_seconds=0.05, threshold=0.9)
+    cache.store("rulebook_a", "q1", [1.0, 0.0], "a1", [])
+    time.sleep(0.1)
+    assert cache.lookup("rulebook_a", [1.0, 0.0]) is None
+
+    cache = SemanticAnswerCache(max_size=2, ttl_seconds=60, threshold=0.9)
+    cache.store("rulebook_a", "q1", [1.0, 0.0], "a1", [])
+    cache.store("rulebook_b", "q2", [1.0, 0.0], "a2", [])
+    assert cache.lookup("rulebook_a", [1.0, 0.0]).answer == "a1"
+
+    # rulebook_b's entry is now the least recently used
+    cache.store("rulebook_c", "q3", [1.0, 0.0], "a3", [])
+    assert cache.lookup("rulebook_b", [1.0, 0.0]) is None
+    assert cache.lookup("rulebook_a", [1.0, 0.0]).answer == "a1"
+    assert cache.stats()["size"] == 2
@@ -1,8 +1,10 @@
 from retriever.answer_question import answer_question
+from vectorstores.qdrant_store import RULEBOOK_COLLECTION, rulebook_filter
 
 res = answer_question(
     query="how many indices for each player?",
-    collection_name="rulebook_session_79ad63b8"
+    collection_name=RULEBOOK_COLLECTION,
+    query_filter=rulebook_filter(rulebook_keys=["79ad63b8"]),
 )
 
 print("🔮 Answer:\n", res["answer"])
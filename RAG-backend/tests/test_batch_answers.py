@@ -0,0 +1,56 @@
+import asyncio
+from langchain_core.documents import Document
+from retriever import answer_question
+from retriever.answer_question import astream_answer_questions, dedupe_chunks
+from ingest.embed_and_store import store_in_qdrant, delete_collection
+
+
+def test_dedupe_drops_repeats_and_trims_chunk_overlap():
+    chunks = [
+        {"text": "a man reaches the king row and is crowned by the opponent", "source": "cfn.pdf", "page": 1},
+        {"text": "is crowned by the opponent, who places a second man on top", "source": "cfn.pdf", "page": 1},
+        {"text": "the king row", "source": "cfn.pdf", "page": 1},
+        {"text": "the king row", "source": "other.pdf", "page": 4},
+    ]
+
+    deduped = dedupe_chunks(chunks)
+    assert [c["text"] for c in deduped] == [
+        "a man reaches the king row and is crowned by the opponent",
+        ", who places a second man on top",
+        "the king row",
+    ]
+    assert deduped[2]["source"] == "other.pdf"
+
+
+def test_batch_answers_stream_back_once_per_question(memory_backend, monkeypatch):
+    docs = [
+        Document(page_content="a man that reaches the king row is crowned", metadata={"page": 1, "source": "cfn.pdf"}),
+        Document(page_content="all jumping moves are compulsory", metadata={"page": 2, "source": "cfn.pdf"}),
+    ]
+    store_in_qdrant(docs, "batch_test")
+    prompts = []
+
+    async def fake_gemini(prompt):
+        prompts.append(prompt)
+        if "explode" in prompt:
+            raise RuntimeError("quota exceeded")
+        return "answer"
+
+    monkeypatch.setattr(answer_question, "acall_gemini", fake_gemini)
+    questions = ["Are jumps compulsory?", "When is a man crowned?", "Are  jumps compulsory?", "explode"]
+
+    async def collect():
+        return [r async for r in astream_answer_questions(questions, "batch_test", top_k=1)]
+
+    try:
+        results = sorted(asyncio.run(collect()), key=lambda r: r["index"])
+    finally:
+        delete_collection("batch_test")
+
+    # The repeated question is answered once but reported at both of its positions
+    assert len(prompts) == 3
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[0]["sources"][0]["page"] == 2
+    assert results[1]["sources"][0]["page"] == 1
+    assert results[2]["answer"] == "answer"
+    assert results[3]["error"] == "quota exceeded"
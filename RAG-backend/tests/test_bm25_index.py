@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from retriever.bm25_index import BM25Index, BM25IndexRegistry, tokenize
+
+
+def make_docs():
+    texts = [
+        "when a man reaches the king row the opponent must crown it: king me!",
+        "a double jump lets a piece capture two men in a single move",
+        "the board has 64 squares and each player starts with twelve men",
+    ]
+    return [Document(page_content=text, metadata={"page": i + 1, "source": "rules.pdf"}) for i, text in enumerate(texts)]
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("The King, the Row!") == ["king", "row"]
+
+
+def test_exact_terms_rank_first():
+    index = BM25Index(make_docs())
+
+    top_doc, _ = index.search("double jump", k=1)[0]
+    assert top_doc.metadata["page"] == 2
+
+    top_doc, _ = index.search("king me", k=1)[0]
+    assert top_doc.metadata["page"] == 1
+
+
+def test_unknown_terms_return_nothing():
+    assert BM25Index(make_docs()).search("zebra", k=3) == []
+
+
+def test_registry_evicts_least_recently_used_indexes():
+    registry = BM25IndexRegistry(max_size=2)
+    registry.build("a", make_docs())
+    registry.build("b", make_docs())
+    assert registry.get("a") is not None
+    registry.build("c", make_docs())
+
+    assert registry.get("b") is None
+    assert registry.get("a") is not None and registry.get("c") is not None
+    assert registry.stats()["evictions"] == 1
+    assert registry.stats()["indexes"] == 2
+
+
+def test_concurrent_misses_build_the_index_once():
+    registry = BM25IndexRegistry()
+    loads = []
+
+    def loader(name):
+        loads.append(name)
+        time.sleep(0.05)
+        return make_docs()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        indexes = list(pool.map(lambda _: registry.get("rulebook", loader=loader), range(4)))
+
+    assert loads == ["rulebook"]
+    assert all(index is indexes[0] for index in indexes)
+    assert registry.stats()["misses"] == 4
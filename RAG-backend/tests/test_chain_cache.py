@@ -0,0 +1,27 @@
+import time
+from chains.qa_chain import ChainCache
+
+
+def test_chain_cache_reuses_and_evicts_lru():
+    cache = ChainCache(max_size=2, ttl_seconds=60)
+    cache.put("s1", "rulebook_a", "chain-1")
+    cache.put("s2", "rulebook_b", "chain-2")
+
+    assert cache.get("s1", "rulebook_a") == "chain-1"
+
+    # s2 is now the least recently used entry
+    cache.put("s3", "rulebook_c", "chain-3")
+    assert cache.get("s2", "rulebook_b") is None
+    assert cache.get("s1", "rulebook_a") == "chain-1"
+    assert cache.get("s3", "rulebook_c") == "chain-3"
+
+
+def test_chain_cache_idle_ttl_and_session_eviction():
+    cache = ChainCache(max_size=10, ttl_seconds=0.05)
+    cache.put("s1", "rulebook_a", "chain-1")
+    time.sleep(0.1)
+    assert cache.get("s1", "rulebook_a") is None
+
+    cache.put("s2", "rulebook_b", "chain-2")
+    assert cache.evict_session("s2") == 1
+    assert cache.get("s2", "rulebook_b") is None
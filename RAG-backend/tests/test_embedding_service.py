@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from embeddings.embedding_service import EmbeddingService
+
+
+class LengthModel:
+    """
+    Embeds a text as [len(text), 1] and records the size of every forward pass.
+    """
+    max_seq_length = 256
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, **kwargs):
+        self.batches.append([len(text) for text in texts])
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+def make_service(max_batch_tokens, batch_size=64):
+    service = EmbeddingService("test-model", batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+    service._model = LengthModel()
+    return service
+
+
+def test_bucketing_keeps_input_order_and_respects_the_token_budget():
+    # 10 short queries (~4 tokens) and 4 long chunks (~102 tokens)
+    texts = ["q" * (8 + i) for i in range(10)] + ["c" * 400] * 4
+    texts = texts[::2] + texts[1::2]
+    service = make_service(max_batch_tokens=256)
+
+    vectors = service.encode(texts)
+
+    assert vectors[:, 0].tolist() == [len(text) for text in texts]
+    batches = service._model.batches
+    # Short texts share one pass; long ones go at most two at a time (102 * 2 <= 256)
+    assert sorted(batches[0]) == sorted(len(text) for text in texts if len(text) < 400)
+    assert [len(batch) for batch in batches[1:]] == [2, 2]
+
+
+def test_batch_size_caps_buckets_and_no_budget_means_one_call():
+    texts = ["short text"] * 5
+    service = make_service(max_batch_tokens=10_000, batch_size=2)
+    service.encode(texts)
+    assert [len(batch) for batch in service._model.batches] == [2, 2, 1]
+
+    unbucketed = make_service(max_batch_tokens=0)
+    unbucketed.encode(texts)
+    assert len(unbucketed._model.batches) == 1
+
+
+def test_rejects_unknown_backends():
+    with pytest.raises(ValueError):
+        EmbeddingService("test-model", backend="tensorrt")
+    with pytest.raises(ValueError):
+        EmbeddingService("test-model", quantization="int4")
+
+
+def test_query_embeddings_are_cached_lru():
+    service = EmbeddingService("test-model", query_cache_size=2)
+    service._model = LengthModel()
+
+    first = service.embed_queries(["a", "bb", "a"])
+    assert first[:, 0].tolist() == [1, 2, 1]
+    # Only the distinct misses were encoded
+    assert service._model.batches == [[1, 2]]
+
+    service.embed_query("a")
+    service.embed_query("ccc")  # evicts "bb", the least recently used
+    service.embed_queries(["a", "bb"])
+    assert service._model.batches == [[1, 2], [3], [2]]
+    assert service.stats()["query_cache"] == {"size": 2, "max_size": 2, "hits": 2, "misses": 4}
@@ -0,0 +1,43 @@
+from langchain_core.documents import Document
+from retriever.bm25_index import bm25_indexes
+from retriever.hybrid_retriever import HybridRetriever
+
+
+def make_docs(source, texts):
+    return [Document(page_content=text, metadata={"page": i + 1, "source": source}) for i, text in enumerate(texts)]
+
+
+def test_sparse_results_of_several_rulebooks_are_fused_by_rank():
+    # "king" is in every chunk of the base game but rare in the small expansion, so the
+    # expansion's raw BM25 scores are far higher for the same kind of match
+    base = make_docs("base.pdf", ["a king may move backwards"] + [f"the king rule number {i}" for i in range(9)])
+    expansion = make_docs("expansion.pdf", ["the dragon king breathes fire", "a king card", "setup the tiles"])
+    bm25_indexes.build("test-base", base)
+    bm25_indexes.build("test-expansion", expansion)
+    retriever = HybridRetriever.model_construct(collection_name="test", rulebook_keys=["test-base", "test-expansion"])
+
+    try:
+        results = retriever._sparse("king", limit=4)
+    finally:
+        bm25_indexes.drop("test-base")
+        bm25_indexes.drop("test-expansion")
+
+    # Each rulebook's best chunk comes before either's second best
+    assert {doc.metadata["source"] for doc, _ in results[:2]} == {"base.pdf", "expansion.pdf"}
+
+
+def test_in_process_stores_search_without_the_cloud_backend(monkeypatch):
+    from langchain_qdrant import QdrantVectorStore
+    from embeddings.embedding_service import get_embedding_service
+    from vectorstores import qdrant_store
+
+    # The process default is the cloud, without credentials; the retriever's own store is in-process
+    monkeypatch.setattr(qdrant_store, "VECTOR_STORE_BACKEND", "cloud")
+    monkeypatch.setattr(qdrant_store, "QDRANT_URL", None)
+    docs = make_docs("cfn.pdf", ["a king may move backwards", "all jumping moves are compulsory"])
+    vector_store = QdrantVectorStore.from_documents(
+        docs, get_embedding_service(), location=":memory:", collection_name="offline_test"
+    )
+    retriever = HybridRetriever(vector_store=vector_store, collection_name="offline_test", mode="dense", k=1)
+
+    assert retriever.invoke("are jumps compulsory?")[0].metadata["page"] == 2
@@ -0,0 +1,60 @@
+import time
+import pytest
+from jobs.job_store import JobStore, InMemoryJobStore, SQLiteJobStore, EMBEDDING, COMPLETED, QUEUED
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / "jobs.db"))
+
+
+def test_job_progress_and_throughput(store):
+    job = store.create("session-1", "rulebook_abc", "abc", "Checkers", "cfn.pdf")
+    assert store.get(job.job_id).stage == QUEUED
+
+    store.update(job.job_id, stage=EMBEDDING, started_at=time.time() - 2,
+                 embedding_started_at=time.time() - 1, total_chunks=100)
+    store.update(job.job_id, chunks_embedded=50)
+
+    status = store.get(job.job_id).to_dict()
+    assert status["stage"] == EMBEDDING
+    assert status["chunks_embedded"] == 50
+    assert 0 < status["chunks_per_second"] <= 50
+
+
+def test_purge_only_removes_old_finished_jobs(store):
+    running = store.create("s1", "rulebook_a", "a", "Catan", "catan.pdf")
+    done = store.create("s2", "rulebook_b", "b", "Catan", "catan.pdf")
+    store.update(done.job_id, stage=COMPLETED, finished_at=time.time() - 10)
+
+    assert store.purge_finished(older_than_seconds=5) == 1
+    assert store.get(done.job_id) is None
+    assert store.get(running.job_id) is not None
+
+
+def test_unknown_fields_are_rejected(store):
+    job = store.create("s1", "rulebook_a", "a", "Catan", "catan.pdf")
+
+    with pytest.raises(ValueError):
+        store.update(job.job_id, chunks_embeded=5)
+
+
+def test_sqlite_jobs_are_visible_to_other_workers(tmp_path):
+    accepting = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    polled = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    job = accepting.create("s1", "rulebooks", "a", "Catan", "catan.pdf", previous_rulebook_key="z")
+    accepting.update(job.job_id, stage=EMBEDDING, chunks_embedded=7)
+
+    seen = polled.get(job.job_id)
+    assert (seen.stage, seen.chunks_embedded, seen.previous_rulebook_key) == (EMBEDDING, 7, "z")
+
+
+def test_incomplete_job_store_fails_at_construction():
+    class PartialJobStore(JobStore):
+        def get(self, job_id):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialJobStore()
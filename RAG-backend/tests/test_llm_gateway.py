@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from llm.fake_llm import FakeChatModel, FakeLLMError
+import llm.gateway
+from llm.gateway import GatewayChatModel, LLMGateway, LLMUnavailableError, llm_deadline
+
+
+class ScriptedBackend:
+    """
+    Answers call `i` after `delays[i]` seconds, failing with `errors[i]` if given. Calls past
+    the script answer immediately. Records how many calls were in flight at once.
+    """
+
+    def __init__(self, delays=(), errors=()):
+        self.delays = list(delays)
+        self.errors = list(errors)
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _next(self):
+        i = self.calls
+        self.calls += 1
+        delay = self.delays[i] if i < len(self.delays) else 0
+        error = self.errors[i] if i < len(self.errors) else None
+        return i, delay, error
+
+    async def ainvoke(self, messages, config=None):
+        i, delay, error = self._next()
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.active -= 1
+        if error is not None:
+            raise error
+        return AIMessage(content=f"answer {i}")
+
+    def invoke(self, messages, config=None):
+        i, delay, error = self._next()
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(delay)
+        finally:
+            with self.lock:
+                self.active -= 1
+        if error is not None:
+            raise error
+        return AIMessage(content=f"answer {i}")
+
+    async def astream(self, messages, config=None):
+        i, delay, error = self._next()
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        for word in ["answer", f" {i}"]:
+            yield AIMessageChunk(content=word)
+
+
+def make_gateway(backend, **kwargs):
+    options = dict(timeout_seconds=1, deadline_seconds=5, max_retries=3, retry_base_seconds=0.01,
+                   retry_max_seconds=0.02, hedge_after_seconds=0, per_session_limit=0)
+    options.update(kwargs)
+    return LLMGateway(backend, **options)
+
+
+def test_retries_transient_errors_until_an_answer():
+    backend = ScriptedBackend(errors=[FakeLLMError("429"), ConnectionError("reset")])
+    gateway = make_gateway(backend)
+
+    assert asyncio.run(gateway.agenerate("question")) == "answer 2"
+    assert gateway.generate("question") == "answer 3"
+    assert gateway.stats()["retries"] == 2
+    assert gateway.stats()["failures"] == 0
+
+
+def test_does_not_retry_other_errors():
+    backend = ScriptedBackend(errors=[ValueError("bad request")])
+    gateway = make_gateway(backend)
+
+    with pytest.raises(ValueError):
+        asyncio.run(gateway.agenerate("question"))
+    assert backend.calls == 1
+
+
+def test_gives_up_after_the_retries():
+    backend = ScriptedBackend(errors=[FakeLLMError("429")] * 10)
+    gateway = make_gateway(backend, max_retries=2)
+
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(gateway.agenerate("question"))
+    assert backend.calls == 3
+    assert gateway.stats()["failures"] == 1
+
+
+def test_slow_attempts_time_out_within_the_deadline():
+    backend = ScriptedBackend(delays=[10] * 10)
+    gateway = make_gateway(backend, timeout_seconds=0.05, max_retries=10)
+
+    async def ask():
+        with llm_deadline(0.2):
+            return await gateway.agenerate("question")
+
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(ask())
+    assert time.monotonic() - start < 0.5
+    assert backend.calls < 10
+
+
+def test_hedge_answers_for_a_slow_first_request():
+    backend = ScriptedBackend(delays=[2, 0.01])
+    gateway = make_gateway(backend, hedge_after_seconds=0.05)
+
+    start = time.monotonic()
+    assert asyncio.run(gateway.agenerate("question")) == "answer 1"
+    assert time.monotonic() - start < 1
+    assert gateway.stats()["hedges"] == 1
+    assert gateway.stats()["hedge_wins"] == 1
+
+
+def test_hedges_take_a_global_slot_of_their_own(monkeypatch):
+    backend = ScriptedBackend(delays=[0.3, 0.3, 0.3])
+    gateway = make_gateway(backend, hedge_after_seconds=0.05)
+
+    async def run():
+        slots = asyncio.Semaphore(1)
+        monkeypatch.setattr(llm.gateway, "llm_slots", slots)
+        await asyncio.gather(gateway.agenerate("question"), gateway.agenerate("question"))
+        return slots
+
+    slots = asyncio.run(run())
+    # Only one of the two slow calls found the free slot to hedge with, and gave it back
+    assert gateway.stats()["hedges"] == 1
+    assert not slots.locked()
+
+
+def test_blocking_calls_share_the_global_slots(monkeypatch):
+    backend = ScriptedBackend(delays=[0.05] * 4)
+    gateway = make_gateway(backend)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        monkeypatch.setattr(llm.gateway, "llm_slots", asyncio.Semaphore(1))
+        gateway.bind_event_loop(loop)
+        with ThreadPoolExecutor(4) as pool:
+            answers = list(pool.map(lambda _: gateway.generate("question"), range(4)))
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    assert len(answers) == 4
+    assert backend.peak == 1
+
+
+def test_per_session_limit_bounds_concurrent_calls():
+    backend = ScriptedBackend(delays=[0.05] * 6)
+    gateway = make_gateway(backend, per_session_limit=2)
+
+    async def call():
+        async with gateway.slot("session-1"):
+            return await gateway.agenerate("question")
+
+    async def run():
+        return await asyncio.gather(*(call() for _ in range(6)))
+
+    assert len(asyncio.run(run())) == 6
+    assert backend.peak == 2
+    assert gateway.stats()["sessions_calling"] == 0
+
+
+def test_streams_are_retried_until_the_first_chunk():
+    backend = ScriptedBackend(errors=[FakeLLMError("503")])
+    model = GatewayChatModel(gateway=make_gateway(backend))
+
+    async def collect():
+        return [chunk.content async for chunk in model.astream("question")]
+
+    assert "".join(asyncio.run(collect())) == "answer 1"
+
+
+def test_fake_backend_answers_condense_prompts_with_the_question():
+    model = GatewayChatModel(gateway=make_gateway(FakeChatModel(latency_ms=0, jitter_ms=0, slow_rate=0)))
+    prompt = "Chat History:\nHuman: hi\nFollow Up Input: Can kings move backwards?\nStandalone question:"
+
+    assert model.invoke(prompt).content == "Can kings move backwards?"
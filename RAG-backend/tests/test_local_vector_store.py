@@ -0,0 +1,132 @@
+import pytest
+from langchain_core.documents import Document
+from vectorstores import qdrant_store
+from ingest.embed_and_store import store_in_qdrant, delete_collection, tag_chunks
+from retriever.answer_question import search_qdrant_for_chunks
+from retriever.hybrid_retriever import create_hybrid_retriever
+from embeddings.embedding_service import get_embedding_service
+
+
+def test_store_search_and_delete_in_process(memory_backend):
+    docs = [
+        Document(page_content="a man that reaches the king row is crowned", metadata={"page": 1, "source": "cfn.pdf", "game": "Checkers"}),
+        Document(page_content="all jumping moves are compulsory", metadata={"page": 2, "source": "cfn.pdf", "game": "Checkers"}),
+    ]
+    store_in_qdrant(docs, "rulebook_local_test")
+
+    query_vector = get_embedding_service().embed_query("are jumps compulsory?")
+    chunks = search_qdrant_for_chunks(query_vector, "rulebook_local_test", top_k=1)
+    assert chunks[0]["page"] == 2
+    assert chunks[0]["text"] == "all jumping moves are compulsory"
+
+    retriever = create_hybrid_retriever("rulebook_local_test", mode="dense", k=2)
+    assert len(retriever.invoke("king row")) == 2
+
+    delete_collection("rulebook_local_test")
+    assert not qdrant_store.create_qdrant_client().collection_exists("rulebook_local_test")
+
+
+def test_rulebooks_share_a_collection_and_filter_by_payload(memory_backend):
+    from retriever.bm25_index import bm25_indexes
+
+    base = [
+        Document(page_content="a man that reaches the king row is crowned", metadata={"page": 1, "source": "cfn.pdf", "game": "Checkers", "rulebook": "base"}),
+        Document(page_content="all jumping moves are compulsory", metadata={"page": 2, "source": "cfn.pdf", "game": "Checkers", "rulebook": "base"}),
+    ]
+    expansion = [
+        Document(page_content="flying kings may jump from any distance", metadata={"page": 1, "source": "flying.pdf", "game": "Flying Kings", "rulebook": "expansion"}),
+    ]
+    for key, docs in (("base", base), ("expansion", expansion)):
+        store_in_qdrant(docs, "rulebooks_test")
+        bm25_indexes.build(key, docs)
+
+    try:
+        for mode in ("dense", "sparse"):
+            retriever = create_hybrid_retriever("rulebooks_test", rulebook_keys=["base"], mode=mode, k=5)
+            assert {doc.metadata["rulebook"] for doc in retriever.invoke("king jump")} == {"base"}
+
+            both = create_hybrid_retriever("rulebooks_test", rulebook_keys=["base", "expansion"], mode=mode, k=5)
+            assert {doc.metadata["rulebook"] for doc in both.invoke("king jump")} == {"base", "expansion"}
+            assert [d.metadata["game"] for d in both.model_copy(update={"games": ["Flying Kings"]}).invoke("kings jump")] == ["Flying Kings"]
+            assert [d.metadata["page"] for d in both.model_copy(update={"sources": ["cfn.pdf"], "page_from": 2}).invoke("jumping moves")] == [2]
+
+        query_vector = get_embedding_service().embed_query("can kings jump?")
+        scoped = search_qdrant_for_chunks(query_vector, "rulebooks_test", top_k=5, query_filter=qdrant_store.rulebook_filter(["base"]))
+        assert {chunk["rulebook"] for chunk in scoped} == {"base"}
+
+        qdrant_store.delete_rulebook_points("rulebooks_test", "base")
+        retriever = create_hybrid_retriever("rulebooks_test", mode="dense", k=5)
+        assert {doc.metadata["rulebook"] for doc in retriever.invoke("king")} == {"expansion"}
+    finally:
+        bm25_indexes.drop("base")
+        bm25_indexes.drop("expansion")
+        delete_collection("rulebooks_test")
+
+
+def test_searches_fetch_only_citation_fields(memory_backend):
+    docs = list(tag_chunks([
+        Document(page_content="all jumping moves are compulsory", metadata={"page": 2, "source": "cfn.pdf", "game": "Checkers"}),
+    ], "base"))
+    store_in_qdrant(docs, "rulebook_slim_test")
+
+    query_vector = get_embedding_service().embed_query("are jumps compulsory?")
+    chunk = search_qdrant_for_chunks(query_vector, "rulebook_slim_test", top_k=1)[0]
+    assert chunk == {"text": "all jumping moves are compulsory", "page": 2, "source": "cfn.pdf", "game": "Checkers", "rulebook": "base"}
+
+    doc = create_hybrid_retriever("rulebook_slim_test", mode="dense", k=1).invoke("jumps")[0]
+    assert "chunk_hash" not in doc.metadata and doc.metadata["page"] == 2
+
+    delete_collection("rulebook_slim_test")
+    with pytest.raises(ValueError):
+        qdrant_store.create_collection("rulebook_slim_test", 384, profile="pq")
+
+
+class ServerStub:
+    """
+    The collection calls `ensure_collection` makes, against one existing "full" collection.
+    """
+
+    def __init__(self):
+        self.quantization_config = None
+        self.updates = []
+
+    def collection_exists(self, collection_name):
+        return True
+
+    def get_collection(self, collection_name):
+        config = type("Config", (), {"quantization_config": self.quantization_config})
+        return type("Info", (), {"config": config})
+
+    def update_collection(self, collection_name, **changes):
+        self.updates.append(changes)
+        self.quantization_config = changes["quantization_config"]
+
+    def create_payload_index(self, *args, **kwargs):
+        pass
+
+
+def test_existing_collection_is_converted_to_the_configured_profile(monkeypatch):
+    server = ServerStub()
+    monkeypatch.setattr(qdrant_store, "VECTOR_STORE_BACKEND", "cloud")
+    monkeypatch.setattr(qdrant_store, "create_qdrant_client", lambda: server)
+    monkeypatch.setattr(qdrant_store, "_ensured_collections", set())
+    monkeypatch.setattr(qdrant_store, "_collection_profiles", {})
+    monkeypatch.setattr(qdrant_store, "VECTOR_STORAGE_PROFILE", "scalar")
+
+    # Unset, the collection keeps its profile and searches follow it
+    monkeypatch.setattr(qdrant_store, "_STORAGE_PROFILE_SET", False)
+    qdrant_store.ensure_collection("rulebooks", 384)
+    assert server.updates == []
+    assert qdrant_store.storage_search_params(collection_name="rulebooks") is None
+
+    monkeypatch.setattr(qdrant_store, "_ensured_collections", set())
+    monkeypatch.setattr(qdrant_store, "_collection_profiles", {})
+    monkeypatch.setattr(qdrant_store, "_STORAGE_PROFILE_SET", True)
+    qdrant_store.ensure_collection("rulebooks", 384)
+    assert len(server.updates) == 1
+    assert server.updates[0]["collection_params"].on_disk_payload is True
+
+    # A worker that starts later reads the profile from the collection itself
+    monkeypatch.setattr(qdrant_store, "_collection_profiles", {})
+    assert qdrant_store.collection_profile("rulebooks") == "scalar"
+    assert qdrant_store.storage_search_params(collection_name="rulebooks").quantization.rescore
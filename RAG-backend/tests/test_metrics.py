@@ -0,0 +1,44 @@
+from langchain.chains import LLMChain
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.prompts import PromptTemplate
+from observability.metrics import Histogram, render_metrics, timed, stage_latency, llm_tokens
+from observability.llm_timing import LLMStageTimer, CONDENSE_TAG
+from observability.tracing import current_trace_id, set_trace_id, reset_trace_id
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test latency.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "search")
+
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="search",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="search",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{stage="search",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{stage="search"} 4' in lines
+
+
+def test_timed_stages_and_gauges_are_exported():
+    with timed("unit_test_stage"):
+        pass
+
+    text = render_metrics(gauges={"chain_cache": {"size": 3, "ttl_seconds": 1.5, "nested": {"ok": True}}})
+    assert 'rag_stage_duration_seconds_count{stage="unit_test_stage"} 1' in text
+    assert "rag_chain_cache_size 3" in text
+    assert "rag_chain_cache_nested_ok 1" in text
+
+
+def test_llm_calls_are_attributed_to_their_chain_step():
+    chain = LLMChain(llm=FakeListChatModel(responses=["rephrased"]), prompt=PromptTemplate.from_template("{q}"))
+    chain.tags = [CONDENSE_TAG]
+
+    chain.invoke({"q": "what about kings?"}, config={"callbacks": [LLMStageTimer()]})
+    assert (CONDENSE_TAG,) in stage_latency._series
+    assert llm_tokens._values[(CONDENSE_TAG, "prompt")] > 0
+
+
+def test_trace_id_is_request_scoped():
+    token = set_trace_id("abc123")
+    assert current_trace_id() == "abc123"
+    reset_trace_id(token)
+    assert current_trace_id() is None
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+import pytest
+import active_sessions.lifecycle as lifecycle
+import active_sessions.reaper as reaper
+from active_sessions.session_store import InMemorySessionStore, Session
+
+
+def make_session(session_id, rulebook):
+    return Session(
+        session_id=session_id,
+        collection_name=f"rulebook_{rulebook}",
+        rulebook_key=rulebook,
+        file_path=f"uploads/rulebook_{rulebook}.pdf",
+        game_name="Checkers",
+    )
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = InMemorySessionStore()
+    released = []
+
+    async def release(sessions):
+        released.extend(s.session_id for s in sessions)
+        return []
+
+    monkeypatch.setattr(lifecycle, "session_store", store)
+    monkeypatch.setattr(reaper, "session_store", store)
+    monkeypatch.setattr(lifecycle, "release_sessions_resources", release)
+    store.released = released
+    return store
+
+
+def test_reaper_works_off_backlog_in_batches(store, tmp_path):
+    for i in range(7):
+        store.create(make_session(f"s{i}", rulebook=f"r{i}"))
+
+    session_reaper = reaper.SessionReaper(interval_seconds=60, batch_size=3, idle_seconds=0, upload_dir=str(tmp_path))
+    assert asyncio.run(session_reaper.run_once()) == 7
+    assert store.count() == 0
+    assert sorted(store.released) == [f"s{i}" for i in range(7)]
+    assert session_reaper.stats()["reaped"] == 7
+
+
+def test_reaper_deletes_abandoned_uploads(store, tmp_path):
+    abandoned = tmp_path / ".incoming_old.part"
+    in_flight = tmp_path / ".incoming_new.part"
+    rulebook = tmp_path / "rulebook_abc.pdf"
+    for path in (abandoned, in_flight, rulebook):
+        path.write_bytes(b"%PDF")
+    an_hour_ago = time.time() - 3600
+    for path in (abandoned, rulebook):
+        os.utime(path, (an_hour_ago, an_hour_ago))
+
+    session_reaper = reaper.SessionReaper(interval_seconds=60, batch_size=3, idle_seconds=60,
+                                          upload_dir=str(tmp_path), stale_upload_seconds=600)
+    asyncio.run(session_reaper.run_once())
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".incoming_new.part", "rulebook_abc.pdf"]
+    assert session_reaper.stats()["stale_uploads_removed"] == 1
+
+
+def test_capacity_policies(store, monkeypatch):
+    store.create(make_session("s1", rulebook="abc"))
+    store.create(make_session("s2", rulebook="other"))
+    monkeypatch.setattr(reaper, "MAX_SESSIONS", 2)
+
+    monkeypatch.setattr(reaper, "SESSION_CAP_POLICY", "reject")
+    with pytest.raises(reaper.CapacityError):
+        asyncio.run(reaper.ensure_capacity(new_rulebook=False))
+
+    monkeypatch.setattr(reaper, "SESSION_CAP_POLICY", "evict")
+    asyncio.run(reaper.ensure_capacity(new_rulebook=False))
+    assert store.released == ["s1"]
+    assert store.count() == 1
+
+
+def test_attaching_a_rulebook_ignores_the_session_cap(store, monkeypatch):
+    store.create(make_session("s1", rulebook="abc"))
+    monkeypatch.setattr(reaper, "MAX_SESSIONS", 1)
+
+    for policy in ("reject", "evict"):
+        monkeypatch.setattr(reaper, "SESSION_CAP_POLICY", policy)
+        asyncio.run(reaper.ensure_capacity(new_rulebook=True, new_session=False))
+    assert store.released == []
+    assert store.count() == 1
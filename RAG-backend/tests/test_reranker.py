@@ -0,0 +1,50 @@
+import time
+from langchain_core.documents import Document
+from retriever.reranker import CrossEncoderReranker
+
+
+class OverlapModel:
+    """
+    Scores a pair by the number of shared words, optionally taking `delay` per batch.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = 0
+
+    def predict(self, pairs, batch_size=None):
+        self.batches += 1
+        time.sleep(self.delay)
+        return [len(set(query.split()) & set(text.split())) for query, text in pairs]
+
+
+def make_reranker(model):
+    reranker = CrossEncoderReranker("test-model")
+    reranker._model = model
+    return reranker
+
+
+def test_keeps_the_best_candidates_in_score_order():
+    docs = [Document(page_content=text) for text in [
+        "the board has 64 squares",
+        "a king may move backwards",
+        "kings move diagonally and a king may jump backwards",
+    ]]
+    reranker = make_reranker(OverlapModel())
+
+    ranked = reranker.rerank("may a king move backwards", docs, top_n=2, budget_ms=0)
+    assert [doc.page_content for doc in ranked] == [docs[1].page_content, docs[2].page_content]
+    assert reranker.stats()["fallbacks"] == 0
+
+
+def test_falls_back_to_retrieval_order_when_over_budget():
+    model = OverlapModel(delay=0.02)
+    reranker = make_reranker(model)
+    texts = ["unrelated"] * 9 + ["king move"]
+
+    assert reranker.rank("king move", texts, top_n=3, budget_ms=10, batch_size=2) == [0, 1, 2]
+    # The budget is checked between batches, so scoring stops after the first one
+    assert model.batches == 1
+    assert reranker.stats()["fallbacks"] == 1
+
+    assert reranker.rank("king move", texts, top_n=1, budget_ms=0, batch_size=2) == [9]
@@ -0,0 +1,67 @@
+from langchain_core.documents import Document
+from vectorstores import qdrant_store
+from ingest.embed_and_store import store_in_qdrant, delete_rulebook, tag_chunks, point_id
+from ingest.revisions import apply_revision
+
+
+def make_revision(key, pages):
+    docs = [
+        Document(page_content=text, metadata={"page": page, "source": f"{key}.pdf", "game": "Checkers"})
+        for page, texts in enumerate(pages, start=1)
+        for text in texts
+    ]
+    return list(tag_chunks(docs, key))
+
+
+def stored(rulebook_key):
+    return {
+        record.id: record.payload["metadata"]
+        for record in qdrant_store.scroll_rulebook_points("revisions_test", rulebook_key)
+    }
+
+
+OLD = [["kings move diagonally", "jumps are compulsory"], ["the game is drawn by repetition"]]
+# Errata: page 1 gains a chunk, the page 2 rule is replaced, and an unchanged chunk moves to a new page
+NEW = [["kings move diagonally", "kings may not fly"], ["draws need three repetitions"], ["jumps are compulsory"]]
+
+
+def test_point_ids_are_deterministic():
+    first, second = make_revision("v1", OLD), make_revision("v1", OLD)
+    assert [d.metadata["chunk_hash"] for d in first] == [d.metadata["chunk_hash"] for d in second]
+    duplicate = make_revision("v1", [["same text", "same text"]])
+    assert [d.metadata["occurrence"] for d in duplicate] == [0, 1]
+    assert point_id("v1", "abc", 0) == point_id("v1", "abc", 0) != point_id("v2", "abc", 0)
+
+
+def test_revision_embeds_only_changed_chunks(memory_backend):
+    store_in_qdrant(make_revision("v1", OLD), "revisions_test")
+    before = stored("v1")
+
+    diff = apply_revision("revisions_test", "v1", "v2", make_revision("v2", NEW))
+
+    assert [doc.page_content for doc in diff.added] == ["kings may not fly", "draws need three repetitions"]
+    assert len(diff.unchanged) == 2
+    assert [record.payload["page_content"] for record in diff.stale] == ["the game is drawn by repetition"]
+    assert diff.pages_changed == [1, 2]
+
+    # The previous revision is untouched until its last session switches away
+    assert stored("v1") == before
+    after = stored("v2")
+    assert len(after) == 4
+    assert not set(after) & set(before)
+    assert {meta["source"] for meta in after.values()} == {"v2.pdf"}
+    assert sorted(meta["page"] for meta in after.values()) == [1, 1, 2, 3]
+
+
+def test_reuploading_the_old_revision_leaves_the_new_one_alone(memory_backend):
+    store_in_qdrant(make_revision("v1", OLD), "revisions_test")
+    apply_revision("revisions_test", "v1", "v2", make_revision("v2", NEW))
+    delete_rulebook("revisions_test", "v1")
+
+    # Someone uploads the old printing again, then ends their session
+    store_in_qdrant(make_revision("v1", OLD), "revisions_test")
+    assert len(stored("v2")) == 4
+    delete_rulebook("revisions_test", "v1")
+
+    assert stored("v1") == {}
+    assert len(stored("v2")) == 4
@@ -0,0 +1,44 @@
+from ingest.rulebook_registry import RulebookRegistry, rulebook_key, hash_content, READY
+
+
+def test_same_content_shares_one_collection_until_last_release():
+    registry = RulebookRegistry()
+    content_hash = hash_content(b"%PDF-1.4 checkers rules")
+    key = rulebook_key(content_hash)
+
+    first, created = registry.acquire(key, content_hash, "uploads")
+    assert created
+    second, created = registry.acquire(key, content_hash, "uploads")
+    assert not created
+    assert second.collection_name == first.collection_name
+
+    assert registry.finish_ingestion(key, READY) is None
+    assert registry.release(key) is None
+    released = registry.release(key)
+    assert released is not None and released.collection_name == first.collection_name
+    assert registry.get(key) is None
+
+
+def test_chunking_parameters_change_the_key():
+    content_hash = hash_content(b"%PDF-1.4 catan rules")
+    assert rulebook_key(content_hash, chunk_size=500) != rulebook_key(content_hash, chunk_size=800)
+
+
+
+def test_game_and_file_name_change_the_key():
+    # Both are stored in the chunks' metadata, so uploads differing in either can't share points
+    content_hash = hash_content(b"%PDF-1.4 draughts rules")
+    key = rulebook_key(content_hash, game_name="Checkers", source_filename="rules.pdf")
+    assert key == rulebook_key(content_hash, game_name="Checkers", source_filename="rules.pdf")
+    assert key != rulebook_key(content_hash, game_name="Draughts", source_filename="rules.pdf")
+    assert key != rulebook_key(content_hash, game_name="Checkers", source_filename="checkers.pdf")
+
+def test_last_release_during_ingestion_is_left_to_the_job():
+    registry = RulebookRegistry()
+    content_hash = hash_content(b"%PDF-1.4 chess rules")
+    key = rulebook_key(content_hash)
+    registry.acquire(key, content_hash, "uploads")
+
+    assert registry.release(key) is None
+    # Nobody references it any more, so the job is told to discard what it built
+    assert registry.finish_ingestion(key, READY) is not None
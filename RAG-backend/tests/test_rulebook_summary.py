@@ -0,0 +1,45 @@
+from langchain_core.documents import Document
+from langchain_core.language_models import FakeListLLM
+from vectorstores import qdrant_store
+from retriever.bm25_index import BM25Index
+from chains.rulebook_summary import parse_sections, summarize_rulebook, answer_from_summaries
+
+
+SUMMARY = """## Setup
+Place the 12 black and 12 white men on the dark squares.
+
+## Turn structure
+Black moves first, then players alternate.
+
+## Winning
+Not covered in the rulebook.
+"""
+
+DOCS = [
+    Document(page_content="Each player places 12 men on the dark squares at the start", metadata={"page": 1, "source": "cfn.pdf"}),
+    Document(page_content="Black makes the first move and turns alternate", metadata={"page": 2, "source": "cfn.pdf"}),
+]
+
+
+def test_parse_sections_drops_uncovered_ones():
+    sections = parse_sections(SUMMARY)
+    assert set(sections) == {"setup", "turns"}
+    assert sections["turns"] == "Black moves first, then players alternate."
+
+
+def test_generic_questions_are_answered_from_the_summary(memory_backend):
+    summary = summarize_rulebook("rb1", "Checkers", BM25Index(DOCS), llm=FakeListLLM(responses=[SUMMARY]))
+    assert [source["page"] for source in summary["sources"]] == [1, 2]
+
+    answer, sources = answer_from_summaries(["rb1"], "How do I set up the game?")
+    assert answer == "Place the 12 black and 12 white men on the dark squares."
+    assert len(sources) == 2
+
+    # Not generic, or a section the rulebook did not cover: left to retrieval and generation
+    assert answer_from_summaries(["rb1"], "Can a king jump backwards twice?") is None
+    assert answer_from_summaries(["rb1"], "How do you win?") is None
+    # Every rulebook of the session needs a summary
+    assert answer_from_summaries(["rb1", "rb2"], "How do I set up the game?") is None
+
+    qdrant_store.delete_rulebook_summaries(["rb1"])
+    assert qdrant_store.get_rulebook_summaries(["rb1"]) == {}
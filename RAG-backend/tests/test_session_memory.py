@@ -0,0 +1,50 @@
+import asyncio
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+from chains.session_memory import create_session_memory, has_chat_history, count_message_tokens, PromptTokenCounter
+
+
+def chat(memory, turns, answer="x" * 200):
+    for i in range(turns):
+        memory.save_context({"question": f"question {i}"}, {"answer": answer})
+
+
+def test_window_keeps_last_turns_only():
+    memory = create_session_memory("window")
+    memory.k = 2
+    chat(memory, 5)
+    assert [m.content for m in memory.chat_memory.messages[::2]] == ["question 3", "question 4"]
+
+
+def test_token_budget_bounds_history():
+    memory = create_session_memory("token")
+    memory.max_token_limit = 300
+    chat(memory, 50)
+    assert 0 < count_message_tokens(memory.chat_memory.messages) <= 300
+    assert memory.chat_memory.messages[-1].content == "x" * 200
+
+
+def test_summary_folds_old_turns_and_counts_as_history():
+    memory = create_session_memory("summary", llm=FakeListChatModel(responses=["they talked about kings"]))
+    memory.max_token_limit = 300
+
+    async def run():
+        for i in range(6):
+            await memory.asave_context({"question": f"question {i}"}, {"answer": "x" * 200})
+    asyncio.run(run())
+
+    assert memory.moving_summary_buffer == "they talked about kings"
+    assert count_message_tokens(memory.chat_memory.messages) <= 300
+    history = memory.load_memory_variables({})["chat_history"]
+    assert history[0].content == "they talked about kings"
+
+    memory.chat_memory.messages.clear()
+    assert has_chat_history(memory)
+
+
+def test_prompt_token_counter_adds_up_calls():
+    counter = PromptTokenCounter()
+    llm = FakeListChatModel(responses=["ok", "ok"])
+    llm.invoke([HumanMessage(content="a" * 40)], config={"callbacks": [counter]})
+    llm.invoke([HumanMessage(content="b" * 80)], config={"callbacks": [counter]})
+    assert (counter.prompt_tokens, counter.llm_calls) == (30, 2)
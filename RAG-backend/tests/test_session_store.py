@@ -0,0 +1,115 @@
+import time
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from active_sessions.session_store import (
+    InMemorySessionStore,
+    SessionStore,
+    SQLiteSessionStore,
+    Session,
+    READY,
+    messages_to_history,
+    history_to_messages,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"))
+
+
+def make_session(session_id, rulebook="abc"):
+    return Session(
+        session_id=session_id,
+        collection_name=f"rulebook_{rulebook}",
+        rulebook_key=rulebook,
+        file_path=f"uploads/rulebook_{rulebook}.pdf",
+        game_name="Checkers",
+    )
+
+
+def test_history_round_trips_through_the_store(store):
+    store.create(make_session("s1"))
+    messages = [HumanMessage(content="Can kings move backwards?"), AIMessage(content="Yes.")]
+    store.update("s1", status=READY, history=messages_to_history(messages), summary="")
+
+    session = store.get("s1")
+    assert session.status == READY
+    assert session.has_history
+    assert history_to_messages(session.history) == messages
+
+
+def test_rulebook_counts_and_idle_claims(store):
+    store.create(make_session("s1"))
+    store.create(make_session("s2"))
+    store.create(make_session("s3", rulebook="other"))
+    assert store.count_by_rulebook("abc") == 2
+
+    time.sleep(0.05)
+    store.get("s2", touch=True)
+    claimed = store.claim_idle(idle_seconds=0.03)
+    assert sorted(s.session_id for s in claimed) == ["s1", "s3"]
+    assert store.claim_idle(idle_seconds=0.03) == []
+    assert store.count_by_rulebook("abc") == 1
+
+    assert store.delete("s2").session_id == "s2"
+    assert store.get("s2") is None
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    worker_a, worker_b = SQLiteSessionStore(path), SQLiteSessionStore(path)
+
+    worker_a.create(make_session("s1"))
+    worker_b.update("s1", status=READY)
+    assert worker_a.get("s1").status == READY
+    assert worker_b.count_by_rulebook("abc") == 1
+
+
+def test_least_recent_claims_for_eviction(store):
+    for session_id, rulebook in [("s1", "abc"), ("s2", "other"), ("s3", "abc"), ("s4", "other")]:
+        store.create(make_session(session_id, rulebook=rulebook))
+        time.sleep(0.01)
+    assert store.count() == 4
+    assert store.count_rulebooks() == 2
+
+    assert [s.session_id for s in store.claim_idle(idle_seconds=0, limit=1)] == ["s1"]
+    assert [s.session_id for s in store.claim_least_recent(1)] == ["s2"]
+    # s3 is now the least recently active session, so its whole rulebook goes
+    assert [s.session_id for s in store.claim_least_recent_rulebook()] == ["s3"]
+    assert store.count() == 1
+    assert store.count_rulebooks() == 1
+
+
+def test_attached_rulebooks_count_as_used(store):
+    store.create(make_session("s1"))
+    store.create(make_session("s2", rulebook="other"))
+    store.update("s1", attached_rulebooks=["expansion"])
+
+    assert store.get("s1").rulebook_keys == ["abc", "expansion"]
+    assert [s.session_id for s in store.list_by_rulebook("expansion")] == ["s1"]
+    assert store.count_by_rulebook("expansion") == 1
+    assert store.count_rulebooks() == 3
+
+    store.update("s1", attached_rulebooks=[])
+    assert store.count_by_rulebook("expansion") == 0
+    store.delete("s1")
+    assert store.count_rulebooks() == 1
+
+
+def test_unknown_fields_are_rejected(store):
+    store.create(make_session("s1"))
+
+    with pytest.raises(ValueError):
+        store.update("s1", statuss=READY)
+    assert store.get("s1").status != READY
+
+
+def test_incomplete_session_store_fails_at_construction():
+    class PartialSessionStore(SessionStore):
+        def get(self, session_id, touch=False):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialSessionStore()
@@ -0,0 +1,42 @@
+import asyncio
+from langchain.chains.conversational_retrieval.base import ConversationalRetrievalChain
+from langchain.memory import ConversationBufferMemory
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.retrievers import BaseRetriever
+from chains.qa_chain import astream_conversational_answer
+
+
+class StaticRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [Document(page_content="kings may move backwards", metadata={"page": 3, "source": "cfn.pdf"})]
+
+
+def collect(chain, question):
+    async def run():
+        return [event async for event in astream_conversational_answer(chain, question)]
+    return asyncio.run(run())
+
+
+def test_stream_emits_sources_then_tokens_and_updates_memory():
+    # Responses: first answer, condensed follow-up question, second answer
+    llm = FakeListChatModel(responses=["Yes, kings move backwards.", "Can kings jump?", "Kings can jump."])
+    memory = ConversationBufferMemory(
+        memory_key="chat_history", return_messages=True, input_key="question", output_key="answer"
+    )
+    chain = ConversationalRetrievalChain.from_llm(
+        llm=llm, retriever=StaticRetriever(), memory=memory, return_source_documents=True
+    )
+
+    events = collect(chain, "Can kings move backwards?")
+    assert events[0]["type"] == "sources"
+    assert events[0]["documents"][0].metadata["page"] == 3
+    tokens = "".join(e["text"] for e in events if e["type"] == "token")
+    assert tokens == events[-1]["answer"] == "Yes, kings move backwards."
+
+    events = collect(chain, "And can they jump?")
+    assert events[-1]["answer"] == "Kings can jump."
+    history = memory.load_memory_variables({})["chat_history"]
+    assert [m.content for m in history] == [
+        "Can kings move backwards?", "Yes, kings move backwards.", "And can they jump?", "Kings can jump.",
+    ]
@@ -0,0 +1,23 @@
+from ingest.load_document import extract_page_range, iter_pdf_pages, iter_pdf_chunks, chunk_pdf_text
+from tests.synthetic_rulebook import make_synthetic_rulebook
+
+
+def test_sharded_extraction_matches_a_serial_pass(tmp_path):
+    pdf_path = make_synthetic_rulebook(str(tmp_path / "rulebook.pdf"), pages=40)
+
+    serial = extract_page_range(pdf_path, 0, 40)
+    streamed = list(iter_pdf_pages(pdf_path, shard_pages=8))
+
+    assert streamed == serial
+
+
+def test_chunks_stream_lazily_with_page_numbers():
+    pages = ["first page " * 60, "second page"]
+
+    chunks = iter_pdf_chunks(iter(pages), source_filename="rules.pdf", game_name="Checkers", chunk_size=200, chunk_overlap=0)
+    first = next(chunks)
+    assert first.metadata == {"source": "rules.pdf", "page": 1, "game": "Checkers"}
+
+    rest = list(chunks)
+    assert rest[-1].metadata["page"] == 2
+    assert [first] + rest == chunk_pdf_text(pages, "rules.pdf", "Checkers", chunk_size=200, chunk_overlap=0)
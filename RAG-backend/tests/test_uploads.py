@@ -0,0 +1,45 @@
+import asyncio
+import hashlib
+import io
+import os
+import pytest
+from fastapi import UploadFile
+from ingest.load_document import open_pdf
+from ingest.uploads import save_upload, commit_upload, discard_upload, UploadTooLargeError
+
+
+def test_uploads_stream_to_unique_paths(tmp_path):
+    content = b"%PDF-1.4 " + os.urandom(5000)
+
+    async def upload_twice():
+        return await asyncio.gather(*(
+            save_upload(UploadFile(io.BytesIO(content), filename="rules.pdf"), str(tmp_path), chunk_bytes=1024)
+            for _ in range(2)
+        ))
+
+    (first, first_hash, size), (second, second_hash, _) = asyncio.run(upload_twice())
+    assert first != second
+    assert first_hash == second_hash == hashlib.sha256(content).hexdigest()
+    assert size == len(content)
+
+    commit_upload(first, str(tmp_path / "rulebook.pdf"))
+    discard_upload(second)
+    assert os.listdir(tmp_path) == ["rulebook.pdf"]
+    assert (tmp_path / "rulebook.pdf").read_bytes() == content
+
+
+def test_oversized_upload_leaves_nothing_behind(tmp_path):
+    upload = UploadFile(io.BytesIO(b"x" * 4096), filename="huge.pdf")
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(save_upload(upload, str(tmp_path), max_bytes=3000, chunk_bytes=1024))
+    assert os.listdir(tmp_path) == []
+
+
+def test_memory_mapped_pdf_reads_like_the_file():
+    with open_pdf("uploads/cfn.pdf", mode="file") as doc:
+        from_file = [page.get_text() for page in doc]
+    with open_pdf("uploads/cfn.pdf", mode="mmap") as doc:
+        from_mmap = [page.get_text() for page in doc]
+
+    assert from_mmap == from_file
@@ -1,21 +1,530 @@
 import os
+import threading
+import uuid
+import httpx
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
+from langchain_core.embeddings import Embeddings
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.local.qdrant_local import QdrantLocal
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    CollectionParamsDiff,
+    Disabled,
+    Distance,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    IntegerIndexParams,
+    KeywordIndexParams,
+    MatchAny,
+    PointIdsList,
+    PointStruct,
+    QuantizationSearchParams,
+    QueryRequest,
+    Range,
+    Record,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+    VectorParamsDiff,
+)
 
 # Load secrets from .env
 load_dotenv()
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 
+# "cloud" talks to Qdrant Cloud; "memory" and "local" run Qdrant in-process
+# ("local" persists to VECTOR_STORE_PATH, "memory" keeps everything in RAM)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "cloud")
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "qdrant_data")
+
+# Connection settings for the "cloud" backend
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "32"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))
+
+LOCAL_BACKENDS = {"memory", "local"}
+
+# Every rulebook's chunks live in this one collection, told apart by their `metadata.rulebook` field
+RULEBOOK_COLLECTION = os.getenv("RULEBOOK_COLLECTION", "rulebooks")
+
+# Precomputed per-rulebook summaries: one vectorless point per rulebook, read by id
+SUMMARY_COLLECTION = os.getenv("SUMMARY_COLLECTION", f"{RULEBOOK_COLLECTION}_summaries")
+_SUMMARY_NAMESPACE = uuid.UUID("5d1c3f52-8a7e-4b0b-9f0e-2e6c1a9d7b41")
+
+# How collections store their points:
+#   "full"   - float32 vectors in RAM
+#   "scalar" - int8-quantized vectors in RAM (4x smaller); float32 originals and payloads on disk
+#   "binary" - 1-bit quantized vectors in RAM (32x smaller); float32 originals and payloads on disk
+# Quantized searches rescore their best candidates with the original vectors. When set, an
+# existing collection with another profile is converted (Qdrant re-indexes it in the background);
+# when unset, new collections are "full" and existing ones keep theirs.
+VECTOR_STORAGE_PROFILE = os.getenv("VECTOR_STORAGE_PROFILE", "full")
+_STORAGE_PROFILE_SET = "VECTOR_STORAGE_PROFILE" in os.environ
+# A quantized search scores `oversampling * limit` candidates and rescores them to keep `limit`
+QUANTIZATION_OVERSAMPLING = float(os.getenv("QUANTIZATION_OVERSAMPLING", "2.0"))
+STORAGE_PROFILES = {"full", "scalar", "binary"}
+
+# Payload fields a search returns: the chunk text and what citations and filters need.
+# Bookkeeping fields such as `chunk_hash` are only read when a rulebook is revised.
+CITATION_PAYLOAD = [
+    "page_content", "metadata.page", "metadata.source", "metadata.game", "metadata.rulebook",
+    # Older flat layout
+    "text", "page", "source", "game",
+]
+
+# Payload fields retrieval filters on. The rulebook key is the tenant: Qdrant co-locates each
+# rulebook's points and can answer a filtered search from that rulebook's segment alone.
+PAYLOAD_INDEXES = {
+    "metadata.rulebook": KeywordIndexParams(type="keyword", is_tenant=True),
+    "metadata.game": KeywordIndexParams(type="keyword"),
+    "metadata.source": KeywordIndexParams(type="keyword"),
+    "metadata.page": IntegerIndexParams(type="integer", lookup=True, range=True),
+}
+
+_ensured_collections = set()
+_ensure_lock = threading.Lock()
+# collection name -> storage profile it actually has, read from the server once per process
+_collection_profiles: Dict[str, str] = {}
+
+_local_client: Optional[QdrantClient] = None
+_local_client_lock = threading.Lock()
+
+# One long-lived client per process keeps TLS sessions and HTTP/gRPC connections warm
+_cloud_client: Optional[QdrantClient] = None
+_async_cloud_client: Optional[AsyncQdrantClient] = None
+_cloud_client_lock = threading.Lock()
+
+
+def _cloud_client_args() -> Dict[str, Any]:
+    if not QDRANT_URL or not QDRANT_API_KEY:
+        raise ValueError("Missing QDRANT_URL or QDRANT_API_KEY in .env file")
+
+    return {
+        "url": QDRANT_URL,
+        "api_key": QDRANT_API_KEY,
+        "prefer_grpc": QDRANT_PREFER_GRPC,
+        "grpc_port": QDRANT_GRPC_PORT,
+        "timeout": QDRANT_TIMEOUT,
+        "limits": httpx.Limits(
+            max_connections=QDRANT_POOL_SIZE,
+            max_keepalive_connections=QDRANT_POOL_SIZE,
+        ),
+    }
+
+
+def _get_local_client() -> QdrantClient:
+    """
+    In-process Qdrant shares its storage per client instance, so every caller must get the same one.
+    """
+    global _local_client
+    if _local_client is None:
+        with _local_client_lock:
+            if _local_client is None:
+                if VECTOR_STORE_BACKEND == "memory":
+                    _local_client = QdrantClient(location=":memory:")
+                else:
+                    _local_client = QdrantClient(path=VECTOR_STORE_PATH)
+    return _local_client
+
+
 def create_qdrant_client() -> QdrantClient:
     """
-    Connects to Qdrant Cloud using API key and URL from .env.
+    Return the shared Qdrant client for the configured backend.
+
+    With the default "cloud" backend this connects to Qdrant Cloud using API key and URL from .env,
+    over a pooled HTTP connection (or gRPC when QDRANT_PREFER_GRPC=true).
+    With "memory" or "local" it returns the shared in-process client.
     """
-    if not QDRANT_URL or not QDRANT_API_KEY:
-        raise ValueError("Missing QDRANT_URL or QDRANT_API_KEY in .env file")
+    global _cloud_client
+    if VECTOR_STORE_BACKEND in LOCAL_BACKENDS:
+        return _get_local_client()
+    if VECTOR_STORE_BACKEND != "cloud":
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {VECTOR_STORE_BACKEND}")
+
+    if _cloud_client is None:
+        with _cloud_client_lock:
+            if _cloud_client is None:
+                _cloud_client = QdrantClient(**_cloud_client_args())
+    return _cloud_client
+
+
+def create_async_qdrant_client() -> AsyncQdrantClient:
+    """
+    Async counterpart of `create_qdrant_client` for use inside request handlers.
+    Only available for the "cloud" backend; in-process backends are fast enough to call directly.
+    """
+    global _async_cloud_client
+    if _async_cloud_client is None:
+        with _cloud_client_lock:
+            if _async_cloud_client is None:
+                _async_cloud_client = AsyncQdrantClient(**_cloud_client_args())
+    return _async_cloud_client
+
+
+async def close_qdrant_clients():
+    """
+    Close the shared clients (called on application shutdown).
+    """
+    global _cloud_client, _async_cloud_client
+    if _async_cloud_client is not None:
+        await _async_cloud_client.close()
+        _async_cloud_client = None
+    if _cloud_client is not None:
+        _cloud_client.close()
+        _cloud_client = None
+
+
+def _quantization_config(profile: str):
+    if profile == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if profile == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def _check_profile(profile: str) -> str:
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown VECTOR_STORAGE_PROFILE: {profile}")
+    return profile
+
+
+def create_collection(collection_name: str, vector_dim: int, profile: Optional[str] = None):
+    """
+    Create a cosine-distance collection laid out the way `QdrantVectorStore` expects,
+    stored according to `profile` (defaults to VECTOR_STORAGE_PROFILE).
+    """
+    profile = _check_profile(profile or VECTOR_STORAGE_PROFILE)
+    quantized = profile != "full"
+    create_qdrant_client().create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=vector_dim, distance=Distance.COSINE, on_disk=quantized),
+        quantization_config=_quantization_config(profile),
+        on_disk_payload=quantized or None,
+    )
+    _collection_profiles[collection_name] = profile
+
+
+def collection_profile(collection_name: str, qdrant_client: Optional[QdrantClient] = None) -> str:
+    """
+    The storage profile a collection actually has, from its quantization config on the server
+    behind `qdrant_client` (by default the process's client). The in-process backends don't
+    quantize, so their collections are always "full".
+    """
+    if qdrant_client is None:
+        if VECTOR_STORE_BACKEND in LOCAL_BACKENDS:
+            return "full"
+    elif isinstance(qdrant_client._client, QdrantLocal):
+        return "full"
+    profile = _collection_profiles.get(collection_name)
+    if profile is None:
+        qdrant_client = qdrant_client or create_qdrant_client()
+        if not qdrant_client.collection_exists(collection_name):
+            return "full"
+        quantization = qdrant_client.get_collection(collection_name).config.quantization_config
+        if isinstance(quantization, ScalarQuantization):
+            profile = "scalar"
+        elif isinstance(quantization, BinaryQuantization):
+            profile = "binary"
+        else:
+            profile = "full"
+        _collection_profiles[collection_name] = profile
+    return profile
+
 
-    client = QdrantClient(
-        url=QDRANT_URL,
-        api_key=QDRANT_API_KEY,
+def apply_storage_profile(collection_name: str, profile: str):
+    """
+    Convert an existing collection to another storage profile. Qdrant builds (or drops) the
+    quantized vectors and moves vectors and payloads to or from disk in the background;
+    searches keep working meanwhile.
+    """
+    quantized = _check_profile(profile) != "full"
+    create_qdrant_client().update_collection(
+        collection_name=collection_name,
+        vectors_config={"": VectorParamsDiff(on_disk=quantized)},
+        quantization_config=_quantization_config(profile) or Disabled.DISABLED,
+        collection_params=CollectionParamsDiff(on_disk_payload=quantized),
+    )
+    _collection_profiles[collection_name] = profile
+
+
+def storage_search_params(
+    profile: Optional[str] = None,
+    collection_name: Optional[str] = None,
+    qdrant_client: Optional[QdrantClient] = None,
+) -> Optional[SearchParams]:
+    """
+    Search parameters for collections of the given storage profile (by default the profile
+    `collection_name` actually has, looked up through `qdrant_client`): quantized collections
+    are searched on their in-RAM quantized vectors and the candidates rescored from disk.
+    """
+    if profile is None:
+        profile = collection_profile(collection_name, qdrant_client) if collection_name else VECTOR_STORAGE_PROFILE
+    if profile == "full":
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=QUANTIZATION_OVERSAMPLING))
+
+
+def ensure_collection(collection_name: str, vector_dim: int):
+    """
+    Create the collection and its payload indexes unless they exist. Checked once per process.
+    """
+    if collection_name in _ensured_collections:
+        return
+    with _ensure_lock:
+        if collection_name in _ensured_collections:
+            return
+        qdrant_client = create_qdrant_client()
+        if not qdrant_client.collection_exists(collection_name):
+            try:
+                create_collection(collection_name, vector_dim)
+            except Exception:
+                # Another worker created it in the meantime
+                if not qdrant_client.collection_exists(collection_name):
+                    raise
+        elif VECTOR_STORE_BACKEND not in LOCAL_BACKENDS:
+            current = collection_profile(collection_name)
+            if current != VECTOR_STORAGE_PROFILE:
+                if _STORAGE_PROFILE_SET:
+                    print(f"Converting collection '{collection_name}' from the '{current}' to the "
+                          f"'{VECTOR_STORAGE_PROFILE}' storage profile")
+                    apply_storage_profile(collection_name, VECTOR_STORAGE_PROFILE)
+                else:
+                    print(f"Collection '{collection_name}' uses the '{current}' storage profile; "
+                          f"set VECTOR_STORAGE_PROFILE to convert it")
+        # In-process Qdrant ignores payload indexes (and warns about them)
+        if VECTOR_STORE_BACKEND not in LOCAL_BACKENDS:
+            for field_name, field_schema in PAYLOAD_INDEXES.items():
+                qdrant_client.create_payload_index(
+                    collection_name, field_name=field_name, field_schema=field_schema, wait=True
+                )
+        _ensured_collections.add(collection_name)
+
+
+def rulebook_filter(
+    rulebook_keys: Optional[List[str]] = None,
+    games: Optional[List[str]] = None,
+    sources: Optional[List[str]] = None,
+    page_from: Optional[int] = None,
+    page_to: Optional[int] = None,
+) -> Optional[Filter]:
+    """
+    Build a payload filter restricting a search to some rulebooks, games, source files and/or pages.
+    Returns None when nothing is restricted.
+    """
+    must = []
+    for field_name, values in (("rulebook", rulebook_keys), ("game", games), ("source", sources)):
+        if values:
+            must.append(FieldCondition(key=f"metadata.{field_name}", match=MatchAny(any=list(values))))
+    if page_from is not None or page_to is not None:
+        must.append(FieldCondition(key="metadata.page", range=Range(gte=page_from, lte=page_to)))
+    return Filter(must=must) if must else None
+
+
+def delete_rulebook_points(collection_name: str, rulebook_key: str):
+    """
+    Delete every point of one rulebook from a shared collection.
+    """
+    create_qdrant_client().delete(
+        collection_name=collection_name,
+        points_selector=FilterSelector(filter=rulebook_filter([rulebook_key])),
+        wait=True,
+    )
+
+
+async def adelete_rulebook_points(collection_name: str, rulebook_key: str):
+    """
+    Delete one rulebook's points without blocking the event loop.
+    """
+    if VECTOR_STORE_BACKEND in LOCAL_BACKENDS:
+        delete_rulebook_points(collection_name, rulebook_key)
+        return
+
+    await create_async_qdrant_client().delete(
+        collection_name=collection_name,
+        points_selector=FilterSelector(filter=rulebook_filter([rulebook_key])),
+        wait=True,
+    )
+
+
+def scroll_rulebook_points(
+    collection_name: str,
+    rulebook_key: str,
+    with_vectors: bool = False,
+    batch_size: int = 256,
+) -> List[Record]:
+    """
+    Every stored point of one rulebook, with its payload (and vector if asked for).
+    """
+    qdrant_client = create_qdrant_client()
+    records = []
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            scroll_filter=rulebook_filter([rulebook_key]),
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=with_vectors,
+        )
+        records.extend(points)
+        if offset is None:
+            return records
+
+
+def _summary_point_id(rulebook_key: str) -> str:
+    return str(uuid.uuid5(_SUMMARY_NAMESPACE, rulebook_key))
+
+
+def _ensure_summary_collection():
+    if SUMMARY_COLLECTION in _ensured_collections:
+        return
+    with _ensure_lock:
+        if SUMMARY_COLLECTION in _ensured_collections:
+            return
+        qdrant_client = create_qdrant_client()
+        if not qdrant_client.collection_exists(SUMMARY_COLLECTION):
+            try:
+                qdrant_client.create_collection(collection_name=SUMMARY_COLLECTION, vectors_config={})
+            except Exception:
+                if not qdrant_client.collection_exists(SUMMARY_COLLECTION):
+                    raise
+        _ensured_collections.add(SUMMARY_COLLECTION)
+
+
+def store_rulebook_summary(rulebook_key: str, summary: Dict[str, Any]):
+    """
+    Store (or replace) the precomputed summary of a rulebook.
+    """
+    _ensure_summary_collection()
+    create_qdrant_client().upsert(
+        collection_name=SUMMARY_COLLECTION,
+        points=[PointStruct(id=_summary_point_id(rulebook_key), vector={}, payload={"rulebook": rulebook_key, **summary})],
+        wait=True,
+    )
+
+
+def get_rulebook_summaries(rulebook_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    The stored summaries of some rulebooks, by rulebook key. Rulebooks without one are left out.
+    """
+    if not rulebook_keys:
+        return {}
+    _ensure_summary_collection()
+    records = create_qdrant_client().retrieve(
+        collection_name=SUMMARY_COLLECTION,
+        ids=[_summary_point_id(key) for key in rulebook_keys],
+        with_payload=True,
+    )
+    return {record.payload["rulebook"]: record.payload for record in records if record.payload}
+
+
+def delete_rulebook_summaries(rulebook_keys: List[str]):
+    """
+    Delete the summaries of some rulebooks.
+    """
+    if rulebook_keys:
+        _ensure_summary_collection()
+        create_qdrant_client().delete(
+            collection_name=SUMMARY_COLLECTION,
+            points_selector=PointIdsList(points=[_summary_point_id(key) for key in rulebook_keys]),
+            wait=True,
+        )
+
+
+def delete_collection(collection_name: str):
+    """
+    Delete a collection from the configured backend.
+    """
+    _ensured_collections.discard(collection_name)
+    _collection_profiles.pop(collection_name, None)
+    create_qdrant_client().delete_collection(collection_name=collection_name)
+
+
+async def adelete_collection(collection_name: str):
+    """
+    Delete a collection without blocking the event loop.
+    """
+    if VECTOR_STORE_BACKEND in LOCAL_BACKENDS:
+        delete_collection(collection_name)
+        return
+
+    _ensured_collections.discard(collection_name)
+    _collection_profiles.pop(collection_name, None)
+    await create_async_qdrant_client().delete_collection(collection_name=collection_name)
+
+
+def get_langchain_vector_store(collection_name: str, embedding: Embeddings) -> QdrantVectorStore:
+    """
+    Wrap an existing collection of the configured backend as a LangChain vector store.
+    """
+    return QdrantVectorStore(
+        client=create_qdrant_client(),
+        collection_name=collection_name,
+        embedding=embedding,
+    )
+
+
+def payload_to_chunk(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flatten a stored point payload into {"text": ..., **metadata}.
+
+    Handles both the LangChain layout ({"page_content", "metadata"}) used for every new point
+    and the older flat layout ({"text", **metadata}).
+    """
+    if "page_content" in payload:
+        return {"text": payload["page_content"], **(payload.get("metadata") or {})}
+    return dict(payload)
+
+
+def search_collection(
+    collection_name: str,
+    query_vector: List[float],
+    limit: int,
+    query_filter: Optional[Filter] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Nearest-neighbour search returning flattened chunk payloads, best first.
+    """
+    response = create_qdrant_client().query_points(
+        collection_name=collection_name,
+        query=query_vector,
+        limit=limit,
+        query_filter=query_filter,
+        search_params=storage_search_params(collection_name=collection_name),
+        with_payload=CITATION_PAYLOAD,
+    )
+    return [payload_to_chunk(point.payload or {}) for point in response.points]
+
+
+def search_collection_batch(
+    collection_name: str,
+    query_vectors: List[List[float]],
+    limit: int,
+    query_filter: Optional[Filter] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Run one nearest-neighbour search per query vector in a single Qdrant request.
+    Returns the flattened chunk payloads of each search, best first, in query order.
+    """
+    if not query_vectors:
+        return []
+    responses = create_qdrant_client().query_batch_points(
+        collection_name=collection_name,
+        requests=[
+            QueryRequest(
+                query=list(vector), limit=limit, filter=query_filter,
+                params=storage_search_params(collection_name=collection_name), with_payload=CITATION_PAYLOAD,
+            )
+            for vector in query_vectors
+        ],
     )
-    return client
+    return [[payload_to_chunk(point.payload or {}) for point in response.points] for response in responses]
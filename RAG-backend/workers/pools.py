@@ -0,0 +1,119 @@
+import asyncio
+import contextvars
+import functools
+import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Threads are enough for our CPU stages: PyMuPDF, tokenizers and torch release the GIL
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "2"))
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "16"))
+# Gemini calls started per second per worker process by batch jobs (0 = unlimited)
+LLM_RATE_LIMIT_PER_SECOND = float(os.getenv("LLM_RATE_LIMIT_PER_SECOND", "0"))
+UPSERT_PARALLELISM = int(os.getenv("UPSERT_PARALLELISM", "4"))
+# Processes for page-sharded PDF extraction; text cleaning is pure Python and holds the GIL
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_POOL_WORKERS, thread_name_prefix="cpu-pool")
+# Background ingestion jobs get their own pool so they never starve request handlers
+ingest_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_UPLOADS, thread_name_prefix="ingest")
+# Network-bound Qdrant upserts, overlapped with embedding of the next batch
+upsert_executor = ThreadPoolExecutor(max_workers=UPSERT_PARALLELISM, thread_name_prefix="qdrant-upsert")
+
+# Bound how many Gemini calls are in flight at once, per worker process
+llm_slots = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+
+
+class AsyncRateLimiter:
+    """
+    Spaces out `acquire` calls to at most `rate` per second (0 disables the limit).
+    Waiters are released in arrival order, one every 1/rate seconds.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            now = loop.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+llm_rate_limiter = AsyncRateLimiter(LLM_RATE_LIMIT_PER_SECOND)
+
+_pdf_process_pool: Optional[ProcessPoolExecutor] = None
+_pdf_process_pool_lock = threading.Lock()
+
+
+def get_pdf_process_pool() -> ProcessPoolExecutor:
+    """
+    Return the shared process pool for PDF extraction, starting it on first use.
+
+    Workers are spawned rather than forked: the server process already runs threads
+    (pools, event loop) that must not be copied into a child mid-operation.
+    """
+    global _pdf_process_pool
+    if _pdf_process_pool is None:
+        with _pdf_process_pool_lock:
+            if _pdf_process_pool is None:
+                _pdf_process_pool = ProcessPoolExecutor(
+                    max_workers=PDF_EXTRACT_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pdf_process_pool
+
+
+async def run_cpu_bound(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking or CPU-heavy function on the bounded CPU pool without blocking the event loop.
+
+    Args:
+        func (Callable): The function to run.
+        *args, **kwargs: Arguments forwarded to `func`.
+
+    Returns:
+        The return value of `func`.
+    """
+    loop = asyncio.get_running_loop()
+    # Copy the request context so trace ids follow the work onto the pool
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(cpu_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def pool_stats() -> Dict[str, Any]:
+    """
+    Report configured limits and current free slots of the shared pools.
+    """
+    return {
+        "cpu_pool_workers": CPU_POOL_WORKERS,
+        "cpu_pool_queued": cpu_executor._work_queue.qsize(),
+        "ingest_workers": MAX_CONCURRENT_UPLOADS,
+        "ingest_queued": ingest_executor._work_queue.qsize(),
+        "upsert_workers": UPSERT_PARALLELISM,
+        "upsert_queued": upsert_executor._work_queue.qsize(),
+        "pdf_extract_workers": PDF_EXTRACT_WORKERS,
+        "pdf_process_pool_started": _pdf_process_pool is not None,
+        "llm_slots_free": llm_slots._value,
+        "llm_rate_limit_per_second": LLM_RATE_LIMIT_PER_SECOND,
+    }
+
+
+def shutdown_pools():
+    cpu_executor.shutdown(wait=False, cancel_futures=True)
+    ingest_executor.shutdown(wait=False, cancel_futures=True)
+    upsert_executor.shutdown(wait=False, cancel_futures=True)
+    if _pdf_process_pool is not None:
+        _pdf_process_pool.shutdown(wait=False, cancel_futures=True)
@@ -7,7 +7,7 @@ import Layout from '@/components/Layout';
 import ChatBubble from '@/components/ChatBubble';
 import LoadingDots from '@/components/LoadingDots';
 import { useGameStore } from '@/lib/store';
-import { askQuestion, endSession, generateMessageId, ChatMessage } from '@/lib/api';
+import { askQuestionStream, endSession, generateMessageId, ChatMessage } from '@/lib/api';
 import { set } from 'date-fns';
 
 export default function ChatPage() {
@@ -16,7 +16,7 @@ export default function ChatPage() {
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLInputElement>(null);
   const router = useRouter();
-  const { gameName, sessionId, messages, addMessage, setLoading, reset } = useGameStore();
+  const { gameName, sessionId, messages, addMessage, updateMessage, setLoading, reset } = useGameStore();
   const [hasWelcomed, setHasWelcomed] = useState(false);
 
   // Redirect if no session
@@ -69,11 +69,31 @@ export default function ChatPage() {
     setQuestion('');
     setIsAsking(true);
 
+    const aiMessageId = generateMessageId();
+    let aiMessageAdded = false;
+    let streamedAnswer = '';
+
     try {
-      const response = await askQuestion(sessionId, question.trim());
-      
-      const aiMessage: ChatMessage = {
-        id: generateMessageId(),
+      const response = await askQuestionStream(sessionId, question.trim(), {
+        onToken: (text) => {
+          streamedAnswer += text;
+          if (!aiMessageAdded) {
+            aiMessageAdded = true;
+            setIsAsking(false);
+            addMessage({
+              id: aiMessageId,
+              type: 'ai',
+              content: streamedAnswer,
+              timestamp: new Date(),
+            });
+          } else {
+            updateMessage(aiMessageId, { content: streamedAnswer });
+          }
+        },
+      });
+
+      const finalMessage: ChatMessage = {
+        id: aiMessageId,
         type: 'ai',
         content: response.answer,
         sources: response.sources?.map((source) => ({
@@ -83,7 +103,11 @@ export default function ChatPage() {
         timestamp: new Date(),
       };
 
-      addMessage(aiMessage);
+      if (aiMessageAdded) {
+        updateMessage(aiMessageId, finalMessage);
+      } else {
+        addMessage(finalMessage);
+      }
     } catch (error) {
       const errorMessage: ChatMessage = {
         id: generateMessageId(),
@@ -2,9 +2,23 @@ const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:8000';
 
 export interface UploadResponse {
   session_id: string;
+  job_id?: string;
+  status?: string;
   message?: string;
 }
 
+export interface IngestionJob {
+  job_id: string;
+  session_id: string;
+  stage: 'queued' | 'extracting' | 'chunking' | 'embedding' | 'finalizing' | 'completed' | 'failed';
+  pages_extracted: number;
+  total_chunks: number;
+  chunks_embedded: number;
+  chunks_per_second: number;
+  elapsed_seconds: number;
+  error?: string | null;
+}
+
 export interface AskResponse {
   answer: string;
   sources?: Array<{
@@ -39,9 +53,51 @@ export async function uploadRulebook(file: File, gameName: string): Promise<Uplo
   if (!response.ok) {
     throw new Error(`Upload failed: ${response.statusText}`);
   }
+
+  const upload: UploadResponse = await response.json();
+  if (upload.job_id) {
+    await waitForIngestion(upload.job_id);
+  }
+  return upload;
+}
+
+/**
+ * Fetch the progress of a background ingestion job
+ * @param jobId - Job ID from upload response
+ * @returns Promise<IngestionJob> - Current stage and progress counters
+ */
+export async function getIngestionJob(jobId: string): Promise<IngestionJob> {
+  const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+
+  if (!response.ok) {
+    throw new Error(`Job status failed: ${response.statusText}`);
+  }
   return response.json();
 }
 
+/**
+ * Poll an ingestion job until the rulebook is ready to be queried
+ * @param jobId - Job ID from upload response
+ * @param onProgress - Optional callback invoked with every status update
+ * @param intervalMs - Delay between polls
+ */
+export async function waitForIngestion(
+  jobId: string,
+  onProgress?: (job: IngestionJob) => void,
+  intervalMs = 1000,
+): Promise<IngestionJob> {
+  while (true) {
+    const job = await getIngestionJob(jobId);
+    onProgress?.(job);
+
+    if (job.stage === 'completed') return job;
+    if (job.stage === 'failed') {
+      throw new Error(`Processing failed: ${job.error ?? 'unknown error'}`);
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
+
 /**
  * Ask a question about the uploaded rulebook
  * @param sessionId - Session ID from upload response
@@ -68,6 +124,82 @@ export async function askQuestion(sessionId: string, question: string): Promise<
 }
 
 
+export interface StreamHandlers {
+  onSources?: (sources: NonNullable<AskResponse['sources']>) => void;
+  onToken?: (text: string) => void;
+}
+
+/**
+ * Ask a question and stream the answer via Server-Sent Events
+ * @param sessionId - Session ID from upload response
+ * @param question - User's question about the game rules
+ * @param handlers - Callbacks for sources (sent once retrieval finishes) and answer tokens
+ * @returns Promise<AskResponse> - The complete answer with sources
+ */
+export async function askQuestionStream(
+  sessionId: string,
+  question: string,
+  handlers: StreamHandlers = {},
+): Promise<AskResponse> {
+  const response = await fetch(`${API_BASE_URL}/ask/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+    },
+    body: JSON.stringify({
+      session_id: sessionId,
+      question: question,
+    }),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`Ask failed: ${response.statusText}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  const result: AskResponse = { answer: '', sources: [] };
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // SSE events are separated by a blank line
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+
+      if (event === 'sources') {
+        result.sources = payload.sources;
+        handlers.onSources?.(payload.sources);
+      } else if (event === 'token') {
+        result.answer += payload.text;
+        handlers.onToken?.(payload.text);
+      } else if (event === 'done') {
+        result.answer = payload.answer;
+      } else if (event === 'error') {
+        throw new Error(payload.detail);
+      }
+    }
+  }
+
+  return result;
+}
+
 export async function endSession(sessionId: string): Promise<void> {
   const response = await fetch(`${API_BASE_URL}/end`, {
     method: 'POST',
@@ -14,6 +14,7 @@ interface GameState {
   setGameName: (name: string) => void;
   setSessionId: (id: string) => void;
   addMessage: (message: ChatMessage) => void;
+  updateMessage: (id: string, changes: Partial<ChatMessage>) => void;
   setLoading: (loading: boolean) => void;
   reset: () => void;
 }
@@ -28,6 +29,11 @@ export const useGameStore = create<GameState>((set) => ({
   addMessage: (message) => set((state) => ({ 
     messages: [...state.messages, message] 
   })),
+  updateMessage: (id, changes) => set((state) => ({
+    messages: state.messages.map((message) =>
+      message.id === id ? { ...message, ...changes } : message
+    ),
+  })),
   setLoading: (loading) => set({ isLoading: loading }),
   reset: () => set({ 
     gameName: '', 